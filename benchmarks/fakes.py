@@ -0,0 +1,213 @@
+"""
+Stand-ins for the YouTube Data API and python-vlc so benchmarks run offline and give repeatable numbers.
+
+FakeYouTube answers pafy.call_gdata and conditional requests for playlists of any size. FakeMediaPlayer accepts every call VLCYT makes
+and never plays anything, end and error events are only sent when a benchmark calls finish().
+"""
+import json
+import os
+import sys
+import time
+import types
+import zlib
+
+corpus_path = os.path.join(os.path.dirname(__file__), "title_corpus.json")
+
+
+class FakeYouTube:
+    """
+    Serves playlists, playlist pages, and video metadata from memory.
+    Playlist ids are mapped to their sizes, every playlist holds distinct videos.
+    Playlists in playlist_videos hold the listed video numbers instead, so tests can add, remove, and move videos.
+    """
+
+    def __init__(self, playlist_sizes, latency=0):
+        self.playlist_sizes = dict(playlist_sizes)
+        self.latency = latency  # Seconds every request takes, like a round trip to YouTube
+        with open(corpus_path, "r", encoding="utf-8") as corpus_file:
+            self.titles = [entry["title"] for entry in json.load(corpus_file)]
+        self.playlist_videos = {}  # Playlist id -> video numbers in playlist order, overrides playlist_sizes
+        self.calls = 0  # Requests answered, each would be a round trip to YouTube
+        self.not_modified = 0  # Conditional requests answered with 304 Not Modified
+
+    def install(self):
+        """
+        Routes pafy's API requests and VLCYT's conditional requests to this object.
+        """
+        import pafy
+        import pafy.playlist
+        import vlcyt.playlist_loader
+
+        pafy.call_gdata = self.call_gdata
+        pafy.playlist.get_categoryname = lambda category_id: "Music"
+        vlcyt.playlist_loader.call_gdata_if_changed = self.call_gdata_if_changed
+
+    def videoid(self, plid, index):
+        return f"{zlib.crc32(plid.encode()) % 1000:03d}{index:08d}"  # Always 11 characters, like real videoids
+
+    def get_videos(self, plid):
+        """
+        Returns the video numbers of a playlist in order.
+        """
+        return self.playlist_videos.get(plid, range(self.playlist_sizes[plid]))
+
+    def call_gdata(self, api, query):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if api == "playlists":
+            return {
+                "items": [
+                    {"contentDetails": {"itemCount": len(self.get_videos(query["id"]))}}
+                ]
+            }
+        if api == "playlistItems":
+            plid = query["playlistId"]
+            videos = self.get_videos(plid)
+            start = int(query.get("pageToken") or 0)
+            end = min(len(videos), start + query["maxResults"])
+            page = {
+                "items": [
+                    {
+                        "status": {"privacyStatus": "public"},
+                        "snippet": {
+                            "title": self.titles[index % len(self.titles)],
+                            "videoOwnerChannelTitle": f"Channel {index % 50}",
+                            "resourceId": {"videoId": self.videoid(plid, index)},
+                        },
+                    }
+                    for index in videos[start:end]
+                ]
+            }
+            if end < len(videos):
+                page["nextPageToken"] = str(end)
+            page["etag"] = f'"{zlib.crc32(json.dumps(page).encode())}"'
+            return page
+        if api == "videos":
+            return {
+                "items": [
+                    {
+                        "id": videoid,
+                        "snippet": {"publishedAt": "2021-01-02T03:04:05Z"},
+                        "contentDetails": {"duration": "PT3M25S"},
+                        "statistics": {"viewCount": "1000"},
+                    }
+                    for videoid in query["id"].split(",")
+                ]
+            }
+        raise ValueError(f"Unexpected API: {api}")
+
+    def call_gdata_if_changed(self, api, query, etag=None):
+        """
+        Answers like YouTube does when If-None-Match is sent, None stands for 304 Not Modified.
+        """
+        response = self.call_gdata(api, query)
+        if etag and response.get("etag") == etag:
+            self.not_modified += 1
+            return None
+        return response
+
+
+def fake_get_audio_urls(song):
+    """
+    Replacement for vlcyt.resolver.get_audio_urls that never touches the network.
+    """
+    return [f"https://example.invalid/{song.videoid}/audio"]
+
+
+class FakeEventManager:
+    def __init__(self, player):
+        self._player = player
+
+    def event_attach(self, event_type, callback, *args):
+        self._player.callbacks[event_type] = (callback, args)
+
+
+class FakeMediaPlayer:
+    """
+    Records what VLCYT asks for without playing anything.
+    """
+
+    def __init__(self, *args):
+        self.callbacks = {}  # Event type -> (callback, args)
+        self.state = FakeState.NothingSpecial
+        self.volume = 100
+        self.mrl = None
+
+    def event_manager(self):
+        return FakeEventManager(self)
+
+    def set_mrl(self, mrl, *options):
+        self.mrl = mrl
+        self.state = FakeState.NothingSpecial
+
+    def play(self):
+        self.state = FakeState.Playing
+
+    def pause(self):
+        self.state = FakeState.Paused if self.state == FakeState.Playing else FakeState.Playing
+
+    def set_pause(self, paused):
+        self.state = FakeState.Paused if paused else FakeState.Playing
+
+    def stop(self):
+        self.state = FakeState.Stopped
+
+    def finish(self):
+        """
+        Ends the song as if it played to the end.
+        """
+        self.state = FakeState.Ended
+        callback, args = self.callbacks[FakeEventType.MediaPlayerEndReached]
+        callback(None, *args)
+
+    def get_state(self):
+        return self.state
+
+    def is_playing(self):
+        return self.state == FakeState.Playing
+
+    def audio_get_volume(self):
+        return self.volume
+
+    def audio_set_volume(self, volume):
+        self.volume = volume
+
+    def get_length(self):
+        return 205000
+
+    def get_time(self):
+        return 0
+
+    def set_time(self, milliseconds):
+        pass
+
+
+class FakeState:
+    NothingSpecial = 0
+    Playing = 3
+    Paused = 4
+    Stopped = 5
+    Ended = 6
+    Error = 7
+
+
+class FakeEventType:
+    MediaPlayerPlaying = 260
+    MediaPlayerEndReached = 265
+    MediaPlayerEncounteredError = 266
+
+
+def install_fake_vlc():
+    """
+    Makes "import vlc" return the fakes and gives vlcyt.app the module its main() would import.
+    """
+    fake_vlc = types.ModuleType("vlc")
+    fake_vlc.MediaPlayer = FakeMediaPlayer
+    fake_vlc.State = FakeState
+    fake_vlc.EventType = FakeEventType
+    sys.modules["vlc"] = fake_vlc
+    import vlcyt.app
+
+    vlcyt.app.vlc = fake_vlc
+    return fake_vlc
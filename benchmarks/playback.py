@@ -0,0 +1,320 @@
+"""
+Benchmarks VLCYT's playback engine against FakeYouTube and a fake VLC, see benchmarks/fakes.py.
+
+Measures startup time against playlist size with and without the playlist snapshot, the cost of choosing the next song,
+skipping, title cleaning, searching a 50,000 track library, and the memory used per 100,000 tracks. Lower is better for every result.
+Results can be saved and compared against an earlier run to catch regressions.
+
+Usage: python -m benchmarks.playback [--sizes 100 1000 10000] [--rounds 500] [--latency 0.1] [--save NAME] [--compare NAME [--threshold 0.25]]
+"""
+import os
+import tempfile
+
+os.environ["XDG_DATA_HOME"] = tempfile.mkdtemp(prefix="vlcyt-benchmark-")  # vlcyt picks its data folder on import, keep the user's untouched
+
+import argparse
+import asyncio
+import gc
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from benchmarks.fakes import FakeYouTube, fake_get_audio_urls, install_fake_vlc
+
+results_dir = os.path.join(os.path.dirname(__file__), "results")
+memory_tracks = 100000  # Size of the playlist memory is measured with
+memory_target = 20  # Megabytes per 100,000 tracks the loaded playlist should stay under
+search_tracks = 50000  # Size of the library searches are measured on
+search_target = 0.01  # Seconds a search should take on a library of search_tracks tracks
+search_queries = ["love", "lo", "midnight dreams", "midnigth", "the light of summer", "xq"]  # Whole words, a prefix, several words, a typo, and no match
+default_threshold = 0.25  # Fraction a result may worsen by before --compare reports a regression, timings of a few microseconds are noisy
+
+
+def playlist_url(plid):
+    return f"https://www.youtube.com/playlist?list={plid}"
+
+
+def create_vlcyt(plid):
+    """
+    Returns a VLCYT playing nothing, the same way main() creates it for a daemon.
+    """
+    from vlcyt.app import VLCYT
+
+    vlcyt = VLCYT(
+        [playlist_url(plid)], "benchmark", song_info_enabled=False, interactive=False
+    )
+    vlcyt.resolver._get_urls = fake_get_audio_urls
+    return vlcyt
+
+
+def wait_until_loaded(vlcyt):
+    while not vlcyt.playlist.is_fully_loaded():
+        time.sleep(0.001)
+
+
+def wait_until_idle(vlcyt):
+    """
+    Waits until the playlist loaded and any queued metadata requests finished, so they don't slow down the next measurement.
+    """
+    wait_until_loaded(vlcyt)
+    while vlcyt.metadata_fetcher._pending:
+        time.sleep(0.001)
+
+
+def measure_startup(size, repeat):
+    """
+    Output: dict: seconds until VLCYT is created, until the first song is available, and until the whole playlist loaded,
+    first from the API alone and then starting from the snapshot the first launch saved
+    """
+    timings = {}
+    for repetition in range(repeat):
+        plid = f"PLbenchmark{size}x{repetition}"  # A new playlist each time, so only the second launch has a snapshot
+        for variant in ("cold", "snapshot"):
+            if variant == "snapshot":
+                wait_for_snapshot(plid)
+            start = time.perf_counter()
+            vlcyt = create_vlcyt(plid)
+            samples = [time.perf_counter() - start]
+            vlcyt.playlist[0]
+            samples.append(time.perf_counter() - start)
+            wait_until_loaded(vlcyt)
+            samples.append(time.perf_counter() - start)
+            for name, seconds in zip(("init", "first_song", "loaded"), samples):
+                timings.setdefault(f"startup.{variant}.{name}[{size}]", []).append(seconds)
+            wait_until_idle(vlcyt)
+    return {name: min(samples) for name, samples in timings.items()}
+
+
+def wait_for_snapshot(plid):
+    """
+    The snapshot is saved on a loader thread right after the last page, wait for it so the next launch finds it.
+    Only the most recently loaded playlists have a snapshot.
+    """
+    from vlcyt.playlist_snapshot import load_snapshot
+
+    while load_snapshot([playlist_url(plid)]) is None:
+        time.sleep(0.001)
+
+
+def fastest(measure, repeat):
+    """
+    Runs a measurement repeat times and keeps the fastest result of each timing, the least disturbed by other processes.
+    """
+    runs = [measure() for _ in range(repeat)]
+    return {name: min(run[name] for run in runs) for name in runs[0]}
+
+
+def measure_selection(vlcyt, rounds):
+    """
+    Output: dict: seconds per call of each way the next song is chosen, and per skip command
+    """
+    loop = asyncio.new_event_loop()
+    vlcyt.loop = loop
+    vlcyt.events.bind(loop)
+
+    async def time_calls(select_song, calls):
+        start = time.perf_counter()
+        for _ in range(calls):
+            await select_song()
+        return (time.perf_counter() - start) / calls
+
+    results = {
+        "select.next": loop.run_until_complete(time_calls(vlcyt._get_next_song, rounds)),
+        "select.shuffle": loop.run_until_complete(
+            time_calls(vlcyt._get_next_song_shuffling, rounds)
+        ),
+    }
+    vlcyt.set_shuffle_mode("plays")
+    results["select.weighted_shuffle"] = loop.run_until_complete(
+        time_calls(vlcyt._get_next_song_shuffling, rounds)
+    )
+    vlcyt.set_shuffle_mode("random")
+    back_rounds = min(rounds, vlcyt.song_history._recent.maxlen - 1)
+    loop.run_until_complete(time_calls(vlcyt._get_next_song, back_rounds + 1))
+    results["select.back"] = loop.run_until_complete(
+        time_calls(vlcyt._get_next_song_back, back_rounds)
+    )
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        vlcyt.cmds.command_skip_song("7")
+    results["command.skip"] = (time.perf_counter() - start) / rounds
+    loop.close()
+    return results
+
+
+def measure_clean_title(vlcyt, rounds):
+    """
+    Output: dict: seconds per title cleaned for titles seen for the first time and for cached titles
+    """
+    songs = [vlcyt.playlist[index] for index in range(len(vlcyt.playlist))]
+    vlcyt.title_cleaner._cache.clear()
+    vlcyt.title_cleaner._cache_size = len(songs)
+    start = time.perf_counter()
+    for song in songs:
+        vlcyt._clean_title(song)
+    uncached = (time.perf_counter() - start) / len(songs)
+    start = time.perf_counter()
+    for _ in range(max(1, rounds // 100)):
+        for song in songs:
+            vlcyt._clean_title(song)
+    cached = (time.perf_counter() - start) / (len(songs) * max(1, rounds // 100))
+    return {"clean_title.uncached": uncached, "clean_title.cached": cached}
+
+
+def measure_memory():
+    """
+    Output: dict: megabytes allocated by a loaded playlist of memory_tracks tracks, scaled to 100,000 tracks
+    """
+    from vlcyt.playlist_loader import MergedPlaylist
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    playlist = MergedPlaylist([playlist_url("PLbenchmarkmemory")])
+    while not playlist.is_fully_loaded():
+        time.sleep(0.001)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return {"memory.per_100k_tracks": used / len(playlist) * 100000 / (1024 * 1024)}
+
+
+def synthetic_titles(count, seed=0):
+    """
+    Returns song titles with a realistic spread of words: a few very common, most rare.
+    """
+    rng = random.Random(seed)
+    common_words = "love the of you night summer light dreams heart midnight fire remix live feat".split()
+    syllables = "ka lo mi ra ve sun ta ri no el da mo ne si gu ba ter lin cor fa".split()
+    rare_words = list({"".join(rng.choices(syllables, k=rng.randint(2, 4))) for _ in range(40000)})
+    titles = []
+    for _ in range(count):
+        words = rng.choices(common_words, k=rng.randint(0, 2)) + rng.choices(rare_words, k=rng.randint(1, 4))
+        rng.shuffle(words)
+        titles.append(" ".join(words).title())
+    return titles
+
+
+def measure_search(rounds):
+    """
+    Output: dict: seconds to index one track, and per search of a search_tracks track library
+    """
+    from benchmarks.title_cleaner import CorpusSong
+    from vlcyt.search import SongSearchIndex
+
+    songs = [CorpusSong(f"{index:011d}", title) for index, title in enumerate(synthetic_titles(search_tracks))]
+    index = SongSearchIndex(lambda song: song.title)
+    start = time.perf_counter()
+    index.add(songs)
+    indexed = (time.perf_counter() - start) / len(songs)
+    calls = max(1, rounds // 10)
+    start = time.perf_counter()
+    for _ in range(calls):
+        for query in search_queries:
+            index.search(query)
+    return {
+        "search.index_per_track": indexed,
+        "search.query": (time.perf_counter() - start) / (calls * len(search_queries)),
+    }
+
+
+def run(sizes, rounds, repeat, latency):
+    youtube = FakeYouTube({}, latency)
+    for size in sizes:
+        for repetition in range(repeat):
+            youtube.playlist_sizes[f"PLbenchmark{size}x{repetition}"] = size
+    youtube.playlist_sizes["PLbenchmarkselection"] = max(sizes)
+    youtube.playlist_sizes["PLbenchmarkmemory"] = memory_tracks
+    youtube.install()
+    install_fake_vlc()
+
+    results = {}
+    for size in sizes:
+        results.update(measure_startup(size, repeat))
+    vlcyt = create_vlcyt("PLbenchmarkselection")
+    wait_until_idle(vlcyt)
+    results.update(fastest(lambda: measure_selection(vlcyt, rounds), repeat))
+    results.update(fastest(lambda: measure_clean_title(vlcyt, rounds), repeat))
+    results.update(fastest(lambda: measure_search(rounds), repeat))
+    results.update(measure_memory())
+    return results
+
+
+def machine_info():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+    }
+
+
+def print_results(results, baseline=None, threshold=default_threshold):
+    """
+    Prints every result, with its change from the baseline if one is passed in.
+    Output: list of names that regressed
+    """
+    regressions = []
+    for name, value in results.items():
+        line = f"{name:<40}{format_value(name, value):>14}"
+        if baseline is not None and name in baseline:
+            change = (value - baseline[name]) / baseline[name] if baseline[name] else 0
+            line += f"{format_value(name, baseline[name]):>14}{change:>+9.1%}"
+            if change > threshold:
+                line += "  REGRESSION"
+                regressions.append(name)
+        print(line)
+    return regressions
+
+
+def format_value(name, value):
+    if name.startswith("memory."):
+        return f"{value:.2f} MB"
+    if value < 1e-3:
+        return f"{value * 1e6:.2f} us"
+    return f"{value * 1e3:.2f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks VLCYT against fake YouTube and VLC backends")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000], help="Playlist sizes to measure startup with.")
+    parser.add_argument("--rounds", type=int, default=500, help="Calls per selection, skip, and title cleaning measurement.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of every measurement, the fastest counts.")
+    parser.add_argument("--latency", type=float, default=0, help="Seconds every fake API request takes, 0 measures VLCYT's own overhead.")
+    parser.add_argument("--save", metavar="NAME", help="Store the results as benchmarks/results/NAME.json.")
+    parser.add_argument("--compare", metavar="NAME", help="Compare against benchmarks/results/NAME.json, exits with 1 on a regression.")
+    parser.add_argument("--threshold", type=float, default=default_threshold, help="Fraction a result may worsen by before it counts as a regression.")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(os.path.join(results_dir, args.compare + ".json"), "r") as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline["machine"] != machine_info():
+            print("Note: the baseline was recorded on a different machine or Python version.")
+        baseline = baseline["results"]
+
+    results = run(args.sizes, args.rounds, args.repeat, args.latency)
+    regressions = print_results(results, baseline, args.threshold)
+    if results["memory.per_100k_tracks"] > memory_target:
+        print(f"Memory per 100,000 tracks is over the {memory_target} MB target.")
+    if results["search.query"] > search_target:
+        print(f"Searching {search_tracks:,} tracks is slower than the {search_target * 1000:.0f} ms target.")
+
+    if args.save:
+        os.makedirs(results_dir, exist_ok=True)
+        with open(os.path.join(results_dir, args.save + ".json"), "w") as results_file:
+            json.dump(
+                {"time": time.time(), "machine": machine_info(), "results": results},
+                results_file,
+                indent=2,
+            )
+    if regressions:
+        print(f"{len(regressions)} result(s) regressed by more than {args.threshold:.0%}.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
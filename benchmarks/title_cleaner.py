@@ -0,0 +1,85 @@
+"""
+Micro-benchmark and golden check for vlcyt.titles.
+
+Every title in title_corpus.json must clean to its stored result before anything is timed,
+so a rule change can't make titles faster to clean by cleaning them wrong.
+
+Usage: python -m benchmarks.title_cleaner [rounds]
+"""
+import json
+import os
+import re
+import sys
+import timeit
+from vlcyt.titles import TitleCleaner, default_removal_rules
+
+corpus_path = os.path.join(os.path.dirname(__file__), "title_corpus.json")
+
+
+def legacy_clean(title):
+    """
+    The cleaner VLCYT used before vlcyt.titles, kept as the baseline.
+    Rebuilds the pattern on every call and repeats until nothing changes.
+    """
+    new_song_name = (title, 0)
+    while True:
+        new_song_name = re.subn(
+            "|".join(default_removal_rules), "", new_song_name[0], flags=re.IGNORECASE
+        )
+        if new_song_name[1] == 0:
+            return new_song_name[0]
+
+
+class CorpusSong:
+    """
+    Minimal stand-in for a Track, all TitleCleaner needs is a videoid and title.
+    """
+
+    def __init__(self, videoid, title):
+        self.videoid = videoid
+        self.title = title
+
+
+def check_golden(cleaner, corpus):
+    """
+    Returns a list of (title, expected, actual) for every corpus title that cleaned differently.
+    """
+    return [
+        (entry["title"], entry["cleaned"], cleaner.clean(entry["title"]))
+        for entry in corpus
+        if cleaner.clean(entry["title"]) != entry["cleaned"]
+    ]
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    with open(corpus_path, "r", encoding="utf-8") as corpus_file:
+        corpus = json.load(corpus_file)
+    cleaner = TitleCleaner()
+
+    mismatches = check_golden(cleaner, corpus)
+    if mismatches:
+        for title, expected, actual in mismatches:
+            print(f"MISMATCH {title!r}: expected {expected!r}, got {actual!r}")
+        sys.exit(1)
+    print(f"Golden corpus: {len(corpus)} titles OK")
+
+    titles = [entry["title"] for entry in corpus]
+    songs = [CorpusSong(f"{i:011d}", title) for i, title in enumerate(titles)]
+    results = {
+        "legacy": timeit.timeit(lambda: [legacy_clean(t) for t in titles], number=rounds),
+        "compiled": timeit.timeit(lambda: [cleaner.clean(t) for t in titles], number=rounds),
+        "cached": timeit.timeit(
+            lambda: [cleaner.clean_song_title(s) for s in songs], number=rounds
+        ),
+    }
+    total_titles = len(titles) * rounds
+    for name, seconds in results.items():
+        print(
+            f"{name:>8}: {total_titles / seconds:>12,.0f} titles/s "
+            f"({seconds / total_titles * 1e6:.2f} us/title)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import os
+import tempfile
+
+os.environ["XDG_DATA_HOME"] = tempfile.mkdtemp(prefix="vlcyt-tests-")  # vlcyt picks its data folder on import, keep the user's untouched
+
+import asyncio
+import itertools
+import sys
+import pytest
+from benchmarks.fakes import FakeYouTube, fake_get_audio_urls, install_fake_vlc
+
+_playlist_numbers = itertools.count()
+
+
+@pytest.fixture
+def fake_youtube(monkeypatch):
+    """
+    FakeYouTube answering every request, restored after the test.
+    """
+    import pafy
+    import pafy.playlist
+    import vlcyt.playlist_loader
+
+    youtube = FakeYouTube({})
+    monkeypatch.setattr(pafy, "call_gdata", youtube.call_gdata)
+    monkeypatch.setattr(pafy.playlist, "get_categoryname", lambda category_id: "Music")
+    monkeypatch.setattr(vlcyt.playlist_loader, "call_gdata_if_changed", youtube.call_gdata_if_changed)
+    return youtube
+
+
+@pytest.fixture
+def create_player(fake_youtube, monkeypatch):
+    """
+    Returns a function creating a VLCYT that plays a new playlist of the passed in size on the fake VLC,
+    or relaunches on an earlier playlist when its id is passed in. It returns once the playlist has loaded.
+    """
+    import vlcyt.app
+
+    monkeypatch.setitem(sys.modules, "vlc", sys.modules.get("vlc"))
+    install_fake_vlc()
+    monkeypatch.setattr(vlcyt.app, "vlc", sys.modules["vlc"], raising=False)
+
+    def create(total_songs=None, plid=None, **kwargs):
+        if plid is None:
+            plid = f"PLtest{next(_playlist_numbers)}"
+            fake_youtube.playlist_sizes[plid] = total_songs
+        player = vlcyt.app.VLCYT(
+            [f"https://www.youtube.com/playlist?list={plid}"], "test", song_info_enabled=False, interactive=False, **kwargs
+        )
+        player.resolver._get_urls = fake_get_audio_urls
+        player.playlist.wait_until_loaded()
+        return player
+
+    return create
+
+
+async def run_playback(player, commands):
+    """
+    Runs the playback loop and calls every command from it once the previous song has started.
+    A command is a function taking the player, the commands of one item run without waiting in between.
+    Output: list of the playlist indexes played, in order
+    """
+    played = []
+    set_current_song = player._set_current_song
+
+    async def record_song(index):
+        played.append(index % player.total_songs)
+        await set_current_song(index)
+
+    player._set_current_song = record_song
+    playback = asyncio.get_running_loop().create_task(player._play_playlist_songs())
+    for step in commands:
+        await asyncio.sleep(0.01)
+        for command in step if isinstance(step, (list, tuple)) else [step]:
+            command(player)
+    await asyncio.sleep(0.01)
+    player.cmds.execute_command("exit", None)
+    await asyncio.wait_for(playback, 5)
+    return played
@@ -0,0 +1,37 @@
+import json
+import random
+import threading
+import time
+from vlcyt import audio_cache
+from vlcyt.audio_cache import AudioCache
+
+
+def test_concurrent_saves_write_the_latest_index(tmp_path, monkeypatch):
+    write_file_atomically = audio_cache.write_file_atomically
+
+    def slow_write(path, data):
+        time.sleep(random.random() * 0.002)  # Lets another save take its snapshot in between
+        write_file_atomically(path, data)
+
+    monkeypatch.setattr(audio_cache, "write_file_atomically", slow_write)
+    cache = AudioCache(1024 * 1024, cache_dir=str(tmp_path) + "/")
+    errors = []
+
+    def add_and_save(writer):
+        try:
+            for number in range(50):
+                with cache._lock:
+                    cache._entries[f"{writer}-{number}"] = {"file": f"{writer}-{number}.webm", "size": 1}
+                    cache._dirty = True
+                cache.save()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=add_and_save, args=(writer,)) for writer in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    with open(cache.index_path, "r") as index_file:
+        assert len(json.load(index_file)) == 200
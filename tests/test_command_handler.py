@@ -0,0 +1,44 @@
+import concurrent.futures
+import types
+import pytest
+from vlcyt.command_handler import CommandHandler, lyrics_failed_message
+
+
+class FakeLyricsFetcher:
+    """
+    Stands in for LyricsFetcher, nothing is cached and every fetch fails with the passed in error.
+    """
+
+    def __init__(self, error):
+        self.error = error
+
+    def get_cached(self, song_title):
+        return None
+
+    def fetch(self, song_title):
+        future = concurrent.futures.Future()
+        future.set_exception(self.error)
+        return future
+
+
+def create_handler(error):
+    vlcyt = types.SimpleNamespace(
+        lyrics_fetcher=FakeLyricsFetcher(error),
+        lyrics_prefetch_enabled=False,
+        _clean_title=lambda: "Song",
+        _prefetch_lyrics=lambda: None,
+    )
+    return CommandHandler(vlcyt)
+
+
+@pytest.mark.parametrize(
+    "error", [OSError("timed out"), TypeError("'NoneType' object is not subscriptable"), ValueError("bad page"), KeyError("href")]
+)
+def test_failed_lyrics_resolve_the_control_socket_future(error):
+    output = create_handler(error).command_lyrics(from_terminal=False)
+    assert output.result(timeout=1) == lyrics_failed_message
+
+
+def test_unexpected_errors_still_resolve_the_control_socket_future():
+    output = create_handler(RuntimeError("unexpected")).command_lyrics(from_terminal=False)
+    assert output.result(timeout=1) == lyrics_failed_message
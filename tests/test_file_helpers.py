@@ -0,0 +1,34 @@
+import os
+import threading
+import pytest
+from vlcyt.file_helpers import write_file_atomically
+
+
+def test_concurrent_writers_never_collide(tmp_path):
+    path = str(tmp_path / "data" / "settings.json")
+    errors = []
+
+    def write(writer):
+        try:
+            for _ in range(200):
+                write_file_atomically(path, str(writer) * 1000)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(writer,)) for writer in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    with open(path, "r", encoding="utf-8") as written_file:
+        data = written_file.read()
+    assert len(data) == 1000 and len(set(data)) == 1
+    assert os.listdir(os.path.dirname(path)) == ["settings.json"]
+
+
+def test_temporary_file_is_removed_when_writing_fails(tmp_path):
+    path = str(tmp_path / "settings.json")
+    with pytest.raises(UnicodeEncodeError):
+        write_file_atomically(path, "\ud800")  # Lone surrogates can't be encoded
+    assert os.listdir(str(tmp_path)) == []
@@ -0,0 +1,128 @@
+import random
+import pytest
+from vlcyt.history import SongHistory
+
+
+class HistoryModel:
+    """
+    Straightforward reference implementation SongHistory is compared against.
+    """
+
+    def __init__(self, total_songs, capacity):
+        self.total_songs = total_songs
+        self.capacity = capacity
+        self.recent = []
+        self.played = set()
+
+    def add(self, index):
+        self.recent = (self.recent + [index])[-self.capacity :]
+        self.played.add(index)
+        if len(self.played) >= self.total_songs:
+            self.played = {index}
+
+    def back(self):
+        if len(self.recent) < 2:
+            return None
+        self.recent.pop()
+        return self.recent[-1]
+
+    def resize(self, total_songs):
+        self.total_songs = total_songs
+        self.played = {index for index in self.played if index < total_songs}
+
+    def remap(self, index_map, total_songs):
+        def moved(indexes):
+            return [
+                index_map[index]
+                for index in indexes
+                if index < len(index_map) and index_map[index] is not None
+            ]
+
+        self.recent = moved(self.recent)
+        self.played = set(moved(self.played))
+        self.total_songs = total_songs
+
+
+def random_index_map(rng, total_songs):
+    """
+    Returns an index map that removes some songs, moves the rest, and adds new songs.
+    Output: tuple: index map, new amount of songs
+    """
+    kept = [index for index in range(total_songs) if rng.random() > 0.2]
+    new_total = len(kept) + rng.randint(0, 5) or 1
+    new_indexes = rng.sample(range(new_total), len(kept))
+    index_map = [None] * total_songs
+    for index, new_index in zip(kept, new_indexes):
+        index_map[index] = new_index
+    return index_map, new_total
+
+
+def assert_matches(history, model):
+    assert list(history._recent) == model.recent
+    assert len(history) == len(model.recent)
+    assert bool(history) == bool(model.recent)
+    assert history.current == (model.recent[-1] if model.recent else None)
+    assert history.peek_back() == (model.recent[-2] if len(model.recent) > 1 else None)
+    assert history.songs_played_this_pass == len(model.played)
+    assert {index for index in range(model.total_songs) if history.was_played(index)} == model.played
+    assert len(history) <= model.capacity
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_random_operations_match_the_model(seed):
+    rng = random.Random(seed)
+    total_songs = rng.randint(1, 12)
+    capacity = rng.randint(2, 8)
+    history = SongHistory(total_songs, capacity)
+    model = HistoryModel(total_songs, capacity)
+    for _ in range(150):
+        operation = rng.random()
+        if operation < 0.5:
+            index = rng.randrange(model.total_songs)
+            history.add(index)
+            model.add(index)
+        elif operation < 0.7:
+            assert history.back() == model.back()
+        elif operation < 0.85:
+            total_songs = rng.randint(1, 15)
+            history.resize(total_songs)
+            model.resize(total_songs)  # The recent history is kept as it is
+        else:
+            index_map, total_songs = random_index_map(rng, model.total_songs)
+            history.remap(index_map, total_songs)
+            model.remap(index_map, total_songs)
+        assert_matches(history, model)
+
+
+@pytest.mark.parametrize("total_songs", [2, 3, 7])
+def test_pass_rolls_over_once_every_song_played(total_songs):
+    history = SongHistory(total_songs)
+    carried = set()  # The song a pass ended with counts as played in the next pass
+    for pass_number in range(3):
+        order = list(range(total_songs))
+        random.Random(pass_number).shuffle(order)
+        order = [index for index in order if index not in carried]
+        for played_count, index in enumerate(order, 1):
+            history.add(index)
+            if played_count < len(order):
+                assert history.songs_played_this_pass == len(carried) + played_count
+        assert history.songs_played_this_pass == 1  # Only the current song, a new pass started
+        assert history.was_played(order[-1])
+        assert not any(history.was_played(index) for index in order[:-1])
+        carried = {order[-1]}
+
+
+def test_single_song_starts_a_new_pass_every_time():
+    history = SongHistory(1)
+    for _ in range(3):
+        history.add(0)
+        assert history.songs_played_this_pass == 1
+        assert history.was_played(0)
+
+
+def test_back_walks_the_history_until_the_first_song():
+    history = SongHistory(10, capacity=4)
+    for index in [3, 1, 4, 1, 5]:
+        history.add(index)
+    assert [history.back() for _ in range(4)] == [1, 4, 1, None]
+    assert history.current == 1
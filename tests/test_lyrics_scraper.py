@@ -0,0 +1,57 @@
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import pytest
+from vlcyt import lyrics_scraper
+
+pytest.importorskip("requests")
+pytest.importorskip("bs4")
+
+lyrics_page = (
+    "<html><body><div></div><div class='col-xs-12'>"
+    + "<div></div>" * 7
+    + "<div>Never gonna give you up</div></div></body></html>"
+)
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Answers like the lyrics site, the search result links to the lyrics page on the same server.
+    """
+
+    def do_GET(self):
+        if self.path.startswith("/search.php"):
+            self.server.queries.append(self.path)
+            body = f"<html><body><table><tr><td><a href='http://127.0.0.1:{self.server.server_port}/song.html'>Song</a></td></tr></table></body></html>"
+        else:
+            body = lyrics_page
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.end_headers()
+        self.wfile.write(body.encode("utf-8"))
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stand_in_server():
+    server = HTTPServer(("127.0.0.1", 0), StandInHandler)
+    server.queries = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_search_url_can_be_set_after_import(stand_in_server, monkeypatch):
+    monkeypatch.setenv(
+        lyrics_scraper.search_url_variable, f"http://127.0.0.1:{stand_in_server.server_port}/search.php?"
+    )
+    assert lyrics_scraper.get_lyrics("Rick Astley Never Gonna Give You Up") == "Never gonna give you up"
+    assert stand_in_server.queries == ["/search.php?q=Rick+Astley+Never+Gonna+Give+You+Up"]
+
+
+def test_search_url_defaults_to_the_lyrics_site(monkeypatch):
+    monkeypatch.delenv(lyrics_scraper.search_url_variable, raising=False)
+    assert lyrics_scraper.get_search_url() == lyrics_scraper.default_search_url
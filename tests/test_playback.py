@@ -0,0 +1,66 @@
+import asyncio
+import threading
+from tests.conftest import run_playback
+from vlcyt.settings import SettingsStore
+
+
+def skip(player):
+    player.cmds.execute_command("skip", None)
+
+
+def back(player):
+    player.cmds.execute_command("back", None)
+
+
+def play(query):
+    return lambda player: player.cmds.execute_command("play", query)
+
+
+def test_songs_play_in_order(create_player):
+    player = create_player(10)
+    assert asyncio.run(run_playback(player, [skip, skip])) == [0, 1, 2]
+
+
+def test_quick_back_commands_each_go_back_one_song(create_player):
+    player = create_player(10)
+    played = asyncio.run(run_playback(player, [skip, skip, skip, skip, [back, back]]))
+    assert played == [0, 1, 2, 3, 4, 3, 2]
+
+
+def test_back_then_skip_in_quick_succession(create_player):
+    player = create_player(10)
+    played = asyncio.run(run_playback(player, [skip, skip, [back, skip]]))
+    assert played == [0, 1, 2, 1, 2]
+
+
+def test_quick_play_commands_each_play_their_song(create_player):
+    player = create_player(10)
+    first, second = (player.playlist.get_loaded(index) for index in (6, 3))
+    played = asyncio.run(run_playback(player, [[play(first.title), play(second.title)], skip]))
+    assert played == [0, 6, 3, 4]
+
+
+def test_playback_state_is_taken_on_the_event_loop(create_player, tmp_path):
+    settings = SettingsStore(str(tmp_path / "settings.json"))
+    player = create_player(10, settings=settings)
+    get_shuffle_state = player.shuffler.get_state
+    threads = set()
+
+    def record_thread():
+        threads.add(threading.current_thread())
+        return get_shuffle_state()
+
+    player.shuffler.get_state = record_thread
+    asyncio.run(run_playback(player, [skip, skip]))
+    assert threads == {threading.current_thread()}
+    assert SettingsStore(settings.path).playback["index"] == 2
+
+
+def test_crossfaded_songs_clear_their_failures(create_player):
+    player = create_player(10, crossfade_seconds=1)
+    videoid = player.playlist.get_loaded(0).videoid
+    player.resolver.record_failure(videoid)
+    player._seconds_until_gapless_transition = lambda: 0.01  # Every song reaches its crossfade right away
+    played = asyncio.run(run_playback(player, [lambda player: None] * 5))
+    assert played[:2] == [0, 1]
+    assert player.stream_cache.get_failures(videoid) == 0
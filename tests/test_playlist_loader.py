@@ -0,0 +1,70 @@
+import time
+import pytest
+from vlcyt import playlist_loader
+from vlcyt.playlist_loader import LazyPlaylist, MergedPlaylist
+
+
+class FakePlaylists:
+    """
+    Stands in for call_gdata_if_changed(), answers playlistItems requests one song per page.
+    """
+
+    def __init__(self, videoids, failing=()):
+        self.videoids = videoids  # Playlist id -> videoids in playlist order
+        self.failing = failing  # Playlist ids whose requests raise
+
+    def __call__(self, api, query, etag=None):
+        time.sleep(0.005)  # Gives waiters a chance to wake up between pages
+        if query["playlistId"] in self.failing:
+            raise OSError("network error")
+        videoids = self.videoids[query["playlistId"]]
+        position = int(query.get("pageToken") or 0)
+        page = {
+            "items": [
+                {
+                    "status": {"privacyStatus": "public"},
+                    "snippet": {"title": videoids[position], "resourceId": {"videoId": videoids[position]}},
+                }
+            ]
+        }
+        if position + 1 < len(videoids):
+            page["nextPageToken"] = str(position + 1)
+        return page
+
+
+@pytest.fixture
+def fake_playlists(monkeypatch):
+    def install(videoids, failing=()):
+        fake = FakePlaylists(videoids, failing)
+        monkeypatch.setattr(playlist_loader, "call_gdata_if_changed", fake)
+        monkeypatch.setattr(LazyPlaylist, "_fetch_item_count", lambda self: len(videoids[self.plid]))
+        return fake
+
+    return install
+
+
+def snapshot_of(plid, videoids):
+    return {plid: [{"token": None, "etag": None, "next": None, "skipped": 0, "songs": [(videoid, videoid, None) for videoid in videoids]}]}
+
+
+def test_apply_sync_works_right_after_wait_until_loaded(fake_playlists):
+    fake_playlists({"PLa": ["a", "b", "c"]})
+    loaded_pages = []
+    for _ in range(20):
+        playlist = MergedPlaylist(
+            ["PLa"], snapshot=snapshot_of("PLa", ["c", "b", "a"]), loaded_callback=loaded_pages.append
+        )
+        playlist.wait_until_loaded()
+        assert playlist.apply_sync() == [2, 1, 0]
+        assert [playlist.get_loaded(index).videoid for index in range(len(playlist))] == ["a", "b", "c"]
+    assert len(loaded_pages) == 20
+
+
+def test_wait_until_loaded_returns_when_a_playlist_fails(fake_playlists):
+    fake_playlists({"PLa": ["a", "b"], "PLb": ["c"]}, failing=("PLb",))
+    loaded_pages = []
+    playlist = MergedPlaylist(["PLa", "PLb"], loaded_callback=loaded_pages.append)
+    playlist.wait_until_loaded()
+    assert playlist.is_fully_loaded()
+    assert playlist.apply_sync() is None
+    assert loaded_pages == []
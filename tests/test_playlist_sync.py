@@ -0,0 +1,100 @@
+import pytest
+from vlcyt.playlist_snapshot import save_snapshot
+
+
+def relaunch(create_player, fake_youtube, total_songs, change_videos):
+    """
+    Loads a playlist, saves its snapshot, changes the playlist, and returns a player launched from the snapshot.
+    The player's queue is still in snapshot order, _apply_playlist_sync() brings it up to date.
+    """
+    player = create_player(total_songs)
+    playlist = player.playlist.playlists[0]
+    save_snapshot({playlist.plid: playlist.get_pages()})
+    videos = list(fake_youtube.get_videos(playlist.plid))
+    change_videos(videos)
+    fake_youtube.playlist_videos[playlist.plid] = videos
+    fake_youtube.not_modified = 0
+    return create_player(plid=playlist.plid)
+
+
+def drawn_indexes(shuffler):
+    state = shuffler.get_state()
+    if "drawn" in state:
+        return set(state["drawn"])
+    return set(state["order"][: state["position"]])
+
+
+def videoids(player, indexes):
+    return [player.playlist.get_loaded(index).videoid for index in indexes]
+
+
+def play(player, indexes):
+    """
+    Plays the passed in indexes as the playback loop would, drawing them from the shuffler.
+    """
+    for index in indexes:
+        player.song_history.add(index)
+        player.shuffler.mark_drawn(index)
+    player.song_index = indexes[-1] + 1
+
+
+def test_unchanged_pages_are_reused(create_player, fake_youtube):
+    player = relaunch(create_player, fake_youtube, 120, lambda videos: None)
+    assert player.playlist.playlists[0].unchanged_pages == 3
+    assert fake_youtube.not_modified == 3
+    queue = videoids(player, range(120))
+    player._apply_playlist_sync()
+    assert videoids(player, range(120)) == queue
+
+
+@pytest.mark.parametrize("shuffle_mode", ["random", "plays"])
+def test_reordered_songs_keep_their_history_and_shuffle_state(create_player, fake_youtube, shuffle_mode):
+    def reverse_last_page(videos):
+        videos[100:] = reversed(videos[100:])
+
+    player = relaunch(create_player, fake_youtube, 120, reverse_last_page)
+    assert player.playlist.playlists[0].unchanged_pages == 2  # Only the last page changed
+    player.set_shuffle_mode(shuffle_mode)
+    played = [3, 105, 110]
+    played_videoids = videoids(player, played)
+    play(player, played)
+    player._apply_playlist_sync()
+    moved = [3, 114, 109]
+    assert videoids(player, moved) == played_videoids
+    assert [player.song_history[position] for position in range(-3, 0)] == moved
+    assert all(player.song_history.was_played(index) for index in moved)
+    assert drawn_indexes(player.shuffler) == set(moved)
+    assert player.song_index == 110  # Playing in order continues after the song that was playing
+
+
+@pytest.mark.parametrize("shuffle_mode", ["random", "plays"])
+def test_removed_songs_are_dropped_from_history_and_shuffle_state(create_player, fake_youtube, shuffle_mode):
+    player = relaunch(create_player, fake_youtube, 120, lambda videos: videos.remove(10))
+    player.set_shuffle_mode(shuffle_mode)
+    removed_videoid, next_videoid = videoids(player, [10, 11])
+    play(player, [50, 10])
+    player._apply_playlist_sync()
+    assert player.total_songs == 119
+    assert player.playlist.index_of(removed_videoid) is None
+    assert list(player.song_history) == [49]
+    assert not any(player.song_history.was_played(index) for index in range(119) if index != 49)
+    assert len(player.shuffler) == 119
+    assert drawn_indexes(player.shuffler) == {49}
+    assert videoids(player, [player.song_index]) == [next_videoid]  # The removed song was playing, the one after it is next
+    assert sorted(player.shuffler.next() for _ in range(118)) == [index for index in range(119) if index != 49]
+
+
+@pytest.mark.parametrize("shuffle_mode", ["random", "plays"])
+def test_added_songs_join_the_queue_undrawn(create_player, fake_youtube, shuffle_mode):
+    player = relaunch(create_player, fake_youtube, 120, lambda videos: videos.insert(60, 500))
+    assert player.playlist.playlists[0].unchanged_pages == 1  # The first page is the same
+    player.set_shuffle_mode(shuffle_mode)
+    play(player, [59, 60, 61])
+    played_videoids = videoids(player, [59, 60, 61])
+    player._apply_playlist_sync()
+    assert player.total_songs == 121
+    assert videoids(player, [60]) == [fake_youtube.videoid(player.playlist.playlists[0].plid, 500)]
+    assert videoids(player, [59, 61, 62]) == played_videoids
+    assert drawn_indexes(player.shuffler) == {59, 61, 62}
+    assert len(player.shuffler) == 121
+    assert player.song_index == 63
@@ -0,0 +1,62 @@
+import types
+import pytest
+from vlcyt.playlist_loader import Track
+from vlcyt.prefetch import StreamPrefetcher
+from vlcyt.stream_cache import StreamCache
+
+song = Track("dQw4w9WgXcQ", "Title", "Author")
+
+
+class FakeResolver:
+    """
+    Stands in for StreamResolver, returns a new URL on every call.
+    """
+
+    def __init__(self):
+        self.calls = 0
+
+    def resolve(self, song, format_index=0):
+        self.calls += 1
+        return f"https://x/{song.videoid}/{self.calls}"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """
+    Moves the wall clock of the stream cache and the monotonic clock of the prefetcher together.
+    """
+    now = [1000000.0]
+    monkeypatch.setattr("vlcyt.stream_cache.time", types.SimpleNamespace(time=lambda: now[0]))
+    monkeypatch.setattr("vlcyt.prefetch.time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def prefetcher(tmp_path):
+    return StreamPrefetcher([song], StreamCache(str(tmp_path / "stream_cache.json")), FakeResolver())
+
+
+def test_cached_urls_keep_the_time_they_were_resolved_at(prefetcher, clock):
+    stored_at = clock[0]
+    prefetcher.stream_cache.set_url(song.videoid, "https://x/cached")
+    clock[0] += StreamPrefetcher.max_url_age - 10
+    assert prefetcher._resolve(0) == (song.videoid, "https://x/cached", stored_at)
+    prefetcher.prefetch([0])
+    prefetcher._pending[0].result()
+    clock[0] += 20
+    assert prefetcher.get_url(0, song) == "https://x/dQw4w9WgXcQ/1"  # The cached URL went stale while waiting
+    assert prefetcher.resolver.calls == 1
+
+
+def test_cached_urls_older_than_max_url_age_are_resolved_again(prefetcher, clock):
+    prefetcher.stream_cache.set_url(song.videoid, "https://x/cached")
+    clock[0] += StreamPrefetcher.max_url_age + 1
+    assert prefetcher.get_url(0, song) == "https://x/dQw4w9WgXcQ/1"
+    assert prefetcher.stream_cache.get_url(song.videoid) == "https://x/dQw4w9WgXcQ/1"
+
+
+def test_prefetched_url_is_used_while_fresh(prefetcher, clock):
+    prefetcher.prefetch([0])
+    prefetcher._pending[0].result()
+    assert prefetcher.get_url(0, song) == "https://x/dQw4w9WgXcQ/1"
+    assert prefetcher.resolver.calls == 1
@@ -0,0 +1,114 @@
+import types
+import pytest
+from vlcyt.playlist_loader import Track
+from vlcyt.resolver import StreamResolutionError, StreamResolver
+from vlcyt.stream_cache import StreamCache
+
+song = Track("dQw4w9WgXcQ", "Title", "Author")
+
+
+class FakeGetUrls:
+    """
+    Stands in for get_audio_urls(), fails a set amount of times before returning its URLs.
+    """
+
+    def __init__(self, urls, failures=0):
+        self.urls = urls
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self, song):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise OSError("network error")
+        return self.urls
+
+
+@pytest.fixture
+def stream_cache(tmp_path):
+    return StreamCache(str(tmp_path / "stream_cache.json"))
+
+
+def create_resolver(stream_cache, get_urls):
+    sleeps = []
+    return StreamResolver(stream_cache, get_urls=get_urls, sleep=sleeps.append), sleeps
+
+
+def test_resolves_the_best_format_first_try(stream_cache):
+    get_urls = FakeGetUrls(["best", "worse"])
+    resolver, sleeps = create_resolver(stream_cache, get_urls)
+    assert resolver.resolve(song) == "best"
+    assert get_urls.calls == 1
+    assert sleeps == []
+
+
+def test_retries_with_exponential_backoff(stream_cache):
+    get_urls = FakeGetUrls(["best"], failures=StreamResolver.max_attempts - 1)
+    resolver, sleeps = create_resolver(stream_cache, get_urls)
+    assert resolver.resolve(song) == "best"
+    assert get_urls.calls == StreamResolver.max_attempts
+    assert sleeps == [StreamResolver.backoff_seconds * 2 ** retry for retry in range(StreamResolver.max_attempts - 1)]
+
+
+def test_raises_once_every_attempt_failed(stream_cache):
+    get_urls = FakeGetUrls(["best"], failures=StreamResolver.max_attempts)
+    resolver, sleeps = create_resolver(stream_cache, get_urls)
+    with pytest.raises(StreamResolutionError):
+        resolver.resolve(song)
+    assert get_urls.calls == StreamResolver.max_attempts
+    assert len(sleeps) == StreamResolver.max_attempts - 1
+
+
+def test_falls_back_to_worse_formats(stream_cache):
+    resolver, _ = create_resolver(stream_cache, FakeGetUrls(["best", "worse", "combined"]))
+    assert [resolver.resolve(song, format_index) for format_index in range(3)] == ["best", "worse", "combined"]
+
+
+def test_raises_when_formats_run_out(stream_cache):
+    resolver, _ = create_resolver(stream_cache, FakeGetUrls(["best", "worse"]))
+    with pytest.raises(StreamResolutionError):
+        resolver.resolve(song, 2)
+    resolver, _ = create_resolver(stream_cache, FakeGetUrls([]))
+    with pytest.raises(StreamResolutionError):
+        resolver.resolve(song)
+
+
+def test_video_is_dead_after_failure_threshold_failures_in_a_row(stream_cache):
+    resolver, _ = create_resolver(stream_cache, FakeGetUrls(["best"]))
+    for _ in range(StreamResolver.failure_threshold - 1):
+        resolver.record_failure(song.videoid)
+        assert not resolver.is_dead(song.videoid)
+    resolver.record_failure(song.videoid)
+    assert resolver.is_dead(song.videoid)
+
+
+def test_success_clears_failures(stream_cache):
+    resolver, _ = create_resolver(stream_cache, FakeGetUrls(["best"]))
+    for _ in range(StreamResolver.failure_threshold - 1):
+        resolver.record_failure(song.videoid)
+    resolver.record_success(song.videoid)
+    resolver.record_failure(song.videoid)
+    assert stream_cache.get_failures(song.videoid) == 1
+    assert not resolver.is_dead(song.videoid)
+
+
+def test_failures_are_shared_through_the_saved_stream_cache(stream_cache):
+    resolver, _ = create_resolver(stream_cache, FakeGetUrls(["best"]))
+    for _ in range(StreamResolver.failure_threshold):
+        resolver.record_failure(song.videoid)
+    stream_cache.save()
+    next_session, _ = create_resolver(StreamCache(stream_cache.cache_path), FakeGetUrls(["best"]))
+    assert next_session.is_dead(song.videoid)
+
+
+def test_dead_videos_are_tried_again_once_their_failures_expire(stream_cache, monkeypatch):
+    now = [1000000.0]
+    monkeypatch.setattr("vlcyt.stream_cache.time", types.SimpleNamespace(time=lambda: now[0]))
+    resolver, _ = create_resolver(stream_cache, FakeGetUrls(["best"]))
+    for _ in range(StreamResolver.failure_threshold):
+        resolver.record_failure(song.videoid)
+    now[0] += StreamCache.failures_ttl - 1
+    assert resolver.is_dead(song.videoid)
+    now[0] += 2
+    assert not resolver.is_dead(song.videoid)
+    assert stream_cache.get_failures(song.videoid) == 0
@@ -0,0 +1,113 @@
+import threading
+import pytest
+from vlcyt.playlist_loader import Track
+from vlcyt.search import SongSearchIndex, _is_one_typo_apart
+
+
+def create_index(titles):
+    index = SongSearchIndex(lambda song: song.title)
+    index.add(Track(f"vid{number:08d}", title, None) for number, title in enumerate(titles))
+    return index
+
+
+def search_titles(index, query, limit=10):
+    return [title for _, title in index.search(query, limit)]
+
+
+def test_songs_matching_more_words_rank_first():
+    index = create_index(["Midnight Train", "Summer Train Home", "Midnight Summer Dream"])
+    assert search_titles(index, "midnight summer")[0] == "Midnight Summer Dream"
+
+
+def test_exact_words_rank_above_prefixes_and_typos():
+    index = create_index(["Lovely Day", "Love Song", "Lobe Fin"])
+    assert search_titles(index, "love") == ["Love Song", "Lovely Day"]  # Typos are only corrected without an exact match
+
+
+def test_rarer_words_rank_higher():
+    index = create_index(["Night One", "Night Two", "Night Three", "Rare Gem"] + [f"Night {number}" for number in range(20)])
+    assert search_titles(index, "night gem", limit=1) == ["Rare Gem"]
+
+
+def test_shorter_titles_break_ties():
+    index = create_index(["Heart of Glass Extended Mix Remastered", "Heart of Glass"])
+    assert search_titles(index, "glass") == ["Heart of Glass", "Heart of Glass Extended Mix Remastered"]
+
+
+def test_whole_phrase_ranks_above_scattered_words():
+    index = create_index(["Blue Sky Red", "Red Sky Blue"])
+    assert search_titles(index, "red sky") == ["Red Sky Blue", "Blue Sky Red"]
+
+
+def test_prefixes_match_the_start_of_words():
+    index = create_index(["Midnight City", "Amid the Noise", "Middle of Nowhere"])
+    assert sorted(search_titles(index, "mid")) == ["Middle of Nowhere", "Midnight City"]
+    assert search_titles(index, "m") == []  # Shorter than min_prefix_length
+
+
+def test_one_typo_is_tolerated():
+    index = create_index(["Midnight City", "Summer Nights"])
+    for query in ["midnigth", "midnght", "midnightt", "midnighr"]:
+        assert search_titles(index, query) == ["Midnight City"], query
+    assert search_titles(index, "mdinihgt") == []  # Two typos
+    assert search_titles(index, "citu") == ["Midnight City"]
+    assert search_titles(index, "cty") == []  # Shorter than min_typo_length
+
+
+@pytest.mark.parametrize(
+    "a, b, expected",
+    [
+        ("night", "nigt", True),
+        ("night", "nights", True),
+        ("night", "nihgt", True),
+        ("night", "might", True),
+        ("night", "night", False),
+        ("night", "ni", False),
+        ("night", "nitgh", False),
+    ],
+)
+def test_is_one_typo_apart(a, b, expected):
+    assert _is_one_typo_apart(a, b) == expected
+    assert _is_one_typo_apart(b, a) == expected
+
+
+def test_changed_titles_are_indexed_again():
+    index = create_index(["Old Name"])
+    index.add([Track("vid00000000", "New Name", None)])
+    assert len(index) == 1
+    assert search_titles(index, "old") == []
+    assert search_titles(index, "new") == ["New Name"]
+
+
+def test_searching_while_pages_are_indexed_in_the_background():
+    index = SongSearchIndex(lambda song: song.title)
+    pages = [[Track(f"vid{page:04d}{number:04d}", f"Song {page} Track {number}", None) for number in range(50)] for page in range(40)]
+    errors = []
+    stop = threading.Event()
+
+    def search_repeatedly():
+        try:
+            while not stop.is_set():
+                index.search("track", limit=5)
+                index.search("sogn 3")
+        except Exception as e:
+            errors.append(e)
+
+    searcher = threading.Thread(target=search_repeatedly)
+    searcher.start()
+    for page in pages:
+        index.add_in_background(page)
+    index._executor.submit(lambda: None).result()  # The index has one worker, so every page queued before this is indexed
+    stop.set()
+    searcher.join()
+    assert errors == []
+    assert not index.is_indexing()
+    assert len(index) == 2000
+    assert search_titles(index, "song 39 track 49", limit=1) == ["Song 39 Track 49"]
+
+
+def test_find_searches_songs_as_the_playlist_loads(create_player):
+    player = create_player(120)
+    player.search_index._executor.submit(lambda: None).result()
+    last_song = player.playlist.get_loaded(119)
+    assert (119, player.title_cleaner.clean(last_song.title)) in player.find_songs(last_song.title)
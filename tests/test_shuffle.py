@@ -0,0 +1,201 @@
+import bisect
+import collections
+import itertools
+import json
+import random
+import statistics
+import pytest
+from vlcyt.shuffle import FenwickTree, ShuffleScheduler, WeightedShuffleScheduler
+
+
+@pytest.mark.parametrize("total_songs", [2, 3, 4, 10])
+def test_new_pass_never_starts_with_the_last_song(total_songs):
+    for seed in range(500):
+        shuffler = ShuffleScheduler(total_songs, seed=seed)
+        drawn = [shuffler.next() for _ in range(total_songs * 3)]
+        for pass_end in range(total_songs, len(drawn), total_songs):
+            assert drawn[pass_end] != drawn[pass_end - 1], f"seed {seed}"
+
+
+@pytest.mark.parametrize("total_songs", [1, 2, 5, 37])
+def test_every_pass_draws_every_song_once(total_songs):
+    shuffler = ShuffleScheduler(total_songs, seed=1)
+    for _ in range(4):
+        assert sorted(shuffler.next() for _ in range(total_songs)) == list(range(total_songs))
+
+
+def test_peek_returns_the_next_song():
+    shuffler = ShuffleScheduler(10, seed=3)
+    for _ in range(25):
+        assert shuffler.peek() == shuffler.next()
+
+
+def test_marked_songs_are_skipped_this_pass():
+    shuffler = ShuffleScheduler(10, seed=4)
+    peeked = shuffler.peek()
+    marked = [index for index in range(10) if index != peeked][:3]
+    for index in marked:
+        shuffler.mark_drawn(index)
+    rest = [shuffler.next() for _ in range(7)]
+    assert rest[0] == peeked
+    assert sorted(rest + marked) == list(range(10))
+
+
+def test_state_round_trip_continues_the_same_order():
+    shuffler = ShuffleScheduler(20, seed=5)
+    for _ in range(7):
+        shuffler.next()
+    shuffler.peek()
+    restored = ShuffleScheduler(20)
+    assert restored.set_state(shuffler.get_state())
+    assert [restored.next() for _ in range(30)] == [shuffler.next() for _ in range(30)]
+
+
+def test_song_marked_after_a_finished_pass_starts_the_next_pass():
+    for seed in range(200):
+        shuffler = ShuffleScheduler(3, seed=seed)
+        for _ in range(3):
+            shuffler.next()
+        shuffler.mark_drawn(0)
+        assert sorted(shuffler.next() for _ in range(2)) == [1, 2], f"seed {seed}"
+
+
+def test_no_songs():
+    shuffler = ShuffleScheduler(0, seed=6)
+    assert shuffler.peek() is None
+    assert shuffler.next() is None
+    shuffler.mark_drawn(0)
+    shuffler.resize(2)
+    assert sorted(shuffler.next() for _ in range(2)) == [0, 1]
+
+
+def create_weighted(weights, authors=None, seed=None):
+    return WeightedShuffleScheduler(
+        len(weights),
+        lambda index: weights[index],
+        lambda index: None if authors is None else authors[index],
+        seed=seed,
+    )
+
+
+@pytest.mark.parametrize("total", [1, 100, 1000, 4096])
+def test_fenwick_tree_matches_running_totals(total):
+    rng = random.Random(total)
+    weights = [rng.random() for _ in range(total)]
+    tree = FenwickTree(weights[: total // 2])
+    for weight in weights[total // 2 :]:
+        tree.append(weight)
+    for _ in range(50):
+        index = rng.randrange(total)
+        delta = rng.random()
+        tree.add(index, delta)
+        weights[index] += delta
+    running_totals = list(itertools.accumulate(weights))
+    for count in rng.sample(range(total + 1), min(total + 1, 100)):
+        assert tree.prefix_sum(count) == pytest.approx(sum(weights[:count]))
+    for _ in range(100):
+        value = rng.random() * running_totals[-1]
+        assert tree.find(value) == bisect.bisect_right(running_totals, value)
+
+
+@pytest.mark.parametrize("total_songs", [1, 2, 7, 300])
+def test_weighted_passes_draw_every_song_once(total_songs):
+    rng = random.Random(total_songs)
+    weights = [rng.choice([0.0, 0.1, 1.0, 5.0]) for _ in range(total_songs)]  # Weights of 0 are raised to min_weight
+    authors = [rng.choice("abc") for _ in range(total_songs)]
+    shuffler = create_weighted(weights, authors, seed=1)
+    drawn = [shuffler.next() for _ in range(total_songs * 4)]
+    for start in range(0, len(drawn), total_songs):
+        assert sorted(drawn[start : start + total_songs]) == list(range(total_songs))
+    for pass_end in range(total_songs, len(drawn), total_songs):
+        if total_songs > 1:
+            assert drawn[pass_end] != drawn[pass_end - 1]
+
+
+def test_first_draw_follows_the_weights():
+    weights = [1.0, 2.0, 3.0, 4.0]
+    trials = 8000
+    counts = collections.Counter(create_weighted(weights, seed=seed).next() for seed in range(trials))
+    for index, weight in enumerate(weights):
+        assert counts[index] / trials == pytest.approx(weight / sum(weights), abs=0.02)
+
+
+def test_heavier_songs_come_up_earlier_in_a_pass():
+    weights = [1.0] * 50 + [20.0] * 50
+    positions = collections.defaultdict(list)
+    for seed in range(40):
+        shuffler = create_weighted(weights, seed=seed)
+        for position in range(100):
+            positions[shuffler.next() >= 50].append(position)
+    assert statistics.mean(positions[True]) < 35 < 65 < statistics.mean(positions[False])
+
+
+def test_uploaders_are_spread_while_others_remain():
+    authors = ["a"] * 5 + ["b"] * 5
+    for seed in range(200):
+        shuffler = create_weighted([1.0] * 10, authors, seed=seed)
+        drawn = [shuffler.next() for _ in range(30)]
+        for previous, index in zip(drawn, drawn[1:]):
+            assert authors[previous] != authors[index], f"seed {seed}"
+
+
+def test_uploaders_repeat_once_no_one_else_is_left():
+    authors = ["a"] * 8 + ["b"]
+    shuffler = create_weighted([1.0] * 9, authors, seed=7)
+    drawn = [shuffler.next() for _ in range(9)]
+    assert sorted(drawn) == list(range(9))
+    after_b = drawn.index(8) + 1
+    assert all(authors[index] == "a" for index in drawn[after_b:])
+
+
+def test_weighted_state_round_trip_continues_the_same_order():
+    weights = [1.0 + index % 4 for index in range(30)]
+    authors = [index % 3 for index in range(30)]
+    shuffler = create_weighted(weights, authors, seed=8)
+    for _ in range(11):
+        shuffler.next()
+    shuffler.peek()
+    restored = create_weighted(weights, authors)
+    assert restored.set_state(json.loads(json.dumps(shuffler.get_state())))
+    assert [restored.next() for _ in range(60)] == [shuffler.next() for _ in range(60)]
+
+
+def test_weighted_invalid_state_is_rejected():
+    shuffler = create_weighted([1.0] * 5, seed=9)
+    assert not shuffler.set_state({"drawn": "x"})
+    assert not shuffler.set_state({})
+    assert sorted(shuffler.next() for _ in range(5)) == list(range(5))
+
+
+def test_weighted_remap_moves_drawn_songs_and_adds_new_ones():
+    weights = [1.0] * 6
+    shuffler = create_weighted(weights, seed=10)
+    drawn = [shuffler.next() for _ in range(3)]
+    index_map = [5 - index for index in range(6)]  # Reversed
+    index_map[drawn[0]] = None  # Removed
+    weights.extend([1.0, 1.0])
+    shuffler.remap(index_map, 7)
+    assert len(shuffler) == 7
+    assert set(shuffler.get_state()["drawn"]) == {5 - index for index in drawn[1:]}
+    rest = [shuffler.next() for _ in range(5)]
+    assert sorted(rest + [5 - index for index in drawn[1:]]) == list(range(7))
+
+
+def test_weighted_song_marked_after_a_finished_pass_starts_the_next_pass():
+    for seed in range(100):
+        shuffler = create_weighted([1.0] * 3, seed=seed)
+        for _ in range(3):
+            shuffler.next()
+        shuffler.mark_drawn(0)
+        assert sorted(shuffler.next() for _ in range(2)) == [1, 2], f"seed {seed}"
+
+
+def test_weighted_no_songs():
+    weights = []
+    shuffler = create_weighted(weights, seed=11)
+    assert shuffler.peek() is None
+    assert shuffler.next() is None
+    shuffler.mark_drawn(0)
+    weights.extend([1.0, 1.0])
+    shuffler.resize(2)
+    assert sorted(shuffler.next() for _ in range(2)) == [0, 1]
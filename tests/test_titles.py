@@ -0,0 +1,28 @@
+import json
+from benchmarks.title_cleaner import check_golden, corpus_path
+from vlcyt.titles import TitleCleaner, default_removal_rules, load_removal_rules
+
+
+def test_golden_corpus():
+    with open(corpus_path, "r", encoding="utf-8") as corpus_file:
+        corpus = json.load(corpus_file)
+    assert check_golden(TitleCleaner(), corpus) == []
+
+
+def test_invalid_rules_are_skipped_with_a_warning(tmp_path, capsys):
+    rules_path = tmp_path / "title_rules.txt"
+    rules_path.write_text("# Comment\n\\s*\\(Remastered\\)\n(unclosed\n\n[also unclosed\n", encoding="utf-8")
+    cleaner = TitleCleaner(load_removal_rules(str(rules_path)))
+    assert cleaner.removal_rules == [r"\s*\(Remastered\)"]
+    assert cleaner.clean("Song (Remastered)") == "Song"
+    output = capsys.readouterr().out
+    assert "(unclosed" in output and "[also unclosed" in output
+
+
+def test_no_valid_rules_leaves_titles_unchanged():
+    assert TitleCleaner(["(unclosed"]).clean("Song (Official Video)") == "Song (Official Video)"
+
+
+def test_default_rules_are_valid(capsys):
+    assert TitleCleaner().removal_rules == default_removal_rules
+    assert capsys.readouterr().out == ""
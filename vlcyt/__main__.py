@@ -1,4 +1,5 @@
 from vlcyt.app import main
 
 
-main()
+if __name__ == "__main__":  # Worker processes import this module too, only the launched process runs VLCYT
+    main()
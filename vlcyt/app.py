@@ -1,11 +1,28 @@
-import pafy
-import os
 import time
+
+launch_time = time.perf_counter()  # Taken before the imports below so time to first audio includes them
+import asyncio
+import contextlib
+import os
+import pathlib
 import sys
-import threading
-import random
-import re
+from vlcyt import playback_events, youtube_api
 from vlcyt.command_handler import CommandHandler
+from vlcyt.display import NowPlayingPanel
+from vlcyt.history import SongHistory
+from vlcyt.lyrics_scraper import LyricsFetcher
+from vlcyt.metadata import MetadataFetcher
+from vlcyt.playlist_loader import MergedPlaylist
+from vlcyt.playlist_snapshot import load_snapshot, save_snapshot
+from vlcyt.prefetch import StreamPrefetcher
+from vlcyt.resolver import StreamResolutionError, StreamResolver
+from vlcyt.search import SongSearchIndex
+from vlcyt.shuffle import ShuffleScheduler, WeightedShuffleScheduler
+from vlcyt.song_stats import SongStats, shuffle_modes
+from vlcyt.stream_cache import StreamCache
+from vlcyt.telemetry import telemetry
+from vlcyt.settings import SettingsStore
+from vlcyt.titles import TitleCleaner, load_removal_rules
 from vlcyt.file_helpers import *
 from colorama import Fore, Back, Style
 
@@ -16,86 +33,363 @@ class VLCYT:
     """
 
     command_string = f"{Fore.RESET}{Back.RESET}>"
+    preload_seconds = 15  # Seconds before the end of a song that the next song starts buffering in gapless mode
+    max_playback_attempts = 3  # Times a song is started before it is skipped, later attempts fall back to worse formats
+    metadata_window = 50  # Songs requested in one videos.list call when the next song's metadata isn't cached
+    first_audio_target = 3.0  # Seconds from launch until the first song plays, slower startups are reported
 
-    def __init__(self, youtube_playlist_url, youtube_api_key, song_info_enabled=True):
-        pafy.set_api_key(youtube_api_key)
-        self.playlist = pafy.get_playlist2(youtube_playlist_url)  # Pafy playlist object
-        self.song_index = 0  # Current song index
-        self.song_counter = 0  # Stores how many songs have been played, resets if every song has been played.
-        self.total_songs = len(self.playlist)  # Amount of songs in the Pafy object
+    def __init__(
+        self,
+        youtube_playlist_urls,
+        youtube_api_key,
+        song_info_enabled=True,
+        gapless=False,
+        crossfade_seconds=0,
+        shuffle_seed=None,
+        interactive=True,
+        settings=None,
+        audio_cache_megabytes=0,
+        warm_processes=2,
+    ):
+        self._init_started = time.perf_counter()
+        youtube_api.set_api_key(youtube_api_key)  # pafy is imported once it is needed, see youtube_api.get_pafy()
+        self.stream_cache = StreamCache()  # Stream URLs and metadata saved between sessions
+        self.metadata_fetcher = MetadataFetcher(self.stream_cache)  # Fetches displayed song information in batches
+        self.loop = None  # asyncio event loop that owns the player state, set once playback starts
+        self.title_cleaner = TitleCleaner(load_removal_rules())  # Default rules unless the user stored their own
+        self.search_index = SongSearchIndex(
+            lambda song: self.title_cleaner.clean(song.title)
+        )  # Cleaned titles for the find and play commands, built as pages load. Bypasses the title cache so indexing doesn't evict displayed titles
+        self.playlist = MergedPlaylist(
+            youtube_playlist_urls,
+            page_callback=self._on_playlist_page,
+            snapshot=load_snapshot(youtube_playlist_urls),
+            loaded_callback=self._on_playlist_loaded,
+        )  # Deduplicated queue of every playlist, starts from the last launch's snapshot and syncs in the background
+        self.song_index = 0  # Index of the next song to play in order
         self.current_song = None  # Stores the current song
+        self.time_to_first_audio = None  # Seconds from launch until the first song started playing
         os.environ["VLC_VERBOSE"] = "-1"  # Decrease verbosity of VLC error output, necessary because errors sometimes occur that spam the screen but otherwise have no effect
-        self.vlc_player = vlc.MediaPlayer()  # Stores the VLC object
-        self.song_info_enabled = song_info_enabled  # The current song information is printed when the song changes if this is enabled
-        self.song_history = []  # Stores indexes of songs that have been played
+        self.events = playback_events.PlaybackEvents()  # VLC events and user commands that drive the playback loop
+        self.vlc_player = self._create_vlc_player()  # Stores the VLC object
+        self.song_info_enabled = song_info_enabled  # The current song information is shown when the song changes if this is enabled
+        self.now_playing = (
+            NowPlayingPanel() if song_info_enabled else None
+        )  # Current song information and progress bar pinned to the top of the terminal
+        self.interactive = interactive  # Commands are read from the terminal if enabled, daemons read them from the control socket
+        self.song_history = SongHistory(self.total_songs)  # Recently played song indexes for the back command
+        self.resolver = StreamResolver(self.stream_cache)  # Resolves stream URLs with retries and tracks songs that keep failing
+        self.prefetcher = StreamPrefetcher(
+            self.playlist, self.stream_cache, self.resolver
+        )  # Resolves stream URLs of upcoming songs in the background
+        self.stream_warmer = None  # Resolves the whole playlist on worker processes, created by get_stream_warmer()
+        self._youtube_api_key = youtube_api_key
+        self._warm_processes = warm_processes  # Worker processes of the stream warmer
+        self._playback_attempts = 0  # Times the current song has been started
+        self._unplayable_in_a_row = 0  # Songs skipped in a row because they couldn't be played
+        self.audio_cache = None  # Downloaded songs that play from disk, disabled unless a size budget is passed in
+        if audio_cache_megabytes > 0:
+            from vlcyt.audio_cache import AudioCache  # Imported only when enabled, it loads urllib.request
+
+            self.audio_cache = AudioCache(int(audio_cache_megabytes * 1024 * 1024))
+        self.lyrics_fetcher = LyricsFetcher()  # Retrieves and caches lyrics in the background
+        self.lyrics_prefetch_enabled = False  # Becomes True once the lyrics command is used, lyrics are then fetched ahead of time
+        self.song_stats = SongStats(
+            settings.song_stats if settings is not None else None
+        )  # Play and skip counts of every song, weighted shuffle modes draw songs by them
+        self.shuffle_seed = shuffle_seed
+        self.shuffle_mode = "random"  # How shuffling weighs songs, see song_stats.shuffle_modes
+        self.shuffler = self._create_shuffler(self.shuffle_mode)  # Chooses shuffled songs without repeats
+
+        # Gapless playback
+        self.gapless = gapless or crossfade_seconds > 0  # Buffers the next song on a second player before the current song ends
+        self.crossfade_seconds = crossfade_seconds  # Seconds the current and next song overlap in gapless mode
+        self._next_vlc_player = self._create_vlc_player() if self.gapless else None  # Buffers the next song
+        self._preload_generation = 0  # Incremented whenever a preload is discarded so late preloads are ignored
+        self._preload_started = False  # Becomes True once the next song has started buffering
+        self._preloaded_song = None  # (index, videoid) of the song buffered on the next player
+        self._crossfade_task = None  # Fades the previous song out while the next song fades in
 
         # User input
-        self.cmds = CommandHandler(self)  # Collects user input on another thread
+        self.cmds = CommandHandler(self)  # Collects user input on another thread and runs commands on the event loop
+        self._exit_requested = False  # Becomes True when the exit command is received
+        self._skip_request = None  # (kind, jump index) of the skip that stopped the last song, see CommandHandler.request_skip()
 
+        # Resuming
+        self.settings = settings  # Settings store the playback state is saved to, playback starts from the beginning without one
+        self._resume = None  # (index, videoid, position in milliseconds) of the song that was playing when VLCYT last stopped
+        self._resume_volume = None  # Volume from the last session, applied once the first song starts
+        if settings is not None and settings.playback:
+            self._restore_playback_state(settings.playback)
+
+        # Telemetry
+        self._play_called_at = None  # When play() was last called, cleared once VLC reports the song is playing
+        self._skip_requested_at = None  # When the last skip was handled, cleared once the next song is playing
+        self._transition = None  # (reason, time) the last song stopped, cleared once the next song starts
+        telemetry.record("startup.init", time.perf_counter() - self._init_started)
+
+    @property
+    def total_songs(self):
+        """
+        Amount of songs in the playlist, exact once every page has been loaded.
+        """
+        return len(self.playlist)
 
     def play_playlist_songs(self):
         """
-        Play every song in the passed in playlist.
+        Play every song in the passed in playlist until the exit command is received.
+        The playback state is saved on the way out, including after Ctrl+C.
+        """
+        try:
+            asyncio.run(self._play_playlist_songs())
+        finally:
+            if self.stream_warmer is not None:
+                self.stream_warmer.stop()
+            if self.now_playing is not None:
+                self.now_playing.close()
+            self.save_playback_state()
+
+    async def _play_playlist_songs(self):
+        """
+        Main coroutine. Owns the player state, commands and VLC events are handled on the same event loop.
         Note: Skip is handled in command_handler and _get_next_song() is executed following a skip.
         """
-        while True:
-            if (
+        self.loop = asyncio.get_running_loop()
+        self.events.bind(self.loop)
+        if self.now_playing is not None:
+            self.loop.create_task(self._refresh_progress_bar())
+        self._apply_playlist_sync()  # The playlists may have finished loading before the event loop started
+        if await self._get_resumed_song():
+            await self._play_current_song()
+        while not self._exit_requested:
+            skip_kind, jump_index = self._skip_request or ("next", None)
+            self._skip_request = None
+            if skip_kind == "back":  # Back command entered
+                await self._get_next_song_back()
+            elif skip_kind == "jump" and jump_index is not None:  # Play command chose a song
+                await self._get_next_song_jump(jump_index)
+            elif (
                 not self.cmds.input_features_enabled()
             ):  # No extra features enabled. Default.
-                self._get_next_song()
-            elif self.cmds.back_song:  # Back command entered
-                self._get_next_song_back()
+                await self._get_next_song()
             elif self.cmds.loop_song:  # Looping enabled
                 pass  # we don't need to change the value of self.current_song in this case
             elif self.cmds.shuffle_playlist:  # Shuffling enabled
-                self.cmds.back_amount = 0
-                self._get_next_song_shuffling()
-            self._play_current_song()
+                await self._get_next_song_shuffling()
+            await self._play_current_song()
+
+    def _on_playlist_loaded(self, playlist_pages):
+        """
+        Called from a playlist loader thread once every playlist has loaded.
+        Saves the snapshot the next launch syncs from and applies the changes to the queue on the event loop.
+        """
+        telemetry.record("playlist.load", time.perf_counter() - self._init_started)
+        save_snapshot(playlist_pages)
+        if self.loop is not None:
+            with contextlib.suppress(RuntimeError):  # The event loop already closed
+                self.loop.call_soon_threadsafe(self._apply_playlist_sync)
+
+    def _apply_playlist_sync(self):
+        """
+        Applies the songs added, removed, and moved in the playlists to the queue while playback continues.
+        Every stored index is moved to where its song is now so the next, back, and shuffle commands keep their songs.
+        """
+        index_map = self.playlist.apply_sync()
+        if index_map is None:
+            return
+        total_songs = self.total_songs
+        self.song_history.remap(index_map, total_songs)
+        self.shuffler.remap(index_map, total_songs)
+        self.song_index = self._remap_song_index(index_map)
+        self.cmds.remap_skip_requests(index_map)  # Songs chosen by the play command that were removed become None
+        if self._resume is not None:
+            index, videoid, position = self._resume
+            moved_index = self.playlist.index_of(videoid)
+            self._resume = None if moved_index is None else (moved_index, videoid, position)
+        self._discard_preloaded_song()  # Buffered by its old index, preloaded again at its new one
+
+    def _remap_song_index(self, index_map):
+        """
+        Returns song_index after the playlist changed, so playing in order continues after the same song.
+        If that song was removed, it continues with the next song that is still in the playlist.
+        """
+        previous_index = self.song_index - 1
+        if 0 <= previous_index < len(index_map) and index_map[previous_index] is not None:
+            return index_map[previous_index] + 1
+        for index in range(max(0, self.song_index), len(index_map)):
+            if index_map[index] is not None:
+                return index_map[index]
+        return 0
+
+    async def _get_resumed_song(self):
+        """
+        Sets the current song to the song that was playing when VLCYT last stopped.
+        Output: True if that song is still in the playlist
+        """
+        if self._resume is None:
+            return False
+        index, videoid, position = self._resume
+        moved_index = self.playlist.index_of(videoid)
+        if moved_index is not None and moved_index != index:  # The song moved since the last session
+            index = moved_index
+            self._resume = (index, videoid, position)
+        found_index, song = await self._run_blocking(self._get_song, index)
+        if found_index != index or song.videoid != videoid:
+            self._resume = None
+            return False
+        self.song_index = index
+        self.current_song = song
+        self._add_song_to_history()
+        self.song_index += 1
+        return True
+
+    async def _run_blocking(self, function, *args):
+        """
+        Runs a blocking call such as a network request in the default executor so the event loop keeps handling commands.
+        """
+        return await self.loop.run_in_executor(None, function, *args)
 
-    def _set_current_song(self, index):
+    def _get_song_mrl(self, index, song):
+        """
+        Blocking, returns the MRL VLC should open for the passed in song.
+        Songs in the audio cache play from disk, other songs are streamed and downloaded into the cache in the background.
+        """
+        if self.audio_cache is not None:
+            path = self.audio_cache.get_path(song.videoid)
+            if path is not None:
+                return pathlib.Path(path).as_uri()
+        stream_url = self.prefetcher.get_url(index, song)
+        if self.audio_cache is not None:
+            self.audio_cache.download(song.videoid, stream_url)
+        return stream_url
+
+    def _get_song(self, index):
+        """
+        Blocking, returns the index and Track of the song at the passed in index once its page has loaded.
+        Output: tuple: index, Track
+        """
+        try:
+            return index, self.playlist[index]
+        except IndexError:  # The playlist turned out shorter than estimated while it was loading
+            index %= self.total_songs
+            return index, self.playlist[index]
+
+    async def _set_current_song(self, index):
         """
         Sets the current song to the index that was passed in.
         """
-        self.current_song = self.playlist[index]
+        found_index, self.current_song = await self._run_blocking(self._get_song, index)
+        moved_index = self.playlist.index_of(self.current_song.videoid)
+        if moved_index is not None:
+            found_index = moved_index  # The playlist synced while the song was being fetched
+        if found_index != index:
+            self.song_index = found_index
 
-    def _get_next_song(self):
+    async def _get_next_song(self):
         """
         Sets the current song to the next song index and adds it to song_history.
         """
-        self.cmds.back_amount = 0
-        self._set_current_song(self.song_index)
+        self.song_index %= self.total_songs  # Round robin once the end of the playlist is reached
+        await self._set_current_song(self.song_index)
         self._add_song_to_history()
         self.song_index += 1
 
-    def _get_next_song_back(self):
+    async def _get_next_song_back(self):
         """
         Sets the current song to the last played song.
         Supports multiple back commands and shuffle.
         """
-        self.cmds.back_amount -= 1
-        if len(self.song_history) > abs(self.cmds.back_amount):
-            self.song_index = self.song_history.pop(self.cmds.back_amount - 1)
-            self._set_current_song(self.song_index)
-            self._add_song_to_history()
+        previous_index = self.song_history.back()
+        if previous_index is not None:
+            self.song_index = previous_index
+            await self._set_current_song(self.song_index)
+            self.song_index += 1
         else:
             print("No songs remaining in history.")
-        self.cmds.back_song = False
 
-    def _get_next_song_shuffling(self):
+    async def _get_next_song_jump(self, jump_index):
+        """
+        Sets the current song to the song chosen by the play command and adds it to song_history.
+        Playing in order continues after it.
+        """
+        self.song_index = jump_index
+        await self._set_current_song(self.song_index)
+        self._add_song_to_history()
+        self.song_index += 1
+
+    async def _get_next_song_shuffling(self):
         """
         Sets the current song to a random unique song in the playlist.
         Even YouTube couldn't write a better shuffling algorithm!
         """
-        found_unique_random = False
-        while not found_unique_random:
-            random_int = random.randint(0, self.total_songs - 1)
-            if random_int not in self.song_history:
-                self.song_index = random_int
-                self._set_current_song(random_int)
-                self._add_song_to_history()
-                found_unique_random = True
-            elif self.song_counter == self.total_songs:
-                self.song_history = [self.song_history[-1]]
+        self.shuffler.resize(self.total_songs)
+        self.song_index = self.shuffler.next()
+        await self._set_current_song(self.song_index)
+        self._add_song_to_history()
+        self.song_index += 1
+
+    def _peek_next_song_index(self):
+        """
+        Returns the index of the song that will play next for the current mode (loop, shuffle or in order).
+        """
+        jump_index = self.cmds.peek_jump_index()
+        if jump_index is not None:
+            return jump_index
+        elif self.cmds.loop_song:
+            return self.song_history.current
+        elif self.cmds.shuffle_playlist:
+            self.shuffler.resize(self.total_songs)
+            return self.shuffler.peek()
+        return self.song_index % self.total_songs
+
+    def _prefetch_upcoming_songs(self):
+        """
+        Predicts which songs can play next and starts resolving their stream URLs in the background.
+        Covers the next song for the current mode and the song the back command would play.
+        """
+        if not self.song_history:
+            return
+        upcoming = [self._peek_next_song_index()]
+        back_index = self.song_history.peek_back()
+        if back_index is not None:
+            upcoming.append(back_index)
+        self.prefetcher.prefetch(upcoming)
+        self._prefetch_metadata(upcoming)
+        self._prefetch_lyrics()
+
+    def _prefetch_metadata(self, upcoming):
+        """
+        Requests the displayed metadata of the upcoming songs in the background.
+        Only a window of songs is requested at a time, requesting every page as it loads would cost thousands of calls
+        on large playlists and crowd stream URLs out of the stream cache.
+        When the next song in order isn't cached, the metadata_window songs from it on are requested in one call.
+        """
+        if not self.song_info_enabled:
+            return
+        indexes = list(upcoming)
+        next_index = self.song_index % self.total_songs
+        next_song = self.playlist.get_loaded(next_index)
+        if (
+            next_index in indexes
+            and next_song is not None
+            and self.stream_cache.get_metadata(next_song.videoid) is None
+        ):
+            indexes.extend(range(next_index + 1, min(next_index + self.metadata_window, self.total_songs)))
+        songs = (self.playlist.get_loaded(index) for index in indexes)
+        self.metadata_fetcher.fetch_in_background(song.videoid for song in songs if song is not None)
+
+    def _prefetch_lyrics(self):
+        """
+        Retrieves lyrics for the current and next song in the background once the lyrics command has been used.
+        The next song is skipped if its playlist page hasn't arrived yet.
+        """
+        if not self.lyrics_prefetch_enabled or self.current_song is None:
+            return
+        songs = [self.current_song]
+        next_song = self.playlist.get_loaded(self._peek_next_song_index())
+        if next_song is not None:
+            songs.append(next_song)
+        self.lyrics_fetcher.prefetch(self._clean_title(song) for song in songs)
 
     def _get_reformatted_song_date(self, date):
         """
@@ -121,103 +415,496 @@ class VLCYT:
         else:
             return original_length_string
 
-    def _clean_title(self):
-        """
-        Cleans the current song's title.
-        """
-        song_title = self.current_song.title
-        removals_regex = [
-            "(\s*\((Official|Audio|Video).*\))",
-            "(\s*\[(Official|Audio|Video).*\])",
-            "\s*-Lyrics\s*",
-            "\(.*Lyric.*\)",
-            "\[.*Lyric.*\]",
-            "\s*Lyrics\s*",
-            "\s*Official Music Video\s*",
-            "\s*\[NCS Release\]\s*",
-        ]
-        rename_song = False
-        new_song_name = (self.current_song.title, 0)
-        searching_for_matches = True
-        while searching_for_matches:
-            new_song_name = re.subn(
-                "|".join(removals_regex), "", new_song_name[0], flags=re.IGNORECASE
+    def _clean_title(self, song=None):
+        """
+        Cleans the passed in song's title, defaults to the current song.
+        """
+        return self.title_cleaner.clean_song_title(song or self.current_song)
+
+    def _on_playlist_page(self, songs):
+        """
+        Called from the playlist loader threads as pages arrive, indexes the new songs' titles for searching.
+        """
+        self.search_index.add_in_background(songs)
+
+    def get_stream_warmer(self):
+        """
+        Returns the stream warmer, creating it the first time the warm command is used.
+        Imported here since it loads multiprocessing, which most sessions never need.
+        """
+        if self.stream_warmer is None:
+            from vlcyt.warm import StreamWarmer
+
+            self.stream_warmer = StreamWarmer(
+                self.stream_cache, self.resolver, self._youtube_api_key, self._warm_processes
             )
-            if new_song_name[1] == 0:
-                searching_for_matches = False
-            else:
-                rename_song = True
-        return new_song_name[0] if rename_song else song_title
+        return self.stream_warmer
+
+    def get_upcoming_songs(self):
+        """
+        Returns every loaded song in the order it plays without shuffling, starting with the next song.
+        """
+        total_songs = self.total_songs
+        upcoming = (
+            self.playlist.get_loaded((self.song_index + offset) % total_songs)
+            for offset in range(total_songs)
+        )
+        return [song for song in upcoming if song is not None]
+
+    def find_songs(self, query, limit=10):
+        """
+        Searches the cleaned titles of the songs loaded so far.
+        Output: list of (index, cleaned title) tuples, most relevant first
+        """
+        results = self.search_index.search(
+            query, limit, include=lambda videoid: self.playlist.index_of(videoid) is not None
+        )
+        return [(self.playlist.index_of(videoid), title) for videoid, title in results]
 
-    def _print_current_song_information(self, print_command_string=True):
+    async def _print_current_song_information(self):
         """
-        Prints the current song's relevant information.
+        Shows the current song's relevant information in the now playing panel.
         """
         if self.song_info_enabled:
-            os.system("cls||clear")
-            print(
-f"""{Fore.CYAN}======================================
-{Fore.GREEN}Title:{Fore.RESET} {self._clean_title()}
-{Fore.GREEN}Length:{Fore.RESET} {self._get_reformatted_song_length(self.current_song.duration)}
-{Fore.GREEN}Views:{Fore.RESET} {self.current_song.viewcount:,d}
-{Fore.GREEN}Rating:{Fore.RESET} {round(self.current_song.rating, 2)}
-{Fore.GREEN}Date:{Fore.RESET} {self._get_reformatted_song_date(self.current_song.published)}
-{Fore.CYAN}======================================
-{self.command_string if print_command_string else ""}""",
-                end="",
+            metadata = await self._run_blocking(
+                self.metadata_fetcher.get, self.current_song.videoid
             )
+            self.now_playing.show_song(
+                [
+                    ("Title", self._clean_title()),
+                    ("Length", self._format_metadata(metadata, "duration", self._get_reformatted_song_length)),
+                    ("Views", self._format_metadata(metadata, "viewcount", lambda views: f"{views:,d}")),
+                    ("Rating", self._format_metadata(metadata, "rating", lambda rating: round(rating, 2))),
+                    ("Date", self._format_metadata(metadata, "published", self._get_reformatted_song_date)),
+                ]
+            )
+
+    def _format_metadata(self, metadata, key, format_value):
+        """
+        Returns one formatted metadata value, N/A if the song's metadata or that value couldn't be retrieved.
+        """
+        try:
+            return format_value(metadata[key])
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return "N/A"
+
+    async def _refresh_progress_bar(self):
+        """
+        Redraws the now playing panel's progress bar every few moments until playback stops.
+        """
+        while not self._exit_requested:
+            await asyncio.sleep(self.now_playing.refresh_seconds)
+            if self.current_song is not None:
+                self.now_playing.update_progress(
+                    self.vlc_player.get_time(),
+                    self.vlc_player.get_length(),
+                    self.vlc_is_paused(),
+                )
 
-    def _play_current_song(self):
+    async def _play_current_song(self):
         """
         Plays the current song stored in self.current_song and adds it to song history.
+        Songs on the dead list and songs whose stream can't be resolved are skipped.
         """
-        self._reset_state()
-        # Play song
-        self.vlc_player.set_mrl(self.current_song.getbestaudio().url_https, ":no-video")
-        self.vlc_player.play()
+        if self.resolver.is_dead(self.current_song.videoid):
+            self._skip_unplayable_song("failed to play too many times")
+            return
+        self._playback_attempts = 1
 
-        if not self.cmds.input_thread.is_alive():
-            self._print_current_song_information(print_command_string=False)
-            print(f"{Fore.YELLOW}===Enter ? to view a list of commands==={Fore.RESET}")
-            self.cmds.input_thread.start()
+        # Play song
+        if self._preloaded_song == (self.song_history.current, self.current_song.videoid):
+            self._play_preloaded_song()
+            skip_requested_at, self._skip_requested_at = self._skip_requested_at, None
+            if skip_requested_at is not None:  # Already buffered, so the song is audible right away
+                telemetry.record("skip.to_audio", time.perf_counter() - skip_requested_at)
         else:
-            self._print_current_song_information()
+            self._discard_preloaded_song()
+            try:
+                with telemetry.timer("play.resolve"):
+                    mrl = await self._run_blocking(
+                        self._get_song_mrl, self.song_history.current, self.current_song
+                    )
+            except StreamResolutionError:
+                self.resolver.record_failure(self.current_song.videoid)
+                self._skip_unplayable_song("couldn't be loaded")
+                return
+            options = [":no-video"]
+            if self._resume is not None:
+                resume_index, resume_videoid, resume_position = self._resume
+                if (resume_index, resume_videoid) == (
+                    self.song_history.current,
+                    self.current_song.videoid,
+                ):
+                    options.append(f":start-time={resume_position / 1000:.3f}")
+            self.vlc_player.set_mrl(mrl, *options)
+            self._play_called_at = time.perf_counter()
+            self.vlc_player.play()
+        if self._transition is not None:
+            reason, stopped_at = self._transition
+            telemetry.record("transition." + reason, time.perf_counter() - stopped_at)
+            self._transition = None
+        self._resume = None
+        if self._resume_volume is not None:
+            self.vlc_player.audio_set_volume(self._resume_volume)
+            self._resume_volume = None
+        if self.time_to_first_audio is None:
+            self.time_to_first_audio = time.perf_counter() - launch_time
+            telemetry.record("startup.first_play", self.time_to_first_audio)
+        self._prefetch_upcoming_songs()
+
+        if self.interactive:
+            if not self.cmds.input_thread.is_alive():
+                await self._print_current_song_information()
+                if self.time_to_first_audio > self.first_audio_target:
+                    print(
+                        f"{Fore.YELLOW}Time to first audio: {self.time_to_first_audio:.2f}s "
+                        f"(target {self.first_audio_target:.0f}s){Fore.RESET}"
+                    )
+                print(f"{Fore.YELLOW}===Enter ? to view a list of commands==={Fore.RESET}")
+                self.cmds.input_thread.start()
+            else:
+                await self._print_current_song_information()
+        await self._run_blocking(self.stream_cache.save)
+        if self.audio_cache is not None:
+            await self._run_blocking(self.audio_cache.save)
+        if self.settings is not None:
+            self._store_playback_state()  # Taken here, the event loop keeps changing the shuffle order and history
+            await self._run_blocking(self.settings.save)
 
         # Sleep for duration of song
-        self._song_timer()
+        await self._song_timer()
 
-    def _song_timer(self):
+    async def _song_timer(self):
         """
-        Loop and check for state change from user input while the song plays.
+        Waits until the song ends, fails, or the user skips or exits.
+        In gapless mode it also wakes up to buffer the next song and to start the crossfade.
         """
-        time.sleep(0.5)
-        while self.vlc_player.is_playing() or self.vlc_is_paused():
-            if self.cmds.skip_song:
+        while True:
+            event = await self.events.wait(self._seconds_until_gapless_transition())
+            if event is None:  # A gapless transition point was reached
+                if not self._preload_started:
+                    self._start_preloading_next_song()
+                elif self._preloaded_song is not None:
+                    self._transition = ("gapless", time.perf_counter())
+                    self.resolver.record_success(self.current_song.videoid)
+                    self.song_stats.record_play(self.current_song.videoid)
+                    self._unplayable_in_a_row = 0
+                    break  # Start the crossfade, the current song keeps playing while it fades out
+            elif event == playback_events.SKIP:
+                self._skip_request = self.cmds.take_skip_request()
+                if self._skip_request[0] == "next":  # Going back or choosing a song isn't a skip
+                    self.song_stats.record_skip(self.current_song.videoid)
                 self.vlc_player.stop()
-                self.cmds.skip_song = False
+                self._skip_requested_at = time.perf_counter()
+                self._transition = ("skip", self._skip_requested_at)
+                break
+            elif event == playback_events.EXIT:
+                print(f"{Fore.RESET}{Back.RESET}", end="")
+                self._exit_requested = True
+                break
+            elif self._vlc_is_finished():  # Ignore end and error events left over from a song that was skipped
+                if self.vlc_player.get_state() == vlc.State.Error:
+                    if await self._replay_after_error():
+                        continue
+                    self._transition = ("error", time.perf_counter())
+                else:
+                    self._transition = ("end", time.perf_counter())
+                    self.resolver.record_success(self.current_song.videoid)
+                    self.song_stats.record_play(self.current_song.videoid)
+                    self._unplayable_in_a_row = 0
                 break
-            if self.cmds.exit_program:
-                Fore.RESET
-                Back.RESET
-                sys.exit(0)
-            time.sleep(0.5)
 
-    def _reset_state(self):
+    async def _replay_after_error(self):
+        """
+        Resolves the current song again after VLC failed to play it and restarts it.
+        The first retry uses the best format again in case its URL expired, later retries fall back to the next best format.
+        Output: True if the song was restarted, False if it was skipped
+        """
+        song = self.current_song
+        self.stream_cache.discard_url(song.videoid)
+        if self.audio_cache is not None:
+            self.audio_cache.discard(song.videoid)
+        if self._playback_attempts >= self.max_playback_attempts:
+            self.resolver.record_failure(song.videoid)
+            self._skip_unplayable_song("failed to play")
+            return False
+        format_index = self._playback_attempts - 1
+        self._playback_attempts += 1
+        try:
+            stream_url = await self._run_blocking(self.resolver.resolve, song, format_index)
+        except StreamResolutionError:
+            self.resolver.record_failure(song.videoid)
+            self._skip_unplayable_song("failed to play")
+            return False
+        self.vlc_player.set_mrl(stream_url, ":no-video")
+        self.vlc_player.play()
+        return True
+
+    def _skip_unplayable_song(self, reason):
+        """
+        Moves on from the current song because it can't be played.
+        Looping is turned off so the song isn't retried forever, and playback stops once every song has failed in a row.
+        """
+        print(f"{Fore.RED}Skipping {self._clean_title()}, it {reason}.{Fore.RESET}")
+        if self.cmds.loop_song:
+            self.cmds.loop_song = False
+            print(f"Looping {Fore.RED}disabled.{Fore.RESET}")
+        self._unplayable_in_a_row += 1
+        if self._unplayable_in_a_row >= self.total_songs:
+            print(f"{Fore.RED}None of the songs in the playlist can be played.{Fore.RESET}")
+            self._exit_requested = True
+
+    def _create_vlc_player(self):
+        """
+        Returns a new VLC media player whose end and error events are posted to the event queue.
+        """
+        vlc_player = vlc.MediaPlayer()
+        vlc_event_manager = vlc_player.event_manager()
+        vlc_event_manager.event_attach(
+            vlc.EventType.MediaPlayerEndReached,
+            self.events.vlc_callback,
+            playback_events.END_REACHED,
+        )
+        vlc_event_manager.event_attach(
+            vlc.EventType.MediaPlayerEncounteredError,
+            self.events.vlc_callback,
+            playback_events.ENCOUNTERED_ERROR,
+        )
+        vlc_event_manager.event_attach(
+            vlc.EventType.MediaPlayerPlaying, self._on_vlc_playing
+        )
+        return vlc_player
+
+    def _on_vlc_playing(self, vlc_event):
+        """
+        VLC callback for when a player starts playing, records how long the song took to buffer.
+        Only the first Playing event after play() is counted, resuming from pause sends one too.
+        """
+        play_called_at, self._play_called_at = self._play_called_at, None
+        if play_called_at is None:
+            return
+        playing_at = time.perf_counter()
+        telemetry.record("play.buffering", playing_at - play_called_at)
+        skip_requested_at, self._skip_requested_at = self._skip_requested_at, None
+        if skip_requested_at is not None:
+            telemetry.record("skip.to_audio", playing_at - skip_requested_at)
+
+    def _seconds_until_gapless_transition(self):
+        """
+        Returns how long the song timer can sleep before the next song has to start buffering or crossfading.
+        Output: seconds, or None if there is nothing to wake up for
+        """
+        if not self.gapless:
+            return None
+        length = self.vlc_player.get_length()
+        if length <= 0 or self.vlc_is_paused():
+            return 1  # Length is unknown while the stream opens and the remaining time is frozen while paused
+        seconds_remaining = (length - self.vlc_player.get_time()) / 1000
+        if not self._preload_started:
+            return max(0, seconds_remaining - self.crossfade_seconds - self.preload_seconds)
+        if self.crossfade_seconds:
+            if self._preloaded_song is None:
+                return 0.5  # Still buffering, check again shortly
+            return max(0, seconds_remaining - self.crossfade_seconds)
+        return None  # Gapless without crossfade switches songs on the end event
+
+    def _start_preloading_next_song(self):
+        """
+        Starts buffering the next song on the second player without blocking the song timer.
+        """
+        self._preload_started = True
+        self.loop.create_task(
+            self._preload_song(self._peek_next_song_index(), self._preload_generation)
+        )
+
+    async def _preload_song(self, index, generation):
+        """
+        Opens the song at the passed in index on the second player and leaves it paused once buffered.
+        Does nothing if the preload was discarded while the stream URL was being resolved.
+        """
+        try:
+            index, song = await self._run_blocking(self._get_song, index)
+            mrl = await self._run_blocking(self._get_song_mrl, index, song)
+        except Exception:
+            return  # Preloading is best effort, the song is resolved again when it is played
+        if self._crossfade_task is not None:
+            await self._crossfade_task  # The second player is still fading out the previous song
+        if generation != self._preload_generation:
+            return
+        self._next_vlc_player.set_mrl(mrl, ":no-video", ":start-paused")
+        self._next_vlc_player.play()
+        self._preloaded_song = (index, song.videoid)
+
+    def _play_preloaded_song(self):
+        """
+        Swaps the players so the buffered song becomes the current song.
+        The previous song fades out in its own task when crossfading, otherwise it is stopped.
+        """
+        previous_player = self.vlc_player
+        self.vlc_player, self._next_vlc_player = self._next_vlc_player, previous_player
+        volume = previous_player.audio_get_volume()
+        if self.crossfade_seconds and previous_player.is_playing():
+            self.vlc_player.audio_set_volume(0)
+            self.vlc_player.set_pause(0)
+            self._crossfade_task = self.loop.create_task(
+                self._crossfade(previous_player, self.vlc_player, volume)
+            )
+        else:
+            previous_player.stop()
+            self.vlc_player.audio_set_volume(volume)
+            self.vlc_player.set_pause(0)
+        self._preloaded_song = None
+        self._preload_started = False
+
+    def _discard_preloaded_song(self):
         """
-        Resets the song history to only contain the last song in the history if every song in the playlist has been played.
+        Stops the song buffering on the second player, used when a different song was chosen.
         """
-        self.song_counter += 1
-        if len(self.song_history) == self.total_songs:
-            self.song_history = [self.song_history[-1]]
-            self.song_counter = 0
-            return True
-        return False
+        self._preload_generation += 1
+        self._preload_started = False
+        if self._preloaded_song is not None:
+            self._next_vlc_player.stop()
+            self._preloaded_song = None
+
+    async def _crossfade(self, previous_player, next_player, volume):
+        """
+        Fades the previous player out and the next player in over crossfade_seconds.
+        """
+        steps = max(1, int(self.crossfade_seconds * 10))
+        for step in range(1, steps + 1):
+            await asyncio.sleep(self.crossfade_seconds / steps)
+            next_player.audio_set_volume(round(volume * step / steps))
+            previous_player.audio_set_volume(round(volume * (steps - step) / steps))
+        previous_player.stop()
+        previous_player.audio_set_volume(volume)
+
+    def _vlc_is_finished(self):
+        """
+        Check if the VLC player reached the end of the song or stopped with an error.
+        """
+        return self.vlc_player.get_state() in (vlc.State.Ended, vlc.State.Error)
 
     def _add_song_to_history(self):
         """
         Adds the current song index to song_history.
+        Songs played without shuffling are marked so shuffling doesn't repeat them this pass.
+        """
+        self.song_history.resize(self.total_songs)
+        self.song_history.add(self.song_index)
+        self.shuffler.resize(self.total_songs)
+        self.shuffler.mark_drawn(self.song_index)
+
+    def set_shuffle_mode(self, mode):
+        """
+        Switches how shuffling chooses songs to one of song_stats.shuffle_modes.
+        The new order starts with the songs played this pass marked as drawn, so they aren't repeated.
+        """
+        if mode == self.shuffle_mode:
+            return
+        self.shuffle_mode = mode
+        self.shuffler = self._create_shuffler(mode)
+        current = self.song_history.current
+        for index in range(self.total_songs):
+            if index != current and self.song_history.was_played(index):
+                self.shuffler.mark_drawn(index)
+        if current is not None:
+            self.shuffler.mark_drawn(current)  # Marked last so its uploader is spread from the next song
+
+    def _create_shuffler(self, mode):
         """
-        self.song_history.append(self.song_index)
+        Returns the shuffle scheduler for the passed in shuffle mode.
+        """
+        if mode == "random":
+            return ShuffleScheduler(self.total_songs, seed=self.shuffle_seed)
+        return WeightedShuffleScheduler(
+            self.total_songs, self._get_song_weight, self._get_song_author, seed=self.shuffle_seed
+        )
+
+    def _get_song_weight(self, index):
+        """
+        Returns the weight of the song at the passed in index for the current shuffle mode.
+        Songs whose page hasn't loaded yet are weighed evenly until the next pass.
+        """
+        song = self.playlist.get_loaded(index)
+        if song is None:
+            return 1.0
+        duration = None
+        if self.shuffle_mode == "duration":
+            metadata = self.stream_cache.get_metadata(song.videoid)
+            if metadata is not None:
+                hours, minutes, seconds = metadata["duration"].split(":")
+                duration = int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+        return self.song_stats.weigh(song.videoid, self.shuffle_mode, duration)
+
+    def _get_song_author(self, index):
+        """
+        Returns the uploader of the song at the passed in index, None if its page hasn't loaded yet.
+        """
+        song = self.playlist.get_loaded(index)
+        return None if song is None else song.author
+
+    def get_playback_state(self):
+        """
+        Returns everything needed to resume playback where it is now as JSON compatible data.
+        Output: dict, or None if no song has played
+        """
+        if self.current_song is None:
+            return None
+        return {
+            "index": self.song_history.current,
+            "videoid": self.current_song.videoid,
+            "position": max(0, self.vlc_player.get_time()),
+            "volume": self.vlc_player.audio_get_volume(),
+            "loop": self.cmds.loop_song,
+            "shuffle": self.cmds.shuffle_playlist,
+            "shuffle_mode": self.shuffle_mode,
+            "shuffle_order": self.shuffler.get_state(),
+        }
+
+    def save_playback_state(self):
+        """
+        Stores the playback state and song stats in the settings store so the next launch resumes from them.
+        """
+        if self.settings is None:
+            return
+        self._store_playback_state()
+        self.settings.save()
+
+    def _store_playback_state(self):
+        """
+        Copies the playback state and song stats into the settings store without writing it.
+        Called from the event loop while playing, the copies can then be written on another thread.
+        """
+        playback_state = self.get_playback_state()
+        if playback_state is not None:
+            self.settings.playback = playback_state
+        self.settings.song_stats = self.song_stats.get_state()
+
+    def _restore_playback_state(self, playback_state):
+        """
+        Restores a state returned by get_playback_state() from the last session.
+        Invalid states are ignored and playback starts from the beginning.
+        """
+        try:
+            index = int(playback_state["index"])
+            videoid = playback_state["videoid"]
+            position = int(playback_state.get("position", 0))
+            volume = playback_state.get("volume")
+        except (KeyError, TypeError, ValueError):
+            return
+        if index < 0:
+            return
+        self.song_index = index
+        self._resume = (index, videoid, position)
+        if isinstance(volume, int) and 0 <= volume <= 100:
+            self._resume_volume = volume
+        self.cmds.loop_song = bool(playback_state.get("loop"))
+        self.cmds.shuffle_playlist = bool(playback_state.get("shuffle"))
+        if playback_state.get("shuffle_mode") in shuffle_modes:
+            self.set_shuffle_mode(playback_state["shuffle_mode"])
+        shuffle_order = playback_state.get("shuffle_order")
+        if shuffle_order is not None:
+            self.shuffler.set_state(shuffle_order)
 
     def vlc_is_paused(self):
         """
@@ -227,28 +914,66 @@ f"""{Fore.CYAN}======================================
 
 
 def main():
-    if len(sys.argv) == 1:
-        if files_exist(get_file_list()):
-            (
-                youtube_playlist_URL,
-                api_key,
-                vlc_dir,
-            ) = read_playlist_url_api_key_and_vlc_dir_from_file()
-        else:
-            print('No YouTube playlist stored. Run "python -m vlcyt -h" for help.')
-            sys.exit(0)
-    else:
-        youtube_playlist_URL, api_key, vlc_dir = parse_args()
-        write_playlist_url_api_key_and_vlc_dir_to_file(
-            youtube_playlist_URL, api_key, vlc_dir
-        )
+    args = parse_args()
+    if args.client or args.send is not None:
+        from vlcyt.control_socket import run_client
+
+        run_client(args.send)
+        return
+    settings = SettingsStore()
+    if args.youtube_playlist_URLs:
+        settings.set_playlist(args.youtube_playlist_URLs, args.y, args.v)
+        settings.save()
+    elif not settings.has_playlist():
+        print('No YouTube playlist stored. Run "python -m vlcyt -h" for help.')
+        sys.exit(0)
+    youtube_playlist_URLs, api_key, vlc_dir = (
+        settings.playlist_urls,
+        settings.api_key,
+        settings.vlc_dir,
+    )
+
+    if args.warm:
+        from vlcyt.warm import warm_playlists
 
+        warm_playlists(youtube_playlist_URLs, api_key, args.warm_processes)
+        return
+
+    if args.daemon:
+        from vlcyt.control_socket import ControlServer, daemon_is_running, daemonize
+
+        if daemon_is_running():
+            print("A VLCYT daemon is already running.")
+            sys.exit(1)
+        daemonize()
+
+    if args.telemetry:
+        telemetry.export_to(os.path.abspath(args.telemetry))  # Resolved before the working directory changes
     add_vlc_dir_to_path(vlc_dir)
     global vlc
     import vlc
 
-    vlcyt = VLCYT(youtube_playlist_url=youtube_playlist_URL, youtube_api_key=api_key)
-    vlcyt.play_playlist_songs()
+    vlcyt = VLCYT(
+        youtube_playlist_urls=youtube_playlist_URLs,
+        youtube_api_key=api_key,
+        gapless=args.gapless,
+        crossfade_seconds=args.crossfade,
+        shuffle_seed=args.shuffle_seed,
+        song_info_enabled=not args.daemon,
+        interactive=not args.daemon,
+        settings=settings,
+        audio_cache_megabytes=args.cache_audio,
+        warm_processes=args.warm_processes,
+    )
+    if args.daemon:
+        control_server = ControlServer(vlcyt.cmds)
+        control_server.start()
+        try:
+            vlcyt.play_playlist_songs()
+        finally:
+            control_server.close()
+    else:
+        vlcyt.play_playlist_songs()
 
 
 if __name__ == "__main__":
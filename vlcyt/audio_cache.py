@@ -0,0 +1,169 @@
+import json
+import os
+import shutil
+import threading
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from vlcyt.file_helpers import app_dir, write_file_atomically
+
+audio_extensions = {
+    "audio/webm": ".webm",
+    "audio/mp4": ".m4a",
+}  # File extension for each stream mime type, VLC probes the contents either way
+
+
+class AudioCache:
+    """
+    Opt-in cache of downloaded audio streams so songs that are played again are read from disk.
+    Downloads run on a background worker. Once the cache is over its size budget, the least recently played songs are deleted.
+    """
+
+    download_timeout = 30  # Seconds without data before a download is abandoned
+
+    def __init__(self, max_bytes, cache_dir=app_dir + "audio/", max_workers=1):
+        self.max_bytes = max_bytes  # Size budget of every cached file combined
+        self.cache_dir = cache_dir
+        self.index_path = cache_dir + "index.json"
+        self._entries = OrderedDict()  # videoid -> {"file": file name, "size": bytes}, least recently played first
+        self._pending = {}  # videoid -> Future of the download in progress
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # Saves from the download worker and the player take turns, so an older index is never written last
+        self._dirty = False  # Becomes True when the index has changes that have not been saved
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="vlcyt-audio-cache"
+        )
+        self._load()
+
+    def get_path(self, videoid):
+        """
+        Returns the path of the cached audio for the passed in videoid and marks it as the most recently played,
+        or None if it hasn't been downloaded.
+        """
+        with self._lock:
+            entry = self._entries.get(videoid)
+            if entry is None:
+                return None
+            path = self.cache_dir + entry["file"]
+            if not os.path.isfile(path):
+                del self._entries[videoid]
+                self._dirty = True
+                return None
+            self._entries.move_to_end(videoid)
+            self._dirty = True
+            return path
+
+    def download(self, videoid, stream_url):
+        """
+        Starts downloading the passed in stream into the cache unless it is cached or already downloading.
+        """
+        with self._lock:
+            if videoid in self._entries or videoid in self._pending:
+                return
+            future = self._executor.submit(self._download, videoid, stream_url)
+            self._pending[videoid] = future
+            future.add_done_callback(lambda _: self._forget(videoid))
+
+    def discard(self, videoid):
+        """
+        Deletes the cached audio of the passed in videoid, used once VLC fails to play it.
+        """
+        with self._lock:
+            entry = self._entries.pop(videoid, None)
+            if entry is None:
+                return
+            self._dirty = True
+        try:
+            os.remove(self.cache_dir + entry["file"])
+        except OSError:
+            pass
+
+    def save(self):
+        """
+        Writes the index to disk if it has changed.
+        """
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                data = json.dumps(self._entries)
+                self._dirty = False
+            try:
+                write_file_atomically(self.index_path, data)
+            except OSError:
+                with self._lock:
+                    self._dirty = True  # Tried again on the next save
+                raise
+
+    def _download(self, videoid, stream_url):
+        """
+        Worker task, downloads a stream to a temporary file and adds it to the cache once it is complete.
+        """
+        file_name = videoid + self._get_extension(stream_url)
+        temp_path = self.cache_dir + file_name + ".part"
+        os.makedirs(self.cache_dir, exist_ok=True)
+        try:
+            with urllib.request.urlopen(
+                stream_url, timeout=self.download_timeout
+            ) as response, open(temp_path, "wb") as audio_file:
+                shutil.copyfileobj(response, audio_file, 1024 * 64)
+            size = os.path.getsize(temp_path)
+            if size > self.max_bytes:
+                os.remove(temp_path)  # Would evict everything else and still not fit
+                return
+            os.replace(temp_path, self.cache_dir + file_name)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        with self._lock:
+            self._entries[videoid] = {"file": file_name, "size": size}
+            self._evict()
+            self._dirty = True
+        self.save()
+
+    def _evict(self):
+        """
+        Deletes the least recently played songs until the cache fits its size budget. Called with the lock held.
+        """
+        total_size = sum(entry["size"] for entry in self._entries.values())
+        while total_size > self.max_bytes and len(self._entries) > 1:
+            _, entry = self._entries.popitem(last=False)
+            total_size -= entry["size"]
+            try:
+                os.remove(self.cache_dir + entry["file"])
+            except OSError:
+                pass  # Still open in VLC on Windows, it is no longer indexed either way
+
+    def _forget(self, videoid):
+        with self._lock:
+            self._pending.pop(videoid, None)
+
+    def _load(self):
+        """
+        Loads the index from disk, dropping entries whose files are missing and leftover partial downloads.
+        """
+        try:
+            with open(self.index_path, "r") as index_file:
+                entries = OrderedDict(json.load(index_file))
+        except (OSError, ValueError):
+            entries = OrderedDict()
+        self._entries = OrderedDict(
+            (videoid, entry)
+            for videoid, entry in entries.items()
+            if os.path.isfile(self.cache_dir + entry["file"])
+        )
+        if os.path.isdir(self.cache_dir):
+            for file_name in os.listdir(self.cache_dir):
+                if file_name.endswith(".part"):
+                    os.remove(self.cache_dir + file_name)
+        with self._lock:
+            self._evict()  # The size budget may have been lowered since the last session
+            self._dirty = len(self._entries) != len(entries)
+
+    @staticmethod
+    def _get_extension(stream_url):
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(stream_url).query)
+        mime = query.get("mime", [""])[0]
+        return audio_extensions.get(mime, ".audio")
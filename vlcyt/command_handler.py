@@ -1,7 +1,13 @@
+import asyncio
+import concurrent.futures
 import threading
-import pyperclip
+from collections import deque
 from colorama import Fore
-from vlcyt.lyrics_scraper import get_lyrics
+from vlcyt import playback_events
+from vlcyt.song_stats import shuffle_modes
+from vlcyt.telemetry import telemetry
+
+lyrics_failed_message = f"{Fore.RED}Failed to retrieve song lyrics :({Fore.RESET}\n"
 
 
 class CommandHandler:
@@ -12,12 +18,16 @@ class CommandHandler:
     _volume_commands = ["volume", "v"]
     _skip_commands = ["skip", "s", "next", "n", "forward", "f"]
     _play_commands = ["play", "pause", "p"]
+    _play_search_commands = ["play", "p"]  # Play a song by title when followed by a search
+    _find_commands = ["find", "search"]
     _repeat_commands = ["repeat", "replay", "r"]
     _back_commands = ["back", "b"]
     _loop_commands = ["loop", "l"]
     _shuffle_commands = ["shuffle"]
     _copy_url_commands = ["copy", "c", "url"]
     _lyrics_commands = ["lyrics"]
+    _stats_commands = ["stats"]
+    _warm_commands = ["warm"]
     _exit_commands = ["exit", "quit", "q", "x"]
 
     def __init__(self, vlcyt):
@@ -25,43 +35,72 @@ class CommandHandler:
         self.input_thread = threading.Thread(target=self._get_input)
         self.input_thread.daemon = True
 
-        self.skip_song = False  # Becomes True if the user enters the skip command
-        self.exit_program = False  # Becomes True if the user enters the exit command
         self.loop_song = False  # Becomes True if the user enters the loop command
         self.shuffle_playlist = False  # Becomes True if the user enters the shuffle command
-        self.back_song = False  # Becomes True if the user enters the back command
-        self.back_amount = 1  # Stores how many indexes back will be popped from song_history to get songs in history
+        self.skip_requests = deque()  # (kind, index chosen by the play command) of every SKIP event posted, oldest first
 
     def _get_input(self):
         """
-        Gathers user input from the input thread and executes commands.
+        Gathers user input from the input thread and executes commands on the event loop.
         """
         while True:
             command_name, command_value = self._get_command()
-            if command_name in self._help_commands:
-                self.command_help()
-            elif command_name in self._volume_commands:
-                self.command_set_volume(command_value)
-            elif command_name in self._skip_commands:
-                self.command_skip_song(command_value)
-            elif command_name in self._play_commands:
-                self.command_p()
-            elif command_name in self._repeat_commands:
-                self.command_repeat()
-            elif command_name in self._back_commands:
-                self.command_back()
-            elif command_name in self._loop_commands:
-                self.command_loop()
-            elif command_name in self._shuffle_commands:
-                self.command_shuffle()
-            elif command_name in self._copy_url_commands:
-                self.command_copy_url()
-            elif command_name in self._lyrics_commands:
-                self.command_lyrics()
-            elif command_name in self._exit_commands:
-                self.exit_program = True
-            else:
-                print(f"{Fore.RED}Invalid command{Fore.RESET}")
+            self.execute_command_threadsafe(command_name, command_value)
+
+    def execute_command_threadsafe(self, command_name, command_value, from_terminal=True):
+        """
+        Executes a command on the event loop that owns the player and waits for it to finish.
+        Called from the input thread and the control socket's threads.
+        Output: see execute_command()
+        """
+        loop = self.vlcyt.loop
+        if loop is None or not loop.is_running():  # Playback hasn't started yet
+            return self.execute_command(command_name, command_value, from_terminal)
+        return asyncio.run_coroutine_threadsafe(
+            self._execute_command_async(command_name, command_value, from_terminal), loop
+        ).result()
+
+    async def _execute_command_async(self, command_name, command_value, from_terminal):
+        return self.execute_command(command_name, command_value, from_terminal)
+
+    def execute_command(self, command_name, command_value, from_terminal=True):
+        """
+        Executes a command by name, used by the input thread and the control socket.
+        Commands run for a control socket client (from_terminal False) don't print anything after they return.
+        Output: Future resolving to the rest of the output for commands that finish in the background, otherwise None
+        """
+        if command_name in self._help_commands:
+            self.command_help()
+        elif command_name in self._volume_commands:
+            self.command_set_volume(command_value)
+        elif command_name in self._skip_commands:
+            self.command_skip_song(command_value)
+        elif command_name in self._play_search_commands and command_value:
+            self.command_play_search(command_value)
+        elif command_name in self._play_commands:
+            self.command_p()
+        elif command_name in self._find_commands:
+            self.command_find(command_value)
+        elif command_name in self._repeat_commands:
+            self.command_repeat()
+        elif command_name in self._back_commands:
+            self.command_back()
+        elif command_name in self._loop_commands:
+            self.command_loop()
+        elif command_name in self._shuffle_commands:
+            self.command_shuffle(command_value)
+        elif command_name in self._copy_url_commands:
+            self.command_copy_url()
+        elif command_name in self._lyrics_commands:
+            return self.command_lyrics(from_terminal)
+        elif command_name in self._stats_commands:
+            self.command_stats()
+        elif command_name in self._warm_commands:
+            self.command_warm(command_value)
+        elif command_name in self._exit_commands:
+            self.vlcyt.events.post(playback_events.EXIT)
+        else:
+            print(f"{Fore.RED}Invalid command{Fore.RESET}")
 
     def _get_command(self):
         """
@@ -71,26 +110,66 @@ class CommandHandler:
         command = ""
         while command == "":
             command = input(self.vlcyt.command_string).lower()
-        split_command = command.split()
+        return self.parse_command(command)
+
+    @staticmethod
+    def parse_command(command):
+        """
+        Splits a command string into its name and value, the value is the rest of the line so searches can contain spaces.
+        Output: tuple: command name string, command value string or None
+        """
+        split_command = command.lower().split(maxsplit=1)
         try:
             command_name = split_command[0]
-            command_value = split_command[1]
+            command_value = split_command[1].strip()
         except IndexError:
             command_value = None
         return command_name, command_value
 
     def input_features_enabled(self):
         """
-        Returns True if loop, shuffle, back, or skip are enabled.
+        Returns True if loop or shuffle are enabled.
         """
         input_features = [
             self.loop_song,
             self.shuffle_playlist,
-            self.back_song,
-            self.skip_song,
         ]
         return True in input_features
 
+    def request_skip(self, kind="next", jump_index=None):
+        """
+        Stops the current song, the playback loop then plays the song the request asks for.
+        Every SKIP event is paired with its own request so quick commands in a row each take effect.
+        Input: kind: "next", "back", or "jump" to play the song at jump_index
+        """
+        self.skip_requests.append((kind, jump_index))
+        self.vlcyt.events.post(playback_events.SKIP)
+
+    def take_skip_request(self):
+        """
+        Returns the oldest pending skip request, called once for every SKIP event handled.
+        Output: tuple: kind, index chosen by the play command or None
+        """
+        return self.skip_requests.popleft() if self.skip_requests else ("next", None)
+
+    def peek_jump_index(self):
+        """
+        Returns the index of the song chosen by the play command if it is the next request, otherwise None.
+        """
+        if self.skip_requests and self.skip_requests[0][0] == "jump":
+            return self.skip_requests[0][1]
+        return None
+
+    def remap_skip_requests(self, index_map):
+        """
+        Moves the songs chosen by the play command to their new indexes after the playlist changed.
+        Input: index_map: list holding the new index of the song at each old index, None for removed songs
+        """
+        self.skip_requests = deque(
+            (kind, None if jump_index is None else index_map[jump_index])
+            for kind, jump_index in self.skip_requests
+        )
+
     def command_help(self):
         print(
 f"""{Fore.MAGENTA}======================================
@@ -111,6 +190,12 @@ entering "skip 5" will skip 5 songs.
 
 {Fore.GREEN}play, pause, p{Fore.WHITE}
 Plays/Pauses the current song.
+Entering "play" followed by part of a title plays the best matching song,
+for example: "play bohemian rhapsody".
+
+{Fore.GREEN}find, search{Fore.WHITE}
+Lists the songs whose titles best match what you entered, small typos are forgiven.
+For example: "find never gona".
 
 {Fore.GREEN}repeat, replay, r{Fore.WHITE}
 Repeats the current song one time.
@@ -124,6 +209,8 @@ The current song will keep playing until looping is disabled.
 
 {Fore.GREEN}shuffle{Fore.WHITE}
 Shuffles the playlist without repeating until every song has been played.
+Entering "shuffle" followed by a mode also chooses how songs are picked:
+{chr(10).join(f'  {mode}: {description}' for mode, description in shuffle_modes.items())}
 
 {Fore.GREEN}copy, c, url{Fore.WHITE}
 Copies the current song's YouTube URL.
@@ -132,12 +219,19 @@ Copies the current song's YouTube URL.
 {Fore.YELLOW}EXPERIMENTAL:{Fore.WHITE} Attempts to retrieve the current song's lyrics.
 Needs to be improved.
 
+{Fore.GREEN}stats{Fore.WHITE}
+Shows how long loading, buffering, and skipping songs has been taking.
+
+{Fore.GREEN}warm{Fore.WHITE}
+Resolves every song's stream in the background so songs start faster.
+Entering "warm" again shows the progress, "warm stop" stops it.
+
 {Fore.GREEN}exit, quit, q, x{Fore.WHITE}
 Closes the program.
 {Fore.MAGENTA}======================================
 {Fore.CYAN}---Settings---{Fore.RESET}
 {Fore.GREEN}Looping:{Fore.RESET} {f"{Fore.GREEN}Enabled{Fore.RESET}" if self.loop_song else f"{Fore.RED}Disabled{Fore.RESET}"}
-{Fore.GREEN}Shuffling:{Fore.RESET} {f"{Fore.GREEN}Enabled{Fore.RESET}" if self.shuffle_playlist else f"{Fore.RED}Disabled{Fore.RESET}"}
+{Fore.GREEN}Shuffling:{Fore.RESET} {f"{Fore.GREEN}Enabled{Fore.RESET} ({self.vlcyt.shuffle_mode})" if self.shuffle_playlist else f"{Fore.RED}Disabled{Fore.RESET}"}
 {Fore.CYAN}--------------{Fore.RESET}"""
         )
 
@@ -174,25 +268,48 @@ Closes the program.
                 return
 
         if amount_to_skip in [1, None]:
-            self.vlcyt.song_index = (
-                self.vlcyt.song_index + 1
-                if self.vlcyt.song_index < self.vlcyt.total_songs
-                else 0
-            )
-            self.skip_song = True
+            self.request_skip()  # song_index already points to the next song
         elif amount_to_skip > 1:
-            potential_index = self.vlcyt.song_index + amount_to_skip
-            if potential_index <= self.vlcyt.total_songs:
-                self.vlcyt.song_index += amount_to_skip - 1
-            else:  # Round robin
-                total_multiplier = potential_index // self.vlcyt.total_songs
-                self.vlcyt.song_index = (
-                    potential_index - 1 - self.vlcyt.total_songs * total_multiplier
-                )
-            self.skip_song = True
+            # Round robin past the end of the playlist
+            self.vlcyt.song_index = (
+                self.vlcyt.song_index + amount_to_skip - 1
+            ) % self.vlcyt.total_songs
+            self.vlcyt._prefetch_upcoming_songs()
+            self.request_skip()
         else:
             print(f"{Fore.RED}Bad input.{Fore.RESET} Enter a value greater than 0.")
 
+    def command_find(self, query):
+        """
+        Prints the songs that best match the query with their position in the playlist.
+        """
+        if not query:
+            print(f"{Fore.RED}Bad input.{Fore.RESET} Enter part of a song title.")
+            return
+        results = self.vlcyt.find_songs(query)
+        if self.vlcyt.search_index.is_indexing():
+            print(f"{Fore.YELLOW}Still indexing the playlist, some songs may be missing.{Fore.RESET}")
+        if not results:
+            print(f"{Fore.RED}No songs found.{Fore.RESET}")
+            return
+        print(f"{Fore.MAGENTA}======================================{Fore.RESET}")
+        for index, title in results:
+            print(f"{Fore.GREEN}{index + 1:>6}{Fore.RESET}  {title}")
+        print(f"{Fore.MAGENTA}======================================{Fore.RESET}")
+
+    def command_play_search(self, query):
+        """
+        Plays the song that best matches the query next, skipping the current song.
+        """
+        results = self.vlcyt.find_songs(query, limit=1)
+        if not results:
+            print(f"{Fore.RED}No songs found.{Fore.RESET}")
+            return
+        jump_index, title = results[0]
+        print(f"Playing {Fore.GREEN}{title}{Fore.RESET}")
+        self.request_skip("jump", jump_index)
+        self.vlcyt._prefetch_upcoming_songs()
+
     def command_repeat(self):
         """
         Repeats the current song.
@@ -209,9 +326,8 @@ Closes the program.
         """
         Play last song in history.
         """
-        if self.vlcyt.song_history and self.vlcyt.song_index != 0:
-            self.back_song = True
-            self.skip_song = True
+        if self.vlcyt.song_history.peek_back() is not None:
+            self.request_skip("back")
         else:
             print(f"{Fore.RED}No songs in history{Fore.RESET}")
 
@@ -225,27 +341,134 @@ Closes the program.
         else:
             self.loop_song = False
             print(f"Looping {Fore.RED}disabled.{Fore.RESET}")
+        self.vlcyt._prefetch_upcoming_songs()
 
-    def command_shuffle(self):
-        if self.shuffle_playlist == False:
+    def command_shuffle(self, mode=None):
+        """
+        Enables/Disables shuffling, entering a shuffle mode enables shuffling in that mode.
+        """
+        if mode is not None:
+            if mode not in shuffle_modes:
+                print(f"{Fore.RED}Shuffle modes: {', '.join(shuffle_modes)}{Fore.RESET}")
+                return
+            self.vlcyt.set_shuffle_mode(mode)
+            self.shuffle_playlist = True
+            print(f"Shuffle {Fore.GREEN}enabled{Fore.RESET} ({mode}).")
+        elif self.shuffle_playlist == False:
             self.shuffle_playlist = True
-            print(f"Shuffle {Fore.GREEN}enabled.{Fore.RESET}")
+            print(f"Shuffle {Fore.GREEN}enabled{Fore.RESET} ({self.vlcyt.shuffle_mode}).")
         else:
             self.shuffle_playlist = False
             print(f"Shuffle {Fore.RED}disabled.{Fore.RESET}")
+        self.vlcyt._prefetch_upcoming_songs()
 
     def command_copy_url(self):
+        import pyperclip  # Imported on first use, the clipboard is rarely needed
+
         pyperclip.copy(
             "https://www.youtube.com/watch?v=" + self.vlcyt.current_song.videoid
         )
         print(f"{Fore.GREEN}Song URL Copied")
 
-    def command_lyrics(self):
+    def command_stats(self):
+        """
+        Prints the songs played and skipped this session and the timings collected by telemetry in milliseconds.
+        """
+        summaries = telemetry.summaries()
+        song_stats = self.vlcyt.song_stats
+        print(f"{Fore.MAGENTA}======================================{Fore.RESET}")
         print(
-            f"{Fore.MAGENTA}======================================{Fore.RESET}", end=""
+            f"{Fore.GREEN}This session:{Fore.RESET} {song_stats.session_played} played, {song_stats.session_skipped} skipped"
         )
-        try:
-            print(get_lyrics(self.vlcyt._clean_title()))
-        except (AttributeError, IndexError) as e:
-            print(f"\n{Fore.RED}Failed to retrieve song lyrics :({Fore.RESET}")
+        if self.vlcyt.time_to_first_audio is not None:
+            print(
+                f"{Fore.GREEN}Time to first audio:{Fore.RESET} {self.vlcyt.time_to_first_audio * 1000:.0f} ms"
+            )
+        print(
+            f"{Fore.CYAN}{'Timing':<20}{'Count':>7}{'p50':>9}{'p90':>9}{'p99':>9}{'Max':>9}{Fore.RESET}"
+        )
+        for name, summary in summaries.items():
+            print(
+                f"{Fore.GREEN}{name:<20}{Fore.RESET}{summary['count']:>7}"
+                + "".join(
+                    f"{summary[key] * 1000:>9.0f}" for key in ("p50", "p90", "p99", "max")
+                )
+            )
         print(f"{Fore.MAGENTA}======================================{Fore.RESET}")
+
+    def command_warm(self, value):
+        """
+        Starts resolving the streams of every loaded song on worker processes, upcoming songs first.
+        Shows the progress if it is already running, "warm stop" stops it.
+        """
+        warmer = self.vlcyt.get_stream_warmer()
+        if value == "stop":
+            if warmer.is_running():
+                warmer.stop()
+                print(f"Warming {Fore.RED}stopped.{Fore.RESET}")
+            else:
+                print(f"{Fore.RED}Warming isn't running.{Fore.RESET}")
+        elif warmer.is_running():
+            print(
+                f"Warming: {Fore.GREEN}{warmer.resolved + warmer.failed}/{warmer.total}{Fore.RESET} songs, {warmer.failed} failed"
+            )
+        else:
+            warmer.start(self.vlcyt.get_upcoming_songs())
+            print(f"Warming {Fore.GREEN}started.{Fore.RESET} Enter \"warm\" to see the progress.")
+
+    def command_lyrics(self, from_terminal=True):
+        """
+        Prints the current song's lyrics right away if they are cached, otherwise once they have been retrieved.
+        Output: Future resolving to the formatted lyrics if they are being retrieved for a control socket client,
+        which prints them itself once they arrive
+        """
+        song_title = self.vlcyt._clean_title()
+        self.vlcyt.lyrics_prefetch_enabled = True
+        lyrics = self.vlcyt.lyrics_fetcher.get_cached(song_title)
+        output = None
+        if lyrics is not None:
+            print(self._format_lyrics(lyrics), end="")
+        else:
+            print(f"{Fore.YELLOW}Retrieving lyrics...{Fore.RESET}")
+            future = self.vlcyt.lyrics_fetcher.fetch(song_title)
+            if from_terminal:
+                future.add_done_callback(self._print_retrieved_lyrics)
+            else:
+                output = concurrent.futures.Future()
+                future.add_done_callback(lambda future: self._send_retrieved_lyrics(future, output))
+        self.vlcyt._prefetch_lyrics()
+        return output
+
+    def _print_retrieved_lyrics(self, future):
+        """
+        Prints lyrics once a background lyrics fetch is done, followed by the command string since the prompt was already shown.
+        """
+        print(self._format_retrieved_lyrics(future), end="")
+        print(self.vlcyt.command_string, end="", flush=True)
+
+    def _send_retrieved_lyrics(self, future, output):
+        """
+        Resolves the control socket client's Future once a background lyrics fetch is done.
+        It is always resolved, otherwise the client would wait until it times out.
+        """
+        lyrics = lyrics_failed_message
+        try:
+            lyrics = self._format_retrieved_lyrics(future)
+        finally:
+            output.set_result(lyrics)
+
+    def _format_retrieved_lyrics(self, future):
+        """
+        Returns the lyrics of a finished lyrics fetch formatted for printing, or the error message if it failed.
+        Requests errors are OSErrors, pages that don't look as expected raise the others while being parsed.
+        """
+        try:
+            return self._format_lyrics(future.result())
+        except (AttributeError, IndexError, KeyError, TypeError, ValueError, OSError):
+            return lyrics_failed_message
+
+    def _format_lyrics(self, lyrics):
+        return (
+            f"{Fore.MAGENTA}======================================{Fore.RESET}{lyrics}\n"
+            f"{Fore.MAGENTA}======================================{Fore.RESET}\n"
+        )
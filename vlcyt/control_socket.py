@@ -0,0 +1,161 @@
+import concurrent.futures
+import contextlib
+import io
+import os
+import socket
+import socketserver
+import sys
+import threading
+from vlcyt.file_helpers import app_dir
+
+socket_path = app_dir + "vlcyt.sock"
+response_terminator = b"\0"  # Ends every response, requests are single lines
+
+
+class _ControlRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Serves one client connection. Each line received is a command, each response is the command's output followed by a NUL byte.
+    """
+
+    def handle(self):
+        for line in self.rfile:
+            command = line.decode("utf-8").strip()
+            if not command:
+                continue
+            output = self.server.run_command(command)
+            self.wfile.write(output.encode("utf-8") + response_terminator)
+            self.wfile.flush()
+
+
+class ControlServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Unix domain socket that accepts VLCYT commands from any number of clients while running as a daemon.
+    Commands run one at a time and their printed output is sent back to the client that sent them.
+    Output a command produces in the background, such as lyrics being retrieved, is waited for and sent with it.
+    """
+
+    daemon_threads = True
+    background_output_timeout = 20  # Seconds a client waits for output a command produces in the background
+
+    def __init__(self, command_handler, path=socket_path):
+        self.command_handler = command_handler
+        self.path = path
+        self._command_lock = threading.Lock()
+        if os.path.exists(path):
+            if daemon_is_running(path):
+                raise RuntimeError(f"A VLCYT daemon is already listening on {path}")
+            os.remove(path)  # Left behind by a daemon that didn't shut down cleanly
+        super().__init__(path, _ControlRequestHandler)
+
+    def run_command(self, command):
+        """
+        Executes a command string and returns everything it printed, followed by the output it finished in the background.
+        The background output is waited for without holding the command lock, so other clients' commands keep running.
+        """
+        output = io.StringIO()
+        with self._command_lock, contextlib.redirect_stdout(output):
+            background_output = self.command_handler.execute_command_threadsafe(
+                *self.command_handler.parse_command(command), from_terminal=False
+            )
+        if background_output is not None:
+            try:
+                output.write(background_output.result(self.background_output_timeout))
+            except concurrent.futures.TimeoutError:
+                output.write("Still working on it, enter the command again shortly.\n")
+        return output.getvalue()
+
+    def start(self):
+        """
+        Serves clients on a background thread.
+        """
+        server_thread = threading.Thread(target=self.serve_forever)
+        server_thread.daemon = True
+        server_thread.start()
+
+    def close(self):
+        """
+        Stops serving and removes the socket file.
+        """
+        self.shutdown()
+        self.server_close()
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(self.path)
+
+
+def daemon_is_running(path=socket_path):
+    """
+    Returns True if a VLCYT daemon is accepting connections on the control socket.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(path)
+        except OSError:
+            return False
+        return True
+
+
+def daemonize():
+    """
+    Detaches from the terminal by forking, the parent process exits once the child is running.
+    """
+    if os.fork() > 0:
+        print(f"VLCYT daemon started. Control socket: {socket_path}")
+        os._exit(0)
+    os.setsid()
+    with open(os.devnull, "r+") as devnull:
+        for stream in (sys.stdin, sys.stdout, sys.stderr):
+            os.dup2(devnull.fileno(), stream.fileno())
+
+
+class ControlClient:
+    """
+    Thin client for a VLCYT daemon. One connection is reused for every command.
+    """
+
+    def __init__(self, path=socket_path):
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(path)
+        self._buffer = b""
+
+    def send_command(self, command):
+        """
+        Sends a command to the daemon and returns its output.
+        """
+        self._socket.sendall(command.encode("utf-8") + b"\n")
+        while response_terminator not in self._buffer:
+            data = self._socket.recv(4096)
+            if not data:
+                raise ConnectionError("The VLCYT daemon closed the connection")
+            self._buffer += data
+        response, self._buffer = self._buffer.split(response_terminator, 1)
+        return response.decode("utf-8")
+
+    def close(self):
+        self._socket.close()
+
+
+def run_client(command=None, path=socket_path):
+    """
+    Sends one command to the daemon, or forwards every line entered until EOF or Ctrl+C if no command was passed in.
+    """
+    try:
+        client = ControlClient(path)
+    except OSError:
+        print('No VLCYT daemon is running. Start one with "python -m vlcyt --daemon".')
+        return
+    try:
+        if command is not None:
+            print(client.send_command(command), end="")
+            return
+        while True:
+            try:
+                command = input(">")
+            except (EOFError, KeyboardInterrupt):
+                print()
+                break
+            if command.strip():
+                print(client.send_command(command), end="")
+    except ConnectionError:
+        print("The VLCYT daemon stopped.")
+    finally:
+        client.close()
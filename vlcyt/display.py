@@ -0,0 +1,140 @@
+import os
+import shutil
+import sys
+from colorama import Fore
+
+csi = "\x1b["  # Starts an ANSI control sequence
+save_cursor = "\x1b7"
+restore_cursor = "\x1b8"
+
+
+def enable_cursor_control(stream=sys.stdout):
+    """
+    Turns on ANSI escape sequences in the Windows console, other terminals understand them already.
+    Output: True if the stream is a terminal that can move the cursor
+    """
+    if not stream.isatty():
+        return False
+    if os.name != "nt":
+        return True
+    import ctypes
+
+    kernel32 = ctypes.windll.kernel32
+    handle = kernel32.GetStdHandle(-11)  # Standard output
+    mode = ctypes.c_uint32()
+    if not kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+        return False
+    return bool(kernel32.SetConsoleMode(handle, mode.value | 0x0004))  # ENABLE_VIRTUAL_TERMINAL_PROCESSING
+
+
+def format_seconds(seconds):
+    """
+    Returns seconds as M:SS, or H:MM:SS for an hour or more.
+    """
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+class NowPlayingPanel:
+    """
+    Pins the current song's information and a progress bar to the top of the terminal with ANSI cursor control.
+    Commands and their output scroll in the region below it, so the line being typed is never cleared.
+    Only lines that changed are redrawn, with the cursor saved and restored around them.
+    When the output isn't a terminal the information is printed once per song instead.
+    """
+
+    divider = "======================================"
+    bar_width = 30  # Characters in the progress bar
+    refresh_seconds = 1.0  # Seconds between progress bar redraws
+
+    def __init__(self, stream=sys.stdout):
+        self._stream = stream
+        self._cursor_control = enable_cursor_control(stream)
+        self._fields = []  # (label, value) tuples of the current song's information
+        self._progress = None  # Seconds played, song length in seconds, paused
+        self._lines = []  # Lines on screen, index 0 is the top row
+        self._rows = None  # Terminal height the scroll region was set for, None until the panel is drawn
+
+    def show_song(self, fields):
+        """
+        Displays a new song's information.
+        Input: fields: list of (label, value) tuples
+        """
+        self._fields = fields
+        self._progress = (0, 0, False)
+        if self._cursor_control:
+            self._render()
+        else:
+            self._stream.write(
+                "\n".join(self._build_lines(shutil.get_terminal_size().columns)) + "\n"
+            )
+            self._stream.flush()
+
+    def update_progress(self, position, length, paused):
+        """
+        Redraws the progress bar if the displayed time changed.
+        Input: position and length: milliseconds as reported by VLC, 0 or less when unknown
+        """
+        progress = (max(0, position) // 1000, max(0, length) // 1000, paused)
+        if progress != self._progress and self._cursor_control and self._rows is not None:
+            self._progress = progress
+            self._render()
+
+    def close(self):
+        """
+        Gives the whole terminal back to scrolling output, the panel stays on screen.
+        """
+        if self._rows is not None:
+            self._stream.write(f"{csi}r{csi}{self._rows};1H\n")
+            self._stream.flush()
+            self._rows = None
+
+    def _render(self):
+        """
+        Writes the lines that changed since the last render.
+        The first render clears the screen once, later renders leave the cursor where the user is typing.
+        """
+        columns, rows = shutil.get_terminal_size()
+        lines = self._build_lines(columns)
+        if self._rows is None:
+            output = f"{csi}2J{csi}{len(lines) + 1};{rows}r"
+            self._lines = [None] * len(lines)
+        elif rows != self._rows or len(lines) != len(self._lines):
+            output = f"{save_cursor}{csi}{len(lines) + 1};{rows}r{restore_cursor}{save_cursor}"  # Setting the scroll region moves the cursor
+            self._lines = [None] * len(lines)
+        else:
+            output = save_cursor
+        for row, line in enumerate(lines):
+            if line != self._lines[row]:
+                output += f"{csi}{row + 1};1H{csi}2K{line}"
+        output += f"{csi}{len(lines) + 1};1H" if self._rows is None else restore_cursor
+        self._rows = rows
+        self._lines = lines
+        self._stream.write(output)
+        self._stream.flush()
+
+    def _build_lines(self, columns):
+        """
+        Returns the panel's lines, values are shortened to fit on one line so the panel keeps its height.
+        """
+        lines = [f"{Fore.CYAN}{self.divider}{Fore.RESET}"]
+        for label, value in self._fields:
+            value = str(value)
+            room = max(0, columns - len(label) - 3)
+            if len(value) > room:
+                value = value[: max(0, room - 3)] + "..."
+            lines.append(f"{Fore.GREEN}{label}:{Fore.RESET} {value}")
+        if self._cursor_control:
+            lines.append(self._build_progress_bar())
+        lines.append(f"{Fore.CYAN}{self.divider}{Fore.RESET}")
+        return lines
+
+    def _build_progress_bar(self):
+        position, length, paused = self._progress
+        filled = min(self.bar_width, self.bar_width * position // length) if length else 0
+        return (
+            f"{Fore.GREEN}{'Paused' if paused else 'Playing'}:{Fore.RESET} "
+            f"[{'#' * filled}{'-' * (self.bar_width - filled)}] "
+            f"{format_seconds(position)} / {format_seconds(length) if length else '--:--'}"
+        )
@@ -1,8 +1,16 @@
+import contextlib
 import os
+import tempfile
 import appdirs
 import argparse
 
 app_dir = appdirs.user_data_dir() + "/VLCYT/"
+settings_path = app_dir + "settings.json"
+legacy_file_paths = [
+    app_dir + "playlist.txt",
+    app_dir + "api_key.txt",
+    app_dir + "vlc_dir.txt",
+]  # Settings files used before settings.json, migrated on first load
 
 
 def is_valid_file(parser, arg):
@@ -13,18 +21,20 @@ def is_valid_file(parser, arg):
         parser.error(
             f"The filepath {arg} does not exist! Be sure to include quotes around the path, view help for more info."
         )
+    return arg
 
 
 def parse_args():
     """
     Parses passed in CLI arguments.
-    Output: tuple: YouTube playlist URL string, VLC Install Directory
+    Output: argparse.Namespace: youtube_playlist_URLs (empty if not passed in), y, v, gapless, crossfade, shuffle_seed, cache_audio, telemetry, warm, warm_processes, daemon, client, send
     """
     parser = argparse.ArgumentParser(description="Streams YouTube Playlist in VLC")
     parser.add_argument(
-        "youtube_playlist_URL",
+        "youtube_playlist_URLs",
         metavar="YouTube Playlist URL",
-        help="URL to a YouTube Playlist. Include quotes around the URL.",
+        nargs="*",
+        help="URL to a YouTube Playlist. Include quotes around the URL. Pass several URLs to play them as one playlist without duplicates. The stored playlists are used if omitted.",
     )
     parser.add_argument(
         "-y",
@@ -37,10 +47,69 @@ def parse_args():
         type=lambda x: is_valid_file(parser, x),
         help='If you\'re getting a FileNotFound error, use this option to pass in your VLC install directory. Example: "C:\\Program Files\\VideoLAN\VLC" Be sure to include the quotes.',
     )
+    parser.add_argument(
+        "--gapless",
+        action="store_true",
+        help="Buffer the next song on a second VLC player before the current song ends so there is no gap between songs.",
+    )
+    parser.add_argument(
+        "--crossfade",
+        metavar="SECONDS",
+        type=float,
+        default=0,
+        help="Fade between songs over this many seconds. Implies --gapless.",
+    )
+    parser.add_argument(
+        "--shuffle-seed",
+        metavar="SEED",
+        type=int,
+        help="Seed the shuffle order so the same shuffled order plays every time.",
+    )
+    parser.add_argument(
+        "--cache-audio",
+        metavar="MEGABYTES",
+        type=float,
+        default=0,
+        help="Download songs as they play and play them from disk afterwards, keeping up to this many megabytes of audio. The least recently played songs are deleted first.",
+    )
+    parser.add_argument(
+        "--telemetry",
+        metavar="FILE",
+        help="Append every timing shown by the stats command to this JSON lines file.",
+    )
+    parser.add_argument(
+        "--warm",
+        action="store_true",
+        help="Resolve the stream of every song in the playlist ahead of time and exit, so songs start faster for the next few hours.",
+    )
+    parser.add_argument(
+        "--warm-processes",
+        metavar="PROCESSES",
+        type=int,
+        default=2,
+        help="Worker processes that resolve streams for --warm and the warm command. Defaults to 2.",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Play in the background without a terminal. Control it with --client or --send.",
+    )
+    parser.add_argument(
+        "--client",
+        action="store_true",
+        help="Connect to a running daemon and send it each command entered.",
+    )
+    parser.add_argument(
+        "--send",
+        metavar="COMMAND",
+        help='Send one command to a running daemon, for example --send "skip 2".',
+    )
     args = parser.parse_args()
+    if args.warm_processes < 1:
+        parser.error("--warm-processes must be at least 1")
     if args.v is None:
         args.v = "C:\Program Files\VideoLAN\VLC"
-    return args.youtube_playlist_URL, args.y, args.v
+    return args
 
 
 def add_vlc_dir_to_path(vlc_dir):
@@ -48,52 +117,37 @@ def add_vlc_dir_to_path(vlc_dir):
     Note: The python-vlc module depends on a .dll in the VLC install directory.
     Adds the VLC install directory to the path and imports the vlc module.
     """
-    os.add_dll_directory(vlc_dir)
+    if hasattr(os, "add_dll_directory"):  # Windows only, libvlc is found on the library path elsewhere
+        os.add_dll_directory(vlc_dir)
     os.chdir(app_dir)
 
 
-def read_playlist_url_api_key_and_vlc_dir_from_file():
-    """
-    Reads previously stored YouTube playlist URL, API key, and VLC directory.
-    Output: tuple: playlist url, vlc dir
+def write_file_atomically(path, data):
     """
-    url = ""
-    api_key = ""
-    vlc_dir = ""
-    with open(app_dir + "playlist.txt", "r") as playlist_file:
-        url = playlist_file.read()
-    with open(app_dir + "api_key.txt", "r") as api_key_file:
-        api_key = api_key_file.read()
-    with open(app_dir + "vlc_dir.txt", "r") as vlc_dir_file:
-        vlc_dir = vlc_dir_file.read()
-    return url, api_key, vlc_dir
-
-
-def write_playlist_url_api_key_and_vlc_dir_to_file(playlist_url, api_key, vlc_dir):
+    Writes data to a temporary file and renames it over path, so a crash never leaves a partially written file behind.
+    Every writer gets its own temporary file, so threads and processes saving the same file at once don't collide.
     """
-    Stores the playlist url and vlc dir.
-    """
-    if not os.path.isdir(app_dir):
-        os.mkdir(app_dir)
-    with open(app_dir + "playlist.txt", "w+") as playlist_file:
-        playlist_file.write(playlist_url)
-    with open(app_dir + "api_key.txt", "w+") as api_key_file:
-        api_key_file.write(api_key)
-    with open(app_dir + "vlc_dir.txt", "w+") as vlc_dir_file:
-        vlc_dir_file.write(vlc_dir)
-
-
-def files_exist(file_list):
-    return False not in [os.path.isfile(i) for i in file_list]
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    temp_fd, temp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(temp_fd, "w", encoding="utf-8") as temp_file:
+            temp_file.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
 
 
 def get_file_list():
-    return [app_dir + "playlist.txt", app_dir + "vlc_dir.txt", app_dir + "api_key.txt"]
+    return [settings_path] + legacy_file_paths
 
 
 def clear_data():
     for file in get_file_list():
-        os.remove(file)
+        if os.path.isfile(file):
+            os.remove(file)
 
 
 def main():
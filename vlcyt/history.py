@@ -0,0 +1,107 @@
+from collections import deque
+
+
+class SongHistory:
+    """
+    Bounded history of played song indexes used for the back command.
+    Keeps a ring buffer of the most recent songs and a bitmap of the songs played during the current pass.
+    Every operation is O(1), except starting a new pass which clears the bitmap once per pass.
+    """
+
+    default_capacity = 1000  # Amount of songs the back command can walk through
+
+    def __init__(self, total_songs, capacity=default_capacity):
+        self._recent = deque(maxlen=capacity)  # Most recently played indexes, current song last
+        self._played = bytearray(total_songs)  # 1 at an index if that song was played this pass
+        self.songs_played_this_pass = 0
+
+    def __len__(self):
+        return len(self._recent)
+
+    def __bool__(self):
+        return bool(self._recent)
+
+    def __getitem__(self, position):
+        """
+        Returns the index at a position in the recent history, -1 is the current song.
+        Positions near either end are O(1).
+        """
+        return self._recent[position]
+
+    @property
+    def current(self):
+        """
+        Index of the current song, or None if nothing has played.
+        """
+        return self._recent[-1] if self._recent else None
+
+    def add(self, index):
+        """
+        Adds a song index as the current song and marks it played this pass.
+        Starts a new pass once every song has been played, keeping the current song marked.
+        """
+        self._recent.append(index)
+        self._mark_played(index)
+        if self.songs_played_this_pass >= len(self._played):
+            self._played = bytearray(len(self._played))
+            self.songs_played_this_pass = 0
+            self._mark_played(index)
+
+    def peek_back(self):
+        """
+        Returns the index the back command would go to, or None if there is no earlier song.
+        """
+        return self._recent[-2] if len(self._recent) > 1 else None
+
+    def back(self):
+        """
+        Removes the current song and returns the previous one, which becomes the current song.
+        Output: song index, or None if there is no earlier song
+        """
+        if len(self._recent) < 2:
+            return None
+        self._recent.pop()
+        return self._recent[-1]
+
+    def was_played(self, index):
+        """
+        Returns True if the song at the passed in index was played this pass.
+        """
+        return index < len(self._played) and bool(self._played[index])
+
+    def resize(self, total_songs):
+        """
+        Updates the amount of songs, used while the playlist is still loading.
+        """
+        if total_songs > len(self._played):
+            self._played.extend(bytes(total_songs - len(self._played)))
+        elif total_songs < len(self._played):
+            del self._played[total_songs:]
+            self.songs_played_this_pass = sum(self._played)
+
+    def remap(self, index_map, total_songs):
+        """
+        Moves every index to where its song is after the playlist changed, removed songs are forgotten.
+        Input: index_map: list holding the new index of the song at each old index, None for removed songs
+        """
+        self._recent = deque(
+            (
+                index_map[index]
+                for index in self._recent
+                if index < len(index_map) and index_map[index] is not None
+            ),
+            maxlen=self._recent.maxlen,
+        )
+        played = bytearray(total_songs)
+        for index, new_index in enumerate(index_map):
+            if new_index is not None and self.was_played(index):
+                played[new_index] = 1
+        self._played = played
+        self.songs_played_this_pass = sum(played)
+
+    def _mark_played(self, index):
+        if index >= len(self._played):
+            self.resize(index + 1)
+        if not self._played[index]:
+            self._played[index] = 1
+            self.songs_played_this_pass += 1
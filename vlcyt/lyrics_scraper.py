@@ -1,27 +1,132 @@
-import requests
-from bs4 import BeautifulSoup
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from vlcyt.file_helpers import app_dir
+from vlcyt.telemetry import telemetry
+
+default_search_url = r"https://search.azlyrics.com/search.php?"
+search_url_variable = "VLCYT_LYRICS_SEARCH_URL"  # Environment variable that can point at a local stand-in server for testing
+request_timeout = (3.05, 10)  # Seconds to connect and to read, lyrics are never worth hanging on
+
+_session = None  # Shared so requests to the lyrics site reuse pooled connections, created on first use
+_session_lock = threading.Lock()
+
+
+def _get_session():
+    """
+    Returns the shared requests session.
+    requests and BeautifulSoup are imported on first use because most sessions never ask for lyrics.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+
+            _session = requests.Session()
+            _session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=4))
+            _session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=4))
+        return _session
+
+
+def get_search_url():
+    """
+    Returns the lyrics search URL, read from the environment on every request so it can be changed after import.
+    """
+    return os.environ.get(search_url_variable, default_search_url)
 
 
 def get_lyrics(song_title):
     """
     Returns lyrics for a passed in song title.
     """
-    with requests.session() as c:
-        url = r"https://search.azlyrics.com/search.php?"
+    from bs4 import BeautifulSoup
+
+    session = _get_session()
+    search_url = get_search_url()
+    query = {"q": song_title}
+    r = session.get(search_url, params=query, timeout=request_timeout)
+
+    soup = BeautifulSoup(r.content, "html.parser")
+    lyrics_url = soup.td.a["href"]
+    if "http" not in lyrics_url:
+        lyrics_url = search_url + lyrics_url[1:]
+        lyrics_url = lyrics_url[0 : lyrics_url.find("&")]
+
+    r2 = session.get(lyrics_url, timeout=request_timeout)
+    soup2 = BeautifulSoup(r2.content, "html.parser")
+    lyrics = soup2.select("div.col-xs-12:nth-child(2) > div:nth-child(8)")
+    return lyrics[0].get_text()
+
+
+class LyricsFetcher:
+    """
+    Retrieves lyrics on background threads and caches them on disk by normalized song title.
+    """
+
+    def __init__(self, cache_dir=app_dir + "lyrics/", max_workers=2):
+        self.cache_dir = cache_dir
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="vlcyt-lyrics"
+        )
+        self._pending = {}  # Normalized title -> Future of the lyrics being fetched
+        self._lock = threading.Lock()
+
+    def get_cached(self, song_title):
+        """
+        Returns cached lyrics for the passed in song title, or None if they haven't been retrieved.
+        """
+        try:
+            with open(self._cache_path(song_title), "r", encoding="utf-8") as lyrics_file:
+                return lyrics_file.read()
+        except OSError:
+            return None
+
+    def fetch(self, song_title):
+        """
+        Starts retrieving lyrics for the passed in song title in the background.
+        Output: Future resolving to the lyrics, shared with any fetch of the same title already in progress
+        """
+        key = self._normalize(song_title)
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                future = self._executor.submit(self._fetch_and_cache, song_title)
+                self._pending[key] = future
+                future.add_done_callback(lambda _: self._forget(key))
+            return future
+
+    def prefetch(self, song_titles):
+        """
+        Retrieves lyrics for every passed in song title that isn't cached yet.
+        Failures are ignored, the lyrics command reports them if the user asks for those lyrics.
+        """
+        for song_title in song_titles:
+            if self.get_cached(song_title) is None:
+                self.fetch(song_title)
+
+    def _fetch_and_cache(self, song_title):
+        with telemetry.timer("lyrics.fetch"):
+            lyrics = get_lyrics(song_title)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cache_path = self._cache_path(song_title)
+        with open(cache_path + ".tmp", "w", encoding="utf-8") as lyrics_file:
+            lyrics_file.write(lyrics)
+        os.replace(cache_path + ".tmp", cache_path)
+        return lyrics
+
+    def _forget(self, key):
+        with self._lock:
+            self._pending.pop(key, None)
 
-        query = {"q": song_title}
-        r = requests.get(url, params=query)
+    def _cache_path(self, song_title):
+        key = hashlib.sha1(self._normalize(song_title).encode("utf-8")).hexdigest()
+        return self.cache_dir + key + ".txt"
 
-        soup = BeautifulSoup(r.content, "html.parser")
-        lyrics_url = soup.td.a["href"]
-        if "http" not in lyrics_url:
-            lyrics_url = url + lyrics_url[1:]
-            lyrics_url = lyrics_url[0 : lyrics_url.find("&")]
+    @staticmethod
+    def _normalize(song_title):
+        return " ".join(song_title.lower().split())
 
-        r2 = requests.get(lyrics_url)
-        soup2 = BeautifulSoup(r2.content, "html.parser")
-        lyrics = soup2.select("div.col-xs-12:nth-child(2) > div:nth-child(8)")
-        return lyrics[0].get_text()
 
 def main():
     pass
@@ -0,0 +1,105 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from vlcyt.youtube_api import get_pafy
+
+
+def metadata_from_video_data(video):
+    """
+    Returns the displayed metadata dict for one item of a videos.list response.
+    Values are formatted the same way Pafy formats them.
+    """
+    from pafy.playlist import parseISO8591  # Imported on first use with the rest of pafy, see get_pafy()
+
+    statistics = video.get("statistics", {})
+    likes = statistics.get("likeCount")
+    dislikes = statistics.get("dislikeCount")  # No longer returned by the API for most videos
+    rating = None
+    if likes is not None and dislikes is not None and int(likes) + int(dislikes) > 0:
+        rating = 1 + 4 * int(likes) / (int(likes) + int(dislikes))  # YouTube's old 5 star rating
+    return {
+        "duration": time.strftime(
+            "%H:%M:%S", time.gmtime(parseISO8591(video["contentDetails"]["duration"]))
+        ),
+        "viewcount": int(statistics.get("viewCount", 0)),
+        "rating": rating,
+        "published": video["snippet"]["publishedAt"]
+        .replace(".000Z", "")
+        .replace("T", " "),
+    }
+
+
+class MetadataFetcher:
+    """
+    Fetches displayed song metadata with batched videos.list requests on a bounded thread pool.
+    Results are stored in the stream cache, videos that are already cached are not requested again.
+    """
+
+    batch_size = 50  # Maximum amount of ids the API accepts per videos.list request
+
+    def __init__(self, stream_cache, max_workers=4):
+        self.stream_cache = stream_cache
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="vlcyt-metadata"
+        )
+        self._pending = {}  # videoid -> Future of the batch that includes it
+        self._lock = threading.Lock()
+
+    def fetch_in_background(self, videoids):
+        """
+        Queues batched requests for every passed in videoid that is not cached or already being fetched.
+        """
+        with self._lock:
+            missing = [
+                videoid
+                for videoid in dict.fromkeys(videoids)
+                if videoid not in self._pending
+                and self.stream_cache.get_metadata(videoid) is None
+            ]
+            for start in range(0, len(missing), self.batch_size):
+                batch = missing[start : start + self.batch_size]
+                future = self._executor.submit(self._fetch_batch, batch)
+                for videoid in batch:
+                    self._pending[videoid] = future
+
+    def get(self, videoid):
+        """
+        Returns the metadata dict of the passed in videoid.
+        Waits for its batch if it is being fetched, otherwise fetches it on its own.
+        Output: dict, or None if the request failed or YouTube didn't return the video (removed or blocked)
+        """
+        metadata = self.stream_cache.get_metadata(videoid)
+        if metadata is not None:
+            return metadata
+        with self._lock:
+            future = self._pending.get(videoid)
+        try:
+            if future is not None:
+                future.result()
+            else:
+                self._fetch_batch([videoid])
+        except Exception:
+            return None  # Metadata is only displayed, a failed request must not stop playback
+        return self.stream_cache.get_metadata(videoid)
+
+    def _fetch_batch(self, videoids):
+        """
+        Requests the metadata of up to batch_size videos in one videos.list call and caches it.
+        """
+        try:
+            query = {
+                "part": "contentDetails,snippet,statistics",
+                "maxResults": self.batch_size,
+                "id": ",".join(videoids),
+            }
+            video_data = get_pafy().call_gdata("videos", query)
+            for video in video_data["items"]:
+                try:
+                    metadata = metadata_from_video_data(video)
+                except (KeyError, TypeError, ValueError):
+                    continue  # Incomplete video data, shown as unavailable
+                self.stream_cache.set_metadata(video["id"], metadata)
+        finally:
+            with self._lock:
+                for videoid in videoids:
+                    self._pending.pop(videoid, None)
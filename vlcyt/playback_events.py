@@ -0,0 +1,60 @@
+import asyncio
+import threading
+
+# Events posted by the input thread
+SKIP = "skip"
+EXIT = "exit"
+# Events posted by VLC's event manager
+END_REACHED = "end_reached"
+ENCOUNTERED_ERROR = "encountered_error"
+
+
+class PlaybackEvents:
+    """
+    Queue of events that drives the playback loop, owned by the asyncio event loop.
+    VLC callbacks and other threads post events, the playback coroutine awaits them.
+    """
+
+    def __init__(self):
+        self._loop = None  # Event loop the queue belongs to, set by bind()
+        self._queue = None
+        self._early_events = []  # Events posted before the event loop started
+        self._lock = threading.Lock()
+
+    def bind(self, loop):
+        """
+        Attaches the queue to the running event loop, delivering any events posted before it started.
+        """
+        with self._lock:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            for event in self._early_events:
+                self._queue.put_nowait(event)
+            self._early_events = []
+
+    def post(self, event):
+        """
+        Adds an event to the queue. Safe to call from any thread, including VLC callbacks.
+        """
+        with self._lock:
+            if self._loop is None:
+                self._early_events.append(event)
+            else:
+                self._loop.call_soon_threadsafe(self._queue.put_nowait, event)
+
+    async def wait(self, timeout=None):
+        """
+        Waits until an event arrives and returns it.
+        Output: event string, or None if the timeout expired first
+        """
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def vlc_callback(self, vlc_event, event):
+        """
+        Callback for VLC's event manager, the event to post is passed as the callback's user data.
+        Calling back into libvlc from here can deadlock, so this only posts the event.
+        """
+        self.post(event)
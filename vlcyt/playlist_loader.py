@@ -0,0 +1,417 @@
+import json
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from vlcyt.youtube_api import extract_playlist_id, get_pafy
+
+
+class Track:
+    """
+    One song in the playlist. Holds only what the playlist returns, a Pafy object is created when the song is resolved.
+    Uses __slots__ so very large playlists stay small, channel names are interned since many songs share them.
+    """
+
+    __slots__ = ("videoid", "title", "author")
+
+    def __init__(self, videoid, title, author):
+        self.videoid = videoid
+        self.title = title
+        self.author = sys.intern(author) if author else author
+
+    def __repr__(self):
+        return f"Track({self.videoid!r}, {self.title!r}, {self.author!r})"
+
+
+def call_gdata_if_changed(api, query, etag=None):
+    """
+    Same as pafy.call_gdata(), but sends the ETag of an earlier response so YouTube can answer that nothing changed.
+    Output: decoded response, or None if it is unchanged since the response with the passed in ETag
+    """
+    import urllib.error
+    import urllib.parse
+    import urllib.request  # Imported here with pafy, which needs it anyway, to keep it off the path to the first song
+
+    pafy = get_pafy()
+    if not etag:
+        return pafy.call_gdata(api, query)
+    request = urllib.request.Request(
+        pafy.g.urls["gdata"] + api + "?" + urllib.parse.urlencode(dict(query, key=pafy.g.api_key)),
+        headers={"If-None-Match": etag},
+    )
+    try:
+        return json.loads(pafy.g.opener.open(request).read().decode("utf-8"))
+    except urllib.error.HTTPError as e:
+        if e.code == 304:  # Not Modified
+            return None
+        raise pafy.GdataError(f"Youtube Error {e.code}: {e.reason}")
+
+
+def merge_songs(song_lists):
+    """
+    Returns the songs of every list in order, keeping only the first song of each video.
+    """
+    videoids = set()
+    merged = []
+    for songs in song_lists:
+        for song in songs:
+            if song.videoid not in videoids:
+                videoids.add(song.videoid)
+                merged.append(song)
+    return merged
+
+
+class LazyPlaylist:
+    """
+    Drop-in replacement for the Pafy playlist object that fetches playlist pages on a background thread.
+    Songs can be accessed as soon as the page that contains them has arrived.
+
+    If the pages from an earlier load are passed in, each page is requested with its ETag
+    and pages YouTube reports as unchanged are reused instead of downloaded and parsed again.
+    """
+
+    page_size = 50  # Maximum page size allowed by the YouTube Data API
+    playable_privacy_statuses = ("public", "unlisted")  # Private and deleted videos are skipped
+
+    def __init__(
+        self,
+        youtube_playlist_url,
+        page_callback=None,
+        defer_item_count=False,
+        previous_pages=None,
+    ):
+        self.plid = extract_playlist_id(youtube_playlist_url)
+        if not self.plid:
+            raise ValueError(f"Unrecognized playlist url: {youtube_playlist_url}")
+        self.page_callback = page_callback  # Called from the loader thread with the songs of each page as it arrives
+        self._items = []  # Tracks of every song loaded so far, in playlist order
+        self._previous_pages = {
+            page["token"]: page for page in previous_pages or []
+        }  # Page token -> page from an earlier load, see playlist_snapshot.load_snapshot()
+        self._pages = []  # Pages loaded so far without their songs, which are kept only once in _items
+        self.unchanged_pages = 0  # Pages reused because YouTube reported they hadn't changed
+        # Amount of songs reported by the API before any pages are loaded.
+        # Fetched on the loader thread when deferred, the playlist then reports only the songs loaded so far.
+        self._item_count = 0 if defer_item_count else self._fetch_item_count()
+        self._defer_item_count = defer_item_count
+        self._fully_loaded = False  # Becomes True once the last page has been loaded
+        self._load_error = None  # Stores the exception that stopped the loader thread, if any
+        self._items_changed = threading.Condition()
+        self.loader_thread = threading.Thread(target=self._load_pages)
+        self.loader_thread.daemon = True
+        self.loader_thread.start()
+
+    def __len__(self):
+        """
+        Returns the amount of songs in the playlist.
+        The API item count is used until every page has been loaded.
+        """
+        with self._items_changed:
+            if self._fully_loaded:
+                return len(self._items)
+            return max(self._item_count, len(self._items))
+
+    def __getitem__(self, index):
+        """
+        Returns the Track at the passed in index.
+        Blocks until the page containing the index has been loaded.
+        """
+        with self._items_changed:
+            self._items_changed.wait_for(
+                lambda: index < len(self._items) or self._fully_loaded
+            )
+            if index < len(self._items):
+                return self._items[index]
+            if self._load_error is not None:
+                raise self._load_error
+            raise IndexError("playlist index out of range")
+
+    def is_fully_loaded(self):
+        """
+        Returns True if every page of the playlist has been loaded.
+        """
+        return self._fully_loaded
+
+    def get_pages(self):
+        """
+        Returns the pages loaded so far with their songs, saved in the snapshot so the next load can reuse them.
+        """
+        with self._items_changed:
+            pages = []
+            start = 0
+            for page in self._pages:
+                songs = self._items[start : start + page["count"]]
+                start += page["count"]
+                page = dict(page, songs=songs)
+                del page["count"]
+                pages.append(page)
+            return pages
+
+    def _fetch_item_count(self):
+        """
+        Returns the amount of songs in the playlist according to the API.
+        """
+        query = {"part": "contentDetails", "id": self.plid}
+        playlist_info = get_pafy().call_gdata("playlists", query)
+        return playlist_info["items"][0]["contentDetails"]["itemCount"]
+
+    def _fetch_page(self, page_token):
+        """
+        Fetches one page of playlist items, reusing the page from the earlier load if it hasn't changed.
+        Only the title is filled in, the displayed metadata is fetched separately in batches.
+        Output: dict: token, etag, next (next page token or None), skipped, songs (list of Tracks)
+        """
+        query = {
+            "part": "snippet,status",
+            "maxResults": self.page_size,
+            "playlistId": self.plid,
+        }
+        if page_token:
+            query["pageToken"] = page_token
+        previous_page = self._previous_pages.get(page_token)
+        playlist_items = call_gdata_if_changed(
+            "playlistItems", query, previous_page and previous_page["etag"]
+        )
+        if playlist_items is None:
+            self.unchanged_pages += 1
+            self._item_count -= previous_page["skipped"]
+            return previous_page
+
+        songs = []
+        for item in playlist_items["items"]:
+            if item["status"]["privacyStatus"] not in self.playable_privacy_statuses:
+                continue
+            snippet = item["snippet"]
+            songs.append(
+                Track(
+                    snippet["resourceId"]["videoId"],
+                    snippet["title"],
+                    snippet.get("videoOwnerChannelTitle"),
+                )
+            )
+        # Deleted and private videos are counted by the API but can't be played
+        skipped = len(playlist_items["items"]) - len(songs)
+        self._item_count -= skipped
+        return {
+            "token": page_token,
+            "etag": playlist_items.get("etag"),
+            "next": playlist_items.get("nextPageToken"),
+            "skipped": skipped,
+            "songs": songs,
+        }
+
+    def _load_pages(self):
+        """
+        Loads every page of the playlist, waking up anyone waiting on a song after each page.
+        """
+        page_token = None
+        try:
+            if self._defer_item_count:
+                self._item_count = self._fetch_item_count()
+            while True:
+                page = self._fetch_page(page_token)
+                songs = page.pop("songs")
+                with self._items_changed:
+                    self._pages.append(dict(page, count=len(songs)))
+                    self._items.extend(songs)
+                    self._items_changed.notify_all()
+                if self.page_callback is not None:
+                    self.page_callback(songs)
+                page_token = page["next"]
+                if not page_token:
+                    break
+        except Exception as e:
+            self._load_error = e
+        finally:
+            self._previous_pages = {}  # Every page that could be reused has been
+            with self._items_changed:
+                self._fully_loaded = True
+                self._items_changed.notify_all()
+            if self.page_callback is not None:
+                self.page_callback([])  # Lets listeners notice the playlist finished loading
+
+
+class MergedPlaylist:
+    """
+    Merges several playlists into one queue without duplicate videos.
+    Every playlist loads concurrently and songs are appended as their pages arrive, in arrival order.
+
+    If a snapshot of the pages from the last launch is passed in, those songs are queued immediately
+    and the playlists sync in the background, only pages that changed are downloaded again.
+    New songs are appended as they arrive, once every playlist has loaded apply_sync() puts the queue
+    in playlist order and drops songs that were removed.
+    """
+
+    def __init__(
+        self,
+        youtube_playlist_urls,
+        page_callback=None,
+        snapshot=None,
+        loaded_callback=None,
+    ):
+        self.page_callback = page_callback  # Called with the newly merged songs of each page as it arrives
+        self.loaded_callback = loaded_callback  # Called once with the pages of every playlist after they all loaded without errors
+        self._items = []  # Tracks of every unique song loaded so far
+        self._index_of = {}  # Videoid -> index of the song in the queue
+        self._unconfirmed = set()  # Videoids from the snapshot that the playlists haven't returned yet
+        self._songs_received = [0] * len(youtube_playlist_urls)  # Songs merged so far from each playlist
+        self._sync_ready = False  # Becomes True once every playlist loaded, until apply_sync() has used the loaded songs
+        self._loading_finished = False  # Becomes True once _finish_loading() has handled the loaded playlists
+        self._items_changed = threading.Condition()
+        snapshot_pages = [
+            self._pages_with_tracks((snapshot or {}).get(extract_playlist_id(url)))
+            for url in youtube_playlist_urls
+        ]
+        if snapshot:
+            self._items = merge_songs(
+                [song for page in pages for song in page["songs"]] for pages in snapshot_pages
+            )
+            self._index_of = {song.videoid: index for index, song in enumerate(self._items)}
+            self._unconfirmed = set(self._index_of)
+            if self.page_callback is not None:
+                self.page_callback(list(self._items))
+        with ThreadPoolExecutor(max_workers=len(youtube_playlist_urls)) as executor:
+            self.playlists = list(
+                executor.map(
+                    self._create_playlist,
+                    range(len(youtube_playlist_urls)),
+                    youtube_playlist_urls,
+                    snapshot_pages,
+                )
+            )
+        self._finish_loading()
+
+    def __len__(self):
+        """
+        Returns the amount of songs in the queue.
+        Songs in pages that have not arrived yet are estimated, including possible duplicates.
+        Snapshot songs that haven't been returned yet are assumed to be among them.
+        """
+        with self._items_changed:
+            not_loaded = sum(
+                max(0, len(playlist) - songs_received)
+                for playlist, songs_received in zip(self.playlists, self._songs_received)
+                if not playlist.is_fully_loaded()
+            )
+            return len(self._items) + max(0, not_loaded - len(self._unconfirmed))
+
+    def __getitem__(self, index):
+        """
+        Returns the Track at the passed in index.
+        Blocks until enough pages have been merged to reach the index.
+        """
+        with self._items_changed:
+            self._items_changed.wait_for(
+                lambda: index < len(self._items) or self.is_fully_loaded()
+            )
+            if index < len(self._items):
+                return self._items[index]
+        for playlist in self.playlists:
+            if playlist._load_error is not None and not self._items:
+                raise playlist._load_error
+        raise IndexError("playlist index out of range")
+
+    def get_loaded(self, index):
+        """
+        Returns the Track at the passed in index without waiting, or None if it hasn't been loaded yet.
+        """
+        with self._items_changed:
+            return self._items[index] if index < len(self._items) else None
+
+    def index_of(self, videoid):
+        """
+        Returns the index of the song with the passed in videoid, or None if it hasn't been loaded.
+        """
+        with self._items_changed:
+            return self._index_of.get(videoid)
+
+    def is_fully_loaded(self):
+        """
+        Returns True if every page of every playlist has been loaded.
+        """
+        return all(playlist.is_fully_loaded() for playlist in self.playlists)
+
+    def wait_until_loaded(self):
+        """
+        Blocks until every playlist has loaded and apply_sync() can put the queue in playlist order.
+        Returns right after is_fully_loaded() becomes True if a playlist failed to load, apply_sync() then does nothing.
+        """
+        with self._items_changed:
+            self._items_changed.wait_for(lambda: self._loading_finished)
+
+    def apply_sync(self):
+        """
+        Puts the queue in playlist order once every playlist has loaded.
+        Songs removed from the playlists are dropped, songs that were added or moved take their place in the playlist.
+        Output: list holding the new index of the song at each old index, None for removed songs,
+                or None if the queue didn't change or the playlists are still loading
+        """
+        with self._items_changed:
+            if not self._sync_ready:
+                return None
+            self._sync_ready = False
+            synced_items = merge_songs(playlist._items for playlist in self.playlists)
+            if not synced_items:
+                return None  # An emptied playlist keeps playing the songs it had
+            index_of = {song.videoid: index for index, song in enumerate(synced_items)}
+            index_map = [index_of.get(song.videoid) for song in self._items]
+            changed = len(synced_items) != len(self._items) or any(
+                new_index != old_index for old_index, new_index in enumerate(index_map)
+            )
+            self._items = synced_items
+            self._index_of = index_of
+            self._unconfirmed = set()
+            self._items_changed.notify_all()
+        return index_map if changed else None
+
+    def _pages_with_tracks(self, pages):
+        """
+        Turns the songs of snapshot pages into Tracks, returns an empty list if there are no pages.
+        """
+        for page in pages or []:
+            page["songs"] = [Track(*song) for song in page["songs"]]
+        return pages or []
+
+    def _create_playlist(self, playlist_number, youtube_playlist_url, previous_pages):
+        return LazyPlaylist(
+            youtube_playlist_url,
+            page_callback=lambda songs: self._add_songs(playlist_number, songs),
+            defer_item_count=bool(self._items),  # Nothing waits on the item count when snapshot songs are queued
+            previous_pages=previous_pages,
+        )
+
+    def _add_songs(self, playlist_number, songs):
+        """
+        Page callback for every playlist, appends songs whose video is not already in the queue.
+        """
+        new_songs = []
+        with self._items_changed:
+            self._songs_received[playlist_number] += len(songs)
+            for song in songs:
+                if song.videoid not in self._index_of:
+                    self._index_of[song.videoid] = len(self._items)
+                    self._items.append(song)
+                    new_songs.append(song)
+                else:
+                    self._unconfirmed.discard(song.videoid)
+            self._items_changed.notify_all()
+        if self.page_callback is not None and new_songs:
+            self.page_callback(new_songs)
+        if hasattr(self, "playlists"):  # Pages can arrive before every playlist has been created
+            self._finish_loading()
+
+    def _finish_loading(self):
+        """
+        Once every playlist has loaded without errors, lets apply_sync() reorder the queue and calls loaded_callback.
+        Wakes up wait_until_loaded() either way.
+        """
+        if not self.is_fully_loaded():
+            return
+        load_failed = any(playlist._load_error is not None for playlist in self.playlists)
+        with self._items_changed:
+            if self._loading_finished:
+                return
+            self._loading_finished = True
+            self._sync_ready = not load_failed
+            self._items_changed.notify_all()
+        if self.loaded_callback is not None and not load_failed:
+            self.loaded_callback({playlist.plid: playlist.get_pages() for playlist in self.playlists})
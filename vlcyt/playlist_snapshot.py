@@ -0,0 +1,54 @@
+import json
+from vlcyt.file_helpers import app_dir, write_file_atomically
+from vlcyt.youtube_api import extract_playlist_id
+
+snapshot_path = app_dir + "playlist_snapshot.json"
+snapshot_version = 2  # Snapshots written by another version are ignored
+
+
+def load_snapshot(playlist_urls, path=snapshot_path):
+    """
+    Reads the pages saved the last time the passed in playlists were fully loaded.
+    Each page is a dict: token (page token it was requested with), etag, next (next page token), skipped (unplayable items), songs.
+    Output: dict: playlist id -> list of pages, or None if none of these playlists have a snapshot
+    """
+    try:
+        with open(path, "r", encoding="utf-8") as snapshot_file:
+            snapshot = json.load(snapshot_file)
+    except (OSError, ValueError):
+        return None
+    if snapshot.get("version") != snapshot_version:
+        return None
+    playlist_pages = {}
+    try:
+        for url in playlist_urls:
+            plid = extract_playlist_id(url)
+            pages = snapshot["playlists"].get(plid)
+            if pages is not None:
+                for page in pages:
+                    page["songs"] = [tuple(song) for song in page["songs"]]
+                playlist_pages[plid] = pages
+    except (KeyError, TypeError, AttributeError):
+        return None  # Damaged snapshot, the playlists are loaded from scratch
+    return playlist_pages or None
+
+
+def save_snapshot(playlist_pages, path=snapshot_path):
+    """
+    Stores the pages of every playlist for the next launch, replacing the playlists saved before.
+    Input: dict: playlist id -> list of pages as described in load_snapshot(), holding Tracks
+    """
+    snapshot = {
+        "version": snapshot_version,
+        "playlists": {
+            plid: [
+                dict(
+                    page,
+                    songs=[[song.videoid, song.title, song.author] for song in page["songs"]],
+                )
+                for page in pages
+            ]
+            for plid, pages in playlist_pages.items()
+        },
+    }
+    write_file_atomically(path, json.dumps(snapshot, separators=(",", ":")))
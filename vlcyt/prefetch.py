@@ -0,0 +1,88 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class StreamPrefetcher:
+    """
+    Resolves the stream URLs of upcoming songs on worker threads while the current song plays.
+    Prefetched URLs are keyed by playlist index and checked against the song's videoid before use.
+    Resolved URLs are also stored in the stream cache so later sessions can skip resolving them.
+    """
+
+    max_url_age = 60 * 60  # Seconds a prefetched URL is trusted for, signed YouTube URLs expire after a few hours
+
+    def __init__(self, playlist, stream_cache, resolver, max_workers=2):
+        self.playlist = playlist
+        self.stream_cache = stream_cache
+        self.resolver = resolver  # Resolves stream URLs with retries
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="vlcyt-prefetch"
+        )
+        self._pending = {}  # Playlist index -> Future resolving to (videoid, stream url, time resolved)
+        self._lock = threading.Lock()
+
+    def prefetch(self, indexes):
+        """
+        Starts resolving the stream URLs of the songs at the passed in indexes.
+        Prefetched URLs for any other index are discarded.
+        """
+        indexes = set(indexes)
+        with self._lock:
+            for index in list(self._pending):
+                if index not in indexes:
+                    self._pending.pop(index).cancel()
+            for index in indexes:
+                future = self._pending.get(index)
+                if future is None or (future.done() and not self._is_usable(future)):
+                    self._pending[index] = self._executor.submit(self._resolve, index)
+
+    def get_url(self, index, song):
+        """
+        Returns the stream URL of the passed in song.
+        Uses the prefetched URL when it is still fresh and belongs to the same video, otherwise resolves it now.
+        """
+        with self._lock:
+            future = self._pending.pop(index, None)
+        if future is not None and not future.cancelled():
+            try:
+                videoid, url, resolved_at = future.result()
+            except Exception:
+                pass  # Fall back to resolving synchronously below
+            else:
+                if videoid == song.videoid and not self._is_stale(resolved_at):
+                    return url
+        return self._resolve_url(song)[0]
+
+    def _resolve(self, index):
+        """
+        Worker task, resolves the stream URL of the song at the passed in index.
+        Output: tuple: videoid, stream url, time resolved
+        """
+        song = self.playlist[index]
+        return (song.videoid,) + self._resolve_url(song)
+
+    def _resolve_url(self, song):
+        """
+        Returns the stream URL of the passed in song from the stream cache, resolving and caching it if needed.
+        Cached URLs keep the time they were resolved at, the ones older than max_url_age are resolved again.
+        Output: tuple: stream url, time resolved
+        """
+        url = self.stream_cache.get_url(song.videoid)
+        age = self.stream_cache.get_url_age(song.videoid)
+        if url is not None and age is not None and age <= self.max_url_age:
+            return url, time.monotonic() - age
+        url = self.resolver.resolve(song)
+        self.stream_cache.set_url(song.videoid, url)
+        return url, time.monotonic()
+
+    def _is_usable(self, future):
+        """
+        Returns True if a finished prefetch succeeded and its URL has not gone stale.
+        """
+        if future.cancelled() or future.exception() is not None:
+            return False
+        return not self._is_stale(future.result()[2])
+
+    def _is_stale(self, resolved_at):
+        return time.monotonic() - resolved_at > self.max_url_age
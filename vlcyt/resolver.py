@@ -0,0 +1,87 @@
+import threading
+import time
+from vlcyt.youtube_api import get_pafy
+
+
+class StreamResolutionError(Exception):
+    """
+    Raised when a song's stream URL couldn't be resolved after every retry.
+    """
+
+
+def get_audio_urls(song):
+    """
+    Returns the stream URLs of the passed in Track, best audio format first.
+    The best combined audio and video stream comes last as a final fallback, VLC is told to ignore its video.
+    The song's Pafy object is only created here, right before it plays.
+    """
+    video = get_pafy().new(song.videoid)
+    audio_streams = sorted(
+        video.audiostreams, key=lambda stream: stream.rawbitrate or 0, reverse=True
+    )
+    urls = [stream.url_https for stream in audio_streams]
+    best_stream = video.getbest()
+    if best_stream is not None:
+        urls.append(best_stream.url_https)
+    return urls
+
+
+class StreamResolver:
+    """
+    Resolves stream URLs with bounded retries and exponential backoff, and tracks videos that keep failing to play.
+    Failed plays are counted in the stream cache so they add up across sessions.
+    A video that fails failure_threshold times in a row is dead and skipped until its failures expire.
+    """
+
+    max_attempts = 3  # Tries per resolution before giving up
+    backoff_seconds = 0.5  # Wait before the first retry, doubled for every retry after it
+    failure_threshold = 3  # Failed plays in a row before a video is added to the dead list
+
+    def __init__(self, stream_cache, get_urls=get_audio_urls, sleep=time.sleep):
+        self.stream_cache = stream_cache
+        self._get_urls = get_urls  # Returns a song's stream URLs best first, replaceable for testing
+        self._sleep = sleep
+        self._lock = threading.Lock()
+
+    def resolve(self, song, format_index=0):
+        """
+        Returns the stream URL of the passed in song's format at format_index, 0 being the best audio format.
+        Raises StreamResolutionError if every attempt failed or the song has no format at format_index.
+        """
+        delay = self.backoff_seconds
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                urls = self._get_urls(song)
+                break
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    raise StreamResolutionError(
+                        f"Couldn't resolve {song.videoid}: {e}"
+                    ) from e
+                self._sleep(delay)
+                delay *= 2
+        if format_index >= len(urls):
+            raise StreamResolutionError(f"{song.videoid} has no more formats to try")
+        return urls[format_index]
+
+    def record_failure(self, videoid):
+        """
+        Counts a failed play of the passed in video.
+        """
+        with self._lock:
+            self.stream_cache.set_failures(
+                videoid, self.stream_cache.get_failures(videoid) + 1
+            )
+
+    def record_success(self, videoid):
+        """
+        Clears the failed plays of the passed in video once it played to the end.
+        """
+        with self._lock:
+            self.stream_cache.set_failures(videoid, 0)
+
+    def is_dead(self, videoid):
+        """
+        Returns True if the video failed to play failure_threshold times in a row.
+        """
+        return self.stream_cache.get_failures(videoid) >= self.failure_threshold
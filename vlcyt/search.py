@@ -0,0 +1,217 @@
+import heapq
+import math
+import re
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+word_pattern = re.compile(r"\w+")
+
+
+def split_words(text):
+    """
+    Returns the lowercase words of the passed in text, without duplicates.
+    """
+    return list(dict.fromkeys(word_pattern.findall(text.lower())))
+
+
+def _bigrams(word):
+    return {word[i : i + 2] for i in range(len(word) - 1)}
+
+
+def _is_one_typo_apart(a, b):
+    """
+    Returns True if a and b differ by one inserted, deleted, replaced, or swapped character.
+    """
+    if abs(len(a) - len(b)) > 1 or a == b:
+        return False
+    start = 0
+    while start < min(len(a), len(b)) and a[start] == b[start]:
+        start += 1
+    if len(a) == len(b):
+        return a[start + 1 :] == b[start + 1 :] or (
+            a[start + 2 :] == b[start + 2 :] and a[start : start + 2] == b[start : start + 2][::-1]
+        )
+    shorter, longer = (a, b) if len(a) < len(b) else (b, a)
+    return shorter[start:] == longer[start + 1 :]
+
+
+class SongSearchIndex:
+    """
+    In-memory inverted index over cleaned song titles, used by the find and play commands.
+    Words map to the songs whose title contains them, a sorted vocabulary answers prefix queries,
+    and the two letter pieces of every word find words one typo away.
+    Songs are stored by videoid so results stay correct when the playlist is reordered.
+    """
+
+    word_match_score = 100.0  # Added for every query word a song matches, more words matched always ranks higher
+    exact_weight = 3.0  # Relevance of a query word that matches a title word, up to 1 more is added for rare words
+    prefix_weight = 2.0  # Relevance of a query word that starts a title word
+    typo_weight = 1.0  # Relevance of a query word one typo away from a title word
+    phrase_bonus = 0.5  # Added when the whole query appears in the title as typed
+    rerank_factor = 5  # The phrase bonus is only checked for this many times limit of the best songs
+    min_prefix_length = 2  # Shorter query words only match whole words
+    min_typo_length = 4  # Shorter query words are not corrected, too many words are one typo away from them
+
+    def __init__(self, clean_title):
+        self._clean_title = clean_title  # Returns the cleaned title of a Track
+        self._songs = []  # Song number -> (videoid, cleaned title)
+        self._song_numbers = {}  # videoid -> song number
+        self._postings = {}  # Word -> list of song numbers with that word in their title
+        self._vocabulary = []  # Every indexed word, sorted for prefix queries
+        self._shortness = array("f")  # Song number -> up to 0.1, higher for titles with fewer words
+        self._typo_candidates = {}  # (two letter piece, word length) -> list of words of that length containing it
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vlcyt-search")
+        self._pending = 0  # Batches of songs queued but not indexed yet
+
+    def __len__(self):
+        return len(self._songs)
+
+    def add_in_background(self, songs):
+        """
+        Queues the passed in Tracks to be indexed on the index's own thread.
+        """
+        with self._lock:
+            self._pending += 1
+        self._executor.submit(self._add_batch, list(songs))
+
+    def is_indexing(self):
+        """
+        Returns True while songs are queued to be indexed.
+        """
+        return self._pending > 0
+
+    def add(self, songs):
+        """
+        Indexes the cleaned titles of the passed in Tracks.
+        A song that is already indexed is only indexed again if its title changed.
+        """
+        titles = [(song.videoid, self._clean_title(song)) for song in songs]
+        with self._lock:
+            for videoid, title in titles:
+                song_number = self._song_numbers.get(videoid)
+                if song_number is None:
+                    song_number = self._song_numbers[videoid] = len(self._songs)
+                    self._songs.append(None)
+                    self._shortness.append(0.0)
+                elif self._songs[song_number][1] == title:
+                    continue
+                else:
+                    for word in split_words(self._songs[song_number][1]):
+                        self._postings[word].remove(song_number)
+                words = split_words(title)
+                self._songs[song_number] = (videoid, title)
+                self._shortness[song_number] = 0.1 / (1 + len(words))
+                for word in words:
+                    postings = self._postings.get(word)
+                    if postings is None:
+                        postings = self._postings[word] = []
+                        self._add_to_vocabulary(word)
+                    postings.append(song_number)
+
+    def search(self, query, limit=10, include=None):
+        """
+        Returns the songs whose cleaned titles best match the query, most relevant first.
+        Songs matching more query words rank first, then by how well and how rare the matched words are, then shorter titles.
+        Input: include: optional function that returns False for a videoid that should be left out
+        Output: list of (videoid, cleaned title) tuples
+        """
+        query_phrase = query.strip().lower()
+        with self._lock:
+            scores = {}  # Song number -> score
+            for query_word in split_words(query):
+                for song_numbers, relevance in self._match_word(query_word):
+                    score = self.word_match_score + relevance
+                    for song_number in song_numbers:
+                        scores[song_number] = scores.get(song_number, 0.0) + score
+            shortness = self._shortness
+            best = heapq.nlargest(
+                limit * self.rerank_factor,
+                scores.items(),
+                key=lambda item: item[1] + shortness[item[0]],
+            )
+            candidates = [
+                (self._songs[song_number], score + shortness[song_number])
+                for song_number, score in best
+            ]
+        if include is not None:
+            candidates = [candidate for candidate in candidates if include(candidate[0][0])]
+        candidates.sort(
+            key=lambda candidate: candidate[1]
+            + (self.phrase_bonus if query_phrase in candidate[0][1].lower() else 0),
+            reverse=True,
+        )
+        return [song for song, _ in candidates[:limit]]
+
+    def _add_batch(self, songs):
+        try:
+            self.add(songs)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _add_to_vocabulary(self, word):
+        insort(self._vocabulary, word)
+        if len(word) >= self.min_typo_length - 1:
+            for bigram in _bigrams(word):
+                self._typo_candidates.setdefault((bigram, len(word)), []).append(word)
+
+    def _match_word(self, query_word):
+        """
+        Finds the songs one query word matches: exactly, as the start of a title word, or one typo away.
+        Typos are only corrected for words that don't appear in any title.
+        Output: list of (set of song numbers, relevance) tuples, best matches first, each song appears once
+        """
+        exact_words = [query_word] if query_word in self._postings else []
+        prefix_words = []
+        if len(query_word) >= self.min_prefix_length:
+            for position in range(bisect_left(self._vocabulary, query_word), len(self._vocabulary)):
+                word = self._vocabulary[position]
+                if not word.startswith(query_word):
+                    break
+                if word != query_word:
+                    prefix_words.append(word)
+        typo_words = []
+        if len(query_word) >= self.min_typo_length and not exact_words:
+            typo_words = self._words_one_typo_away(query_word)
+
+        matches = []
+        matched_songs = set()
+        for weight, words in (
+            (self.exact_weight, exact_words),
+            (self.prefix_weight, prefix_words),
+            (self.typo_weight, typo_words),
+        ):
+            song_numbers = set().union(*(self._postings[word] for word in words))
+            song_numbers -= matched_songs
+            if song_numbers:
+                matched_songs |= song_numbers
+                matches.append((song_numbers, weight + self._rarity(len(song_numbers))))
+        return matches
+
+    def _rarity(self, song_count):
+        """
+        Returns a number from 0 to 1, higher when fewer of the indexed songs matched.
+        """
+        return math.log((len(self._songs) + 1) / song_count) / math.log(len(self._songs) + 1)
+
+    def _words_one_typo_away(self, query_word):
+        """
+        Returns the indexed words one typo away from the query word.
+        Only words of a similar length that share enough two letter pieces are compared,
+        one typo changes at most three of them.
+        """
+        bigrams = _bigrams(query_word)
+        shared = Counter()
+        for length in range(len(query_word) - 1, len(query_word) + 2):
+            for bigram in bigrams:
+                shared.update(self._typo_candidates.get((bigram, length), ()))
+        needed = max(1, len(bigrams) - 3)
+        return [
+            word
+            for word, count in shared.items()
+            if count >= needed and _is_one_typo_apart(query_word, word)
+        ]
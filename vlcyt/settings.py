@@ -0,0 +1,92 @@
+import json
+import os
+import threading
+from vlcyt.file_helpers import legacy_file_paths, settings_path, write_file_atomically
+
+
+class SettingsStore:
+    """
+    Stores the playlists, API key, VLC directory, playback state, and song stats in one versioned JSON file.
+    The file is replaced atomically on every save.
+    Settings left in the text files used by older versions are migrated on first load.
+    """
+
+    version = 1  # Incremented when the layout of the file changes
+
+    def __init__(self, path=settings_path):
+        self.path = path
+        self.playlist_urls = []  # Stored YouTube playlist URLs
+        self.api_key = ""
+        self.vlc_dir = ""
+        self.playback = None  # Playback state of the stored playlists from the last session, see VLCYT.get_playback_state()
+        self.song_stats = None  # Play and skip counts of every song and recent session summaries, see SongStats.get_state()
+        self._lock = threading.Lock()
+        self._load()
+
+    def has_playlist(self):
+        """
+        Returns True if playlists have been stored.
+        """
+        return bool(self.playlist_urls)
+
+    def set_playlist(self, playlist_urls, api_key=None, vlc_dir=None):
+        """
+        Stores new playlists. The API key and VLC directory are kept if not passed in.
+        Playback state is cleared if the playlists changed since it belongs to the old ones.
+        """
+        if list(playlist_urls) != self.playlist_urls:
+            self.playback = None
+        self.playlist_urls = list(playlist_urls)
+        self.api_key = api_key or self.api_key
+        self.vlc_dir = vlc_dir or self.vlc_dir
+
+    def save(self):
+        """
+        Writes every setting to disk.
+        """
+        with self._lock:
+            data = json.dumps(
+                {
+                    "version": self.version,
+                    "playlist_urls": self.playlist_urls,
+                    "api_key": self.api_key,
+                    "vlc_dir": self.vlc_dir,
+                    "playback": self.playback,
+                    "song_stats": self.song_stats,
+                }
+            )
+            write_file_atomically(self.path, data)
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as settings_file:
+                settings = json.load(settings_file)
+        except FileNotFoundError:
+            self._load_legacy()
+            return
+        except ValueError:
+            return  # Unreadable, the settings are stored again once playlists are passed in
+        if settings.get("version") != self.version:
+            return
+        self.playlist_urls = settings.get("playlist_urls") or []
+        self.api_key = settings.get("api_key") or ""
+        self.vlc_dir = settings.get("vlc_dir") or ""
+        self.playback = settings.get("playback")
+        self.song_stats = settings.get("song_stats")
+
+    def _load_legacy(self):
+        """
+        Reads playlist.txt, api_key.txt, and vlc_dir.txt from older versions and moves them into the settings file.
+        """
+        if not all(os.path.isfile(path) for path in legacy_file_paths):
+            return
+        playlist_path, api_key_path, vlc_dir_path = legacy_file_paths
+        with open(playlist_path, "r") as playlist_file:
+            self.playlist_urls = playlist_file.read().split()
+        with open(api_key_path, "r") as api_key_file:
+            self.api_key = api_key_file.read()
+        with open(vlc_dir_path, "r") as vlc_dir_file:
+            self.vlc_dir = vlc_dir_file.read()
+        self.save()
+        for path in legacy_file_paths:
+            os.remove(path)
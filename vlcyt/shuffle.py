@@ -0,0 +1,419 @@
+import random
+from array import array
+
+
+class ShuffleScheduler:
+    """
+    Draws playlist indexes in a random order without repeats, one step of a Fisher-Yates shuffle per draw.
+    Every operation is O(1). Once every song has been drawn a new pass starts with a fresh order.
+    """
+
+    def __init__(self, total_songs, seed=None):
+        self._random = random.Random(seed)
+        self._order = list(range(total_songs))  # _order[:_position] holds the indexes drawn this pass
+        self._slot_of = list(range(total_songs))  # Inverse of _order, where each index currently sits
+        self._position = 0  # Amount of indexes drawn this pass
+        self._peeked = False  # Becomes True once the next index has been chosen by peek()
+        self._last_drawn = None  # Last index drawn, never the first index of the following pass
+
+    def __len__(self):
+        return len(self._order)
+
+    def peek(self):
+        """
+        Returns the index next() will return without drawing it, or None if there are no songs.
+        """
+        if not self._order:
+            return None
+        if not self._peeked:
+            if self._position == len(self._order):
+                self._position = 0  # Every song has been drawn, start a new pass
+            last_slot = len(self._order) - 1
+            if (
+                self._position == 0
+                and last_slot > 0
+                and self._last_drawn is not None
+                and self._last_drawn < len(self._order)
+            ):
+                self._swap(self._slot_of[self._last_drawn], last_slot)  # Don't repeat a song across passes
+                pick = self._random.randrange(0, last_slot)
+            else:
+                pick = self._random.randrange(self._position, len(self._order))
+            self._swap(self._position, pick)
+            self._peeked = True
+        return self._order[self._position]
+
+    def next(self):
+        """
+        Draws the next index, returns None if there are no songs.
+        """
+        index = self.peek()
+        if index is None:
+            return None
+        self._position += 1
+        self._peeked = False
+        self._last_drawn = index
+        return index
+
+    def mark_drawn(self, index):
+        """
+        Marks an index as drawn this pass, used when a song is played without shuffling.
+        An index chosen by peek() stays next unless it is the index being marked.
+        Once every song has been drawn, the marked index starts the next pass so it doesn't come up again right away.
+        """
+        if not 0 <= index < len(self._order):
+            return
+        slot = self._slot_of[index]
+        if self._position == len(self._order):
+            self._position = 0  # Every song has been drawn, start a new pass
+        elif slot < self._position:
+            return  # Already drawn this pass
+        self._swap(slot, self._position)
+        self._position += 1
+        self._last_drawn = index
+        if self._peeked:
+            if slot == self._position - 1:
+                self._peeked = False  # The peeked index was the one marked
+            else:
+                self._swap(slot, self._position)  # Move the peeked index back to the front
+
+    def resize(self, total_songs):
+        """
+        Updates the amount of songs, used while the playlist is still loading.
+        New indexes are added to the songs not yet drawn this pass.
+        """
+        current_total = len(self._order)
+        if total_songs > current_total:
+            self._order.extend(range(current_total, total_songs))
+            self._slot_of.extend(range(current_total, total_songs))
+        elif total_songs < current_total:
+            drawn = [i for i in self._order[: self._position] if i < total_songs]
+            remaining = [i for i in self._order[self._position :] if i < total_songs]
+            self._set_order(drawn, remaining)
+            self._peeked = False
+
+    def remap(self, index_map, total_songs):
+        """
+        Moves every index to where its song is after the playlist changed.
+        Removed songs are dropped and new songs are added to the songs not yet drawn this pass.
+        Input: index_map: list holding the new index of the song at each old index, None for removed songs
+        """
+
+        def moved(indexes):
+            return [
+                index_map[index]
+                for index in indexes
+                if index < len(index_map) and index_map[index] is not None
+            ]
+
+        drawn = moved(self._order[: self._position])
+        remaining = moved(self._order[self._position :])
+        known = set(drawn).union(remaining)
+        remaining.extend(index for index in range(total_songs) if index not in known)
+        self._set_order(drawn, remaining)
+        self._peeked = False
+        if self._last_drawn is not None:
+            self._last_drawn = (
+                index_map[self._last_drawn] if self._last_drawn < len(index_map) else None
+            )
+
+    def get_state(self):
+        """
+        Returns the shuffled order and random generator state as JSON compatible data, used to resume shuffling.
+        """
+        version, internal_state, gauss_next = self._random.getstate()
+        return {
+            "order": list(self._order),
+            "position": self._position,
+            "peeked": self._peeked,
+            "last_drawn": self._last_drawn,
+            "random": [version, list(internal_state), gauss_next],
+        }
+
+    def set_state(self, state):
+        """
+        Restores a state returned by get_state(), then resizes to the current amount of songs.
+        Output: True if the state was valid and restored
+        """
+        total_songs = len(self._order)
+        try:
+            order = [int(index) for index in state["order"]]
+            if sorted(order) != list(range(len(order))):
+                return False
+            position = int(state["position"])
+            if not 0 <= position <= len(order):
+                return False
+            version, internal_state, gauss_next = state["random"]
+            self._random.setstate((version, tuple(internal_state), gauss_next))
+        except (KeyError, TypeError, ValueError):
+            return False
+        self._set_order(order[:position], order[position:])
+        self._peeked = bool(state.get("peeked")) and position < len(order)
+        self._last_drawn = state.get("last_drawn")
+        self.resize(total_songs)
+        return True
+
+    def _set_order(self, drawn, remaining):
+        """
+        Replaces the order with the indexes drawn this pass followed by the indexes not drawn yet.
+        """
+        self._order = drawn + remaining
+        self._slot_of = [0] * len(self._order)
+        for slot, index in enumerate(self._order):
+            self._slot_of[index] = slot
+        self._position = len(drawn)
+
+    def _swap(self, slot_a, slot_b):
+        order = self._order
+        order[slot_a], order[slot_b] = order[slot_b], order[slot_a]
+        self._slot_of[order[slot_a]] = slot_a
+        self._slot_of[order[slot_b]] = slot_b
+
+
+class FenwickTree:
+    """
+    Running totals of song weights. Changing one weight and finding the song at a running total are both O(log n).
+    """
+
+    def __init__(self, weights=()):
+        self._tree = array("d", [0.0])  # 1-based, _tree[i] holds the sum of the weights in (i - lowest bit of i, i]
+        self._tree.extend(weights)
+        size = len(self._tree) - 1
+        for i in range(1, size + 1):
+            parent = i + (i & -i)
+            if parent <= size:
+                self._tree[parent] += self._tree[i]
+
+    def __len__(self):
+        return len(self._tree) - 1
+
+    def append(self, weight):
+        i = len(self._tree)
+        self._tree.append(weight + self.prefix_sum(i - 1) - self.prefix_sum(i - (i & -i)))
+
+    def add(self, index, delta):
+        i = index + 1
+        size = len(self._tree) - 1
+        while i <= size:
+            self._tree[i] += delta
+            i += i & -i
+
+    def prefix_sum(self, count):
+        """
+        Returns the sum of the first count weights.
+        """
+        total = 0.0
+        while count > 0:
+            total += self._tree[count]
+            count -= count & -count
+        return total
+
+    def total(self):
+        return self.prefix_sum(len(self))
+
+    def find(self, value):
+        """
+        Returns the index of the first weight whose running total is more than value.
+        """
+        position = 0
+        step = 1 << (len(self).bit_length() - 1) if len(self) else 0
+        while step:
+            next_position = position + step
+            if next_position <= len(self) and self._tree[next_position] <= value:
+                position = next_position
+                value -= self._tree[next_position]
+            step >>= 1
+        return position
+
+
+class WeightedShuffleScheduler:
+    """
+    Draws playlist indexes without repeats like ShuffleScheduler, songs with a higher weight tend to come up earlier in each pass.
+    Weights are kept in a Fenwick tree so every draw is O(log n), a drawn song's weight is 0 until the next pass.
+    Weights are read when a pass starts and when songs are added, so they follow the song stats from pass to pass.
+    A song by the same author as the last song is drawn again up to spread_attempts times so uploaders don't play back to back.
+    """
+
+    min_weight = 0.02  # Lowest weight a song can have, every song is still played once per pass
+    spread_attempts = 8  # Draws before a song by the same author as the last song is accepted
+
+    def __init__(self, total_songs, get_weight, get_author, seed=None):
+        self._random = random.Random(seed)
+        self._get_weight = get_weight  # Returns the weight of the song at an index
+        self._get_author = get_author  # Returns the author of the song at an index, None if unknown
+        self._weights = array("d")  # Weight of every index, 0 once drawn this pass
+        self._tree = FenwickTree()
+        self._drawn = 0  # Amount of indexes drawn this pass
+        self._peeked = None  # Index chosen by peek(), drawn by the next call to next()
+        self._last_drawn = None  # Last index drawn, never the first index of the following pass
+        self.resize(total_songs)
+
+    def __len__(self):
+        return len(self._weights)
+
+    def peek(self):
+        """
+        Returns the index next() will return without drawing it, or None if there are no songs.
+        """
+        if not self._weights:
+            return None
+        if self._peeked is None:
+            if self._drawn == len(self._weights):
+                self._start_pass()
+            self._peeked = self._draw()
+        return self._peeked
+
+    def next(self):
+        """
+        Draws the next index, returns None if there are no songs.
+        """
+        index = self.peek()
+        if index is not None:
+            self._mark(index)
+        return index
+
+    def mark_drawn(self, index):
+        """
+        Marks an index as drawn this pass, used when a song is played without shuffling.
+        Once every song has been drawn, the marked index starts the next pass so it doesn't come up again right away.
+        """
+        if not 0 <= index < len(self._weights):
+            return
+        if self._drawn == len(self._weights):
+            self._start_pass()
+        if self._weights[index] > 0:
+            self._mark(index)
+
+    def resize(self, total_songs):
+        """
+        Updates the amount of songs, used while the playlist is still loading.
+        New indexes are added to the songs not yet drawn this pass.
+        """
+        current_total = len(self._weights)
+        if total_songs > current_total:
+            for index in range(current_total, total_songs):
+                weight = self._weigh(index)
+                self._weights.append(weight)
+                self._tree.append(weight)
+        elif total_songs < current_total:
+            del self._weights[total_songs:]
+            self._rebuild()
+            if self._peeked is not None and self._peeked >= total_songs:
+                self._peeked = None
+
+    def remap(self, index_map, total_songs):
+        """
+        Moves every index to where its song is after the playlist changed.
+        Removed songs are dropped and new songs are added to the songs not yet drawn this pass.
+        Input: index_map: list holding the new index of the song at each old index, None for removed songs
+        """
+        weights = array("d", [-1.0]) * total_songs
+        for index, weight in enumerate(self._weights):
+            if index < len(index_map) and index_map[index] is not None:
+                weights[index_map[index]] = weight
+        for index, weight in enumerate(weights):
+            if weight < 0:
+                weights[index] = self._weigh(index)
+        self._weights = weights
+        self._rebuild()
+        self._peeked = None
+        if self._last_drawn is not None:
+            self._last_drawn = (
+                index_map[self._last_drawn] if self._last_drawn < len(index_map) else None
+            )
+
+    def get_state(self):
+        """
+        Returns the indexes drawn this pass and random generator state as JSON compatible data, used to resume shuffling.
+        """
+        version, internal_state, gauss_next = self._random.getstate()
+        return {
+            "drawn": [index for index, weight in enumerate(self._weights) if weight == 0],
+            "peeked": self._peeked,
+            "last_drawn": self._last_drawn,
+            "random": [version, list(internal_state), gauss_next],
+        }
+
+    def set_state(self, state):
+        """
+        Restores a state returned by get_state(). Indexes past the current amount of songs are ignored.
+        Output: True if the state was valid and restored
+        """
+        try:
+            drawn = [int(index) for index in state["drawn"]]
+            peeked = state.get("peeked")
+            peeked = None if peeked is None else int(peeked)
+            version, internal_state, gauss_next = state["random"]
+            self._random.setstate((version, tuple(internal_state), gauss_next))
+        except (KeyError, TypeError, ValueError):
+            return False
+        for index in drawn:
+            self.mark_drawn(index)
+        if peeked is not None and peeked < len(self._weights) and self._weights[peeked] > 0:
+            self._peeked = peeked
+        self._last_drawn = state.get("last_drawn")
+        return True
+
+    def _weigh(self, index):
+        return max(self.min_weight, self._get_weight(index))
+
+    def _start_pass(self):
+        """
+        Every song has been drawn, weighs every song again for a new pass.
+        """
+        self._weights = array("d", (self._weigh(index) for index in range(len(self._weights))))
+        self._rebuild()
+
+    def _draw(self):
+        """
+        Chooses an undrawn index by weight, avoiding the last song and songs by its author.
+        Songs passed over are only set aside while drawing, their weights are restored afterwards.
+        """
+        remaining = len(self._weights) - self._drawn
+        set_aside = []  # (index, weight) of songs passed over
+        try:
+            last_author = None
+            if self._last_drawn is not None and self._last_drawn < len(self._weights):
+                last_author = self._get_author(self._last_drawn)
+                if remaining > 1 and self._weights[self._last_drawn] > 0:
+                    set_aside.append((self._last_drawn, self._weights[self._last_drawn]))  # Don't repeat a song across passes
+                    self._set_weight(self._last_drawn, 0.0)
+            while True:
+                index = self._pick()
+                if (
+                    last_author is None
+                    or self._get_author(index) != last_author
+                    or len(set_aside) >= self.spread_attempts
+                    or len(set_aside) >= remaining - 1
+                ):
+                    return index
+                set_aside.append((index, self._weights[index]))
+                self._set_weight(index, 0.0)
+        finally:
+            for index, weight in set_aside:
+                self._set_weight(index, weight)
+
+    def _pick(self):
+        """
+        Returns an undrawn index, each index's chance is its weight over the sum of the weights.
+        """
+        index = self._tree.find(self._random.random() * self._tree.total())
+        if index >= len(self._weights) or self._weights[index] == 0:
+            self._rebuild()  # Rounding errors built up in the running totals
+            index = self._tree.find(self._random.random() * self._tree.total())
+        return index
+
+    def _mark(self, index):
+        self._set_weight(index, 0.0)
+        self._drawn += 1
+        self._last_drawn = index
+        if self._peeked == index:
+            self._peeked = None
+
+    def _set_weight(self, index, weight):
+        self._tree.add(index, weight - self._weights[index])
+        self._weights[index] = weight
+
+    def _rebuild(self):
+        self._tree = FenwickTree(self._weights)
+        self._drawn = self._weights.tolist().count(0.0)
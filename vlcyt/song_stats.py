@@ -0,0 +1,99 @@
+import threading
+import time
+
+shuffle_modes = {
+    "random": "Every song is equally likely",
+    "spread": "Every song is equally likely, the same uploader doesn't play twice in a row",
+    "plays": "Songs played less often come up sooner",
+    "skips": "Songs that are often skipped come up later",
+    "recent": "Songs that haven't played in a while come up sooner",
+    "duration": "Shorter songs come up sooner",
+}  # Shuffle mode -> description, every mode but random spreads uploaders
+recent_hours = 72  # Hours since a song last played before the recent mode weighs it fully again
+short_song_seconds = 240  # Songs up to this long are weighed fully in the duration mode
+
+
+class SongStats:
+    """
+    Counts how often each song was played to the end and skipped, and when it last played.
+    The counts are stored in the settings store by videoid, along with a summary of the last sessions.
+    Weighted shuffle modes turn them into the weights WeightedShuffleScheduler draws songs by.
+    """
+
+    max_sessions = 20  # Session summaries kept in the settings store
+
+    def __init__(self, state=None):
+        self._songs = {}  # videoid -> [times played, times skipped, when it last played or None]
+        self._sessions = []  # Summaries of earlier sessions, oldest first
+        self.session_started = time.time()
+        self.session_played = 0  # Songs played to the end this session
+        self.session_skipped = 0  # Songs skipped this session
+        self._lock = threading.Lock()
+        if state is not None:
+            self._load(state)
+
+    def record_play(self, videoid):
+        with self._lock:
+            stats = self._songs.setdefault(videoid, [0, 0, None])
+            stats[0] += 1
+            stats[2] = time.time()
+            self.session_played += 1
+
+    def record_skip(self, videoid):
+        with self._lock:
+            stats = self._songs.setdefault(videoid, [0, 0, None])
+            stats[1] += 1
+            stats[2] = time.time()
+            self.session_skipped += 1
+
+    def get(self, videoid):
+        """
+        Output: tuple: times played, times skipped, when it last played as a Unix time or None
+        """
+        stats = self._songs.get(videoid)
+        return (0, 0, None) if stats is None else tuple(stats)
+
+    def weigh(self, videoid, mode, duration=None):
+        """
+        Returns how likely the song is to come up next in the passed in shuffle mode, from 0 to 1.
+        Input: duration: length of the song in seconds if known, only used by the duration mode
+        """
+        plays, skips, last_played = self.get(videoid)
+        if mode == "plays":
+            return 1 / (1 + plays)
+        elif mode == "skips":
+            return (1 + plays) / (1 + plays + skips)
+        elif mode == "recent":
+            if last_played is None:
+                return 1.0
+            return min(1.0, (time.time() - last_played) / 3600 / recent_hours)
+        elif mode == "duration" and duration:
+            return min(1.0, short_song_seconds / duration)
+        return 1.0
+
+    def get_state(self):
+        """
+        Returns the song counts and session summaries as JSON compatible data, including this session.
+        """
+        with self._lock:
+            session = {
+                "started": self.session_started,
+                "seconds": round(time.time() - self.session_started),
+                "played": self.session_played,
+                "skipped": self.session_skipped,
+            }
+            return {
+                "songs": {videoid: list(stats) for videoid, stats in self._songs.items()},
+                "sessions": (self._sessions + [session])[-self.max_sessions :],
+            }
+
+    def _load(self, state):
+        """
+        Restores a state returned by get_state(), invalid entries are dropped.
+        """
+        try:
+            for videoid, (plays, skips, last_played) in state["songs"].items():
+                self._songs[videoid] = [int(plays), int(skips), last_played]
+            self._sessions = [session for session in state["sessions"] if isinstance(session, dict)]
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return
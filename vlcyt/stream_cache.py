@@ -0,0 +1,177 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from vlcyt.file_helpers import app_dir
+
+
+class StreamCache:
+    """
+    On-disk cache of resolved stream URLs and video metadata keyed by videoid.
+    Stream URLs and metadata expire separately and the least recently used videos are evicted once the cache is full.
+    Several processes can share the file, such as a playing session and "python -m vlcyt --warm".
+    Saving merges in what the others saved and keeps the newest value of every field.
+    """
+
+    url_ttl = 60 * 60 * 4  # Seconds a stream URL is kept, signed YouTube URLs expire after roughly 6 hours
+    metadata_ttl = 60 * 60 * 24 * 7  # Seconds metadata is kept, it rarely changes
+    failures_ttl = 60 * 60 * 24  # Seconds failed plays are remembered, dead videos are tried again once they expire
+    max_entries = 10000  # Amount of videos kept before the least recently used are evicted
+
+    def __init__(self, cache_path=app_dir + "stream_cache.json"):
+        self.cache_path = cache_path
+        self._entries = OrderedDict()  # videoid -> entry dict, least recently used first
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # Saves from the player and the stream warmer take turns
+        self._dirty = False  # Becomes True when there are changes that have not been saved
+        self._discarded = {}  # (videoid, field) -> time it was discarded, so saving doesn't merge it back in
+        self._read_modified_time = None  # Modification time of the file when it was last read or written
+        self._load()
+
+    def get_url(self, videoid):
+        """
+        Returns the cached stream URL for the passed in videoid, or None if it is missing or expired.
+        """
+        return self._get(videoid, "url", self.url_ttl)
+
+    def get_url_age(self, videoid):
+        """
+        Returns how many seconds ago the cached stream URL of the passed in videoid was stored, or None if there is none.
+        """
+        with self._lock:
+            entry = self._entries.get(videoid)
+            if entry is None or "url" not in entry:
+                return None
+            return time.time() - entry["url_time"]
+
+    def set_url(self, videoid, url):
+        self._set(videoid, "url", url)
+
+    def discard_url(self, videoid):
+        """
+        Removes the cached stream URL of the passed in videoid, used once VLC fails to play it.
+        """
+        self._discard(videoid, "url")
+
+    def get_failures(self, videoid):
+        """
+        Returns the amount of failed plays in a row recorded for the passed in videoid.
+        """
+        return self._get(videoid, "failures", self.failures_ttl) or 0
+
+    def set_failures(self, videoid, failures):
+        if failures:
+            self._set(videoid, "failures", failures)
+        else:
+            self._discard(videoid, "failures")
+
+    def get_metadata(self, videoid):
+        """
+        Returns the cached metadata dict for the passed in videoid, or None if it is missing or expired.
+        """
+        return self._get(videoid, "metadata", self.metadata_ttl)
+
+    def set_metadata(self, videoid, metadata):
+        self._set(videoid, "metadata", metadata)
+
+    def save(self):
+        """
+        Merges in the fields other processes saved since the file was last read, then writes the cache to disk if it has changed.
+        The file is replaced atomically so a crash never leaves a partially written cache behind.
+        """
+        with self._save_lock:
+            modified_time = self._get_modified_time()
+            if modified_time == self._read_modified_time and not self._dirty:
+                return
+            saved_entries = self._read() if modified_time != self._read_modified_time else {}
+            with self._lock:
+                self._merge(saved_entries)
+                self._read_modified_time = modified_time
+                if not self._dirty:
+                    return
+                data = json.dumps(self._entries)
+                self._dirty = False
+                self._discarded = {}
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            temp_path = f"{self.cache_path}.{os.getpid()}.tmp"  # Other processes may be saving at the same time
+            with open(temp_path, "w") as cache_file:
+                cache_file.write(data)
+            os.replace(temp_path, self.cache_path)
+            self._read_modified_time = self._get_modified_time()
+
+    def _get(self, videoid, field, ttl):
+        with self._lock:
+            entry = self._entries.get(videoid)
+            if entry is None or field not in entry:
+                return None
+            if time.time() - entry[field + "_time"] > ttl:
+                del entry[field], entry[field + "_time"]
+                self._dirty = True
+                return None
+            self._entries.move_to_end(videoid)
+            return entry[field]
+
+    def _discard(self, videoid, field):
+        with self._lock:
+            entry = self._entries.get(videoid)
+            if entry is not None and field in entry:
+                del entry[field], entry[field + "_time"]
+                self._discarded[videoid, field] = time.time()
+                self._dirty = True
+
+    def _merge(self, saved_entries):
+        """
+        Adds every field of the saved entries that is newer than this cache's, except fields discarded since.
+        Videos only the saved entries have are added as the least recently used.
+        """
+        for videoid, saved_entry in saved_entries.items():
+            entry = self._entries.get(videoid)
+            if entry is None:
+                entry = self._entries[videoid] = {}
+                self._entries.move_to_end(videoid, last=False)
+            for key, saved_time in saved_entry.items():
+                if not key.endswith("_time"):
+                    continue
+                field = key[: -len("_time")]
+                if saved_time <= entry.get(key, 0) or saved_time <= self._discarded.get((videoid, field), 0):
+                    continue
+                entry[field] = saved_entry[field]
+                entry[key] = saved_time
+            if not entry:
+                del self._entries[videoid]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _set(self, videoid, field, value):
+        with self._lock:
+            entry = self._entries.setdefault(videoid, {})
+            entry[field] = value
+            entry[field + "_time"] = time.time()
+            self._entries.move_to_end(videoid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty = True
+
+    def _load(self):
+        """
+        Loads the cache from disk, starting empty if it is missing or unreadable.
+        """
+        self._read_modified_time = self._get_modified_time()
+        self._entries = OrderedDict(self._read())
+
+    def _get_modified_time(self):
+        try:
+            return os.stat(self.cache_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _read(self):
+        """
+        Returns the entries saved on disk, or an empty dict if the file is missing or unreadable.
+        """
+        try:
+            with open(self.cache_path, "r") as cache_file:
+                return json.load(cache_file)
+        except (OSError, ValueError):
+            return {}
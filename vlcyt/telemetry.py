@@ -0,0 +1,116 @@
+import contextlib
+import json
+import threading
+import time
+from collections import deque
+from importlib import metadata as package_metadata
+
+
+def _get_version():
+    try:
+        return package_metadata.version("VLCYT")
+    except package_metadata.PackageNotFoundError:
+        return "unknown"  # Running from a source checkout
+
+
+class RollingHistogram:
+    """
+    Keeps the most recent samples of one timing so percentiles reflect current behavior.
+    """
+
+    def __init__(self, window):
+        self._samples = deque(maxlen=window)
+        self.count = 0  # Samples recorded, including those that left the window
+
+    def add(self, seconds):
+        self._samples.append(seconds)
+        self.count += 1
+
+    def summary(self):
+        """
+        Output: dict: count, p50, p90, p99, and max in seconds over the window
+        """
+        samples = sorted(self._samples)
+        if not samples:
+            return None
+
+        def percentile(fraction):
+            return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+        return {
+            "count": self.count,
+            "p50": percentile(0.5),
+            "p90": percentile(0.9),
+            "p99": percentile(0.99),
+            "max": samples[-1],
+        }
+
+
+class Telemetry:
+    """
+    Collects timings of the playback hot paths into rolling histograms shown by the stats command.
+    Every timing can also be appended to a JSON lines file to compare releases.
+    """
+
+    window = 256  # Samples kept per timing
+
+    def __init__(self):
+        self._histograms = {}  # Timing name -> RollingHistogram
+        self._lock = threading.Lock()
+        self._export_file = None
+        self._version = _get_version()
+
+    def export_to(self, path):
+        """
+        Appends every timing recorded from now on to the passed in JSON lines file.
+        """
+        with self._lock:
+            if self._export_file is not None:
+                self._export_file.close()
+            self._export_file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def record(self, name, seconds):
+        """
+        Adds a timing in seconds. Safe to call from any thread.
+        """
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = RollingHistogram(self.window)
+            histogram.add(seconds)
+            if self._export_file is not None:
+                self._export_file.write(
+                    json.dumps(
+                        {
+                            "time": time.time(),
+                            "version": self._version,
+                            "name": name,
+                            "seconds": round(seconds, 6),
+                        }
+                    )
+                    + "\n"
+                )
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        """
+        Records how long the with block took, including when it raises.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def summaries(self):
+        """
+        Output: dict: timing name -> summary dict, sorted by name
+        """
+        with self._lock:
+            return {
+                name: self._histograms[name].summary()
+                for name in sorted(self._histograms)
+            }
+
+
+telemetry = Telemetry()  # Shared by every module so timings from any thread end up in one place
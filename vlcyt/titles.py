@@ -0,0 +1,87 @@
+import re
+import threading
+from collections import OrderedDict
+from colorama import Fore
+from vlcyt.file_helpers import app_dir
+
+default_removal_rules = [
+    r"(\s*\((Official|Audio|Video).*\))",
+    r"(\s*\[(Official|Audio|Video).*\])",
+    r"\s*-Lyrics\s*",
+    r"\(.*Lyric.*\)",
+    r"\[.*Lyric.*\]",
+    r"\s*Lyrics\s*",
+    r"\s*Official Music Video\s*",
+    r"\s*\[NCS Release\]\s*",
+]  # Regular expressions for the parts of a YouTube title that aren't part of the song's name
+
+
+def load_removal_rules(rules_path=app_dir + "title_rules.txt"):
+    """
+    Reads user removal rules, one regular expression per line. Empty lines and lines starting with # are ignored.
+    Output: list of rule strings, or None if the file doesn't exist
+    """
+    try:
+        with open(rules_path, "r", encoding="utf-8") as rules_file:
+            lines = rules_file.read().splitlines()
+    except FileNotFoundError:
+        return None
+    return [line for line in lines if line.strip() and not line.startswith("#")]
+
+
+class TitleCleaner:
+    """
+    Removes noise such as "(Official Video)" and "Lyrics" from YouTube titles.
+    Every rule is compiled into one pattern that is applied in a single pass, results are cached per videoid.
+    Rules that aren't valid regular expressions are skipped with a warning.
+    """
+
+    def __init__(self, removal_rules=None, cache_size=4096):
+        self.removal_rules = self._valid_rules(
+            default_removal_rules if removal_rules is None else removal_rules
+        )
+        self._pattern = re.compile(
+            "|".join(f"(?:{rule})" for rule in self.removal_rules), re.IGNORECASE
+        ) if self.removal_rules else None
+        self._cache = OrderedDict()  # videoid -> (original title, cleaned title), least recently used first
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def clean(self, title):
+        """
+        Returns the passed in title with every rule removed.
+        """
+        if self._pattern is None:
+            return title
+        return self._pattern.sub("", title)
+
+    def clean_song_title(self, song):
+        """
+        Returns the passed in Track's cleaned title, cached by videoid.
+        """
+        with self._lock:
+            cached = self._cache.get(song.videoid)
+            if cached is not None and cached[0] == song.title:
+                self._cache.move_to_end(song.videoid)
+                return cached[1]
+        cleaned_title = self.clean(song.title)
+        with self._lock:
+            self._cache[song.videoid] = (song.title, cleaned_title)
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return cleaned_title
+
+    @staticmethod
+    def _valid_rules(removal_rules):
+        """
+        Returns the rules that compile, warns about the others.
+        """
+        valid_rules = []
+        for rule in removal_rules:
+            try:
+                re.compile(rule)
+            except re.error as e:
+                print(f"{Fore.RED}Skipping title rule {rule!r}:{Fore.RESET} {e}")
+                continue
+            valid_rules.append(rule)
+        return valid_rules
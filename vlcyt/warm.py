@@ -0,0 +1,153 @@
+import multiprocessing
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from colorama import Fore
+from vlcyt.playlist_loader import MergedPlaylist, Track
+from vlcyt.playlist_snapshot import load_snapshot, save_snapshot
+from vlcyt.resolver import StreamResolutionError, StreamResolver
+from vlcyt.stream_cache import StreamCache
+from vlcyt.telemetry import telemetry
+from vlcyt.youtube_api import set_api_key
+
+
+def _resolve_in_worker(videoid):
+    """
+    Runs in a worker process, resolves the best audio stream URL of one video.
+    Output: tuple: videoid, stream url or None if it couldn't be resolved, seconds it took
+    """
+    started = time.perf_counter()
+    try:
+        url = StreamResolver(stream_cache=None).resolve(Track(videoid, None, None))
+    except StreamResolutionError:
+        url = None
+    return videoid, url, time.perf_counter() - started
+
+
+class StreamWarmer:
+    """
+    Resolves the stream URLs of many songs ahead of time on a pool of worker processes and stores them in the stream cache.
+    youtube_dl's signature deciphering and format parsing hold the GIL, in other processes they don't slow down playback and input.
+    At most max_requests videos are resolved at once, however many processes there are, to stay within YouTube's rate limits.
+    """
+
+    max_requests = 4  # Videos being resolved at the same time
+    save_every = 25  # Resolved songs between stream cache saves, so an interrupted run keeps its progress
+
+    def __init__(self, stream_cache, resolver, api_key, processes=2):
+        self.stream_cache = stream_cache  # Shared with the playing session and other VLCYT processes
+        self.resolver = resolver  # Tells which songs are dead, their failures are counted by the session that plays them
+        self.api_key = api_key
+        self.processes = processes
+        self.total = 0  # Songs in the current or last run that needed resolving
+        self.resolved = 0
+        self.failed = 0
+        self._stop_requested = threading.Event()
+        self._thread = None
+
+    def warm(self, songs, progress_callback=None):
+        """
+        Blocking, resolves every passed in song that has no fresh stream URL cached.
+        progress_callback is called after every song with the warmer, whose total, resolved, and failed counts are updated.
+        """
+        videoids = [
+            song.videoid
+            for song in songs
+            if self.stream_cache.get_url(song.videoid) is None
+            and not self.resolver.is_dead(song.videoid)
+        ]
+        videoids = list(dict.fromkeys(videoids))
+        self.total, self.resolved, self.failed = len(videoids), 0, 0
+        self._stop_requested.clear()
+        if not videoids:
+            return
+        remaining = iter(videoids)
+        running = set()
+        with ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context("spawn"),  # Forking would copy the player's threads and locks
+            initializer=set_api_key,
+            initargs=(self.api_key,),
+        ) as executor:
+            try:
+                while True:
+                    while len(running) < self.max_requests and not self._stop_requested.is_set():
+                        videoid = next(remaining, None)
+                        if videoid is None:
+                            break
+                        running.add(executor.submit(_resolve_in_worker, videoid))
+                    if not running:
+                        break
+                    done, running = wait(running, timeout=1, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        self._store_result(*future.result())
+                        if progress_callback is not None:
+                            progress_callback(self)
+            finally:
+                for future in running:
+                    future.cancel()
+                self.stream_cache.save()
+
+    def start(self, songs):
+        """
+        Warms the passed in songs on a background thread, does nothing if a run is already going.
+        Output: True if a run was started
+        """
+        if self.is_running():
+            return False
+        self.total, self.resolved, self.failed = 0, 0, 0
+        self._thread = threading.Thread(target=self.warm, args=(list(songs),))
+        self._thread.daemon = True
+        self._thread.start()
+        return True
+
+    def stop(self):
+        """
+        Stops starting new requests, the requests already running finish and are stored.
+        """
+        self._stop_requested.set()
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _store_result(self, videoid, url, seconds):
+        if url is None:
+            self.failed += 1
+        else:
+            self.stream_cache.set_url(videoid, url)
+            self.resolved += 1
+            telemetry.record("warm.resolve", seconds)
+        if (self.resolved + self.failed) % self.save_every == 0:
+            self.stream_cache.save()
+
+
+def warm_playlists(youtube_playlist_urls, api_key, processes):
+    """
+    Resolves every song of the passed in playlists into the stream cache, used by "python -m vlcyt --warm".
+    A session that is playing at the same time picks the results up the next time it saves its stream cache.
+    """
+    set_api_key(api_key)
+    print("Loading the playlist...")
+    playlist = MergedPlaylist(
+        youtube_playlist_urls,
+        snapshot=load_snapshot(youtube_playlist_urls),
+        loaded_callback=save_snapshot,
+    )
+    playlist.wait_until_loaded()
+    playlist.apply_sync()
+    songs = [playlist.get_loaded(index) for index in range(len(playlist))]
+    stream_cache = StreamCache()
+    warmer = StreamWarmer(stream_cache, StreamResolver(stream_cache), api_key, processes)
+    try:
+        warmer.warm(songs, progress_callback=_print_progress)
+    except KeyboardInterrupt:
+        pass  # Everything resolved so far was saved on the way out
+    print(
+        f"\n{Fore.GREEN}{warmer.resolved}{Fore.RESET} resolved, "
+        f"{Fore.RED}{warmer.failed}{Fore.RESET} failed, "
+        f"{len(songs) - warmer.total} already cached or dead."
+    )
+
+
+def _print_progress(warmer):
+    print(f"\rResolving streams: {warmer.resolved + warmer.failed}/{warmer.total}", end="", flush=True)
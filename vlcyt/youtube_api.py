@@ -0,0 +1,54 @@
+import re
+import threading
+from urllib.parse import parse_qs, urlparse
+
+playlist_id_pattern = re.compile(r"((?:RD|PL|LL|UU|FL|OL)[-_0-9a-zA-Z]+)$")
+
+_api_key = None  # YouTube Data API key, handed to pafy once it is imported
+_pafy = None  # The pafy module once imported
+_lock = threading.Lock()
+
+
+def set_api_key(api_key):
+    """
+    Stores the YouTube Data API key every request is sent with.
+    Also used as the initializer of the stream warmer's worker processes.
+    """
+    global _api_key
+    with _lock:
+        _api_key = api_key
+        if _pafy is not None:
+            _pafy.set_api_key(api_key)
+
+
+def get_pafy():
+    """
+    Returns the pafy module, importing it on first use.
+    pafy imports youtube_dl, which takes most of VLCYT's import time. Launches whose first song has a cached stream URL
+    start playing without it, pafy is then imported by the threads that sync the playlist and resolve upcoming songs.
+    """
+    global _pafy
+    with _lock:
+        if _pafy is None:
+            import pafy
+
+            if _api_key is not None:
+                pafy.set_api_key(_api_key)
+            _pafy = pafy
+        return _pafy
+
+
+def extract_playlist_id(playlist_url):
+    """
+    Returns the playlist id of a playlist URL or id, or None if it doesn't contain one.
+    Same as pafy.playlist.extract_playlist_id(), without importing pafy.
+    """
+    playlist_id = playlist_url if playlist_id_pattern.match(playlist_url) else None
+    if "://" not in playlist_url:
+        playlist_url = "//" + playlist_url
+    parsed_url = urlparse(playlist_url)
+    if parsed_url.netloc in ("youtube.com", "www.youtube.com"):
+        query = parse_qs(parsed_url.query)
+        if "list" in query and playlist_id_pattern.match(query["list"][0]):
+            playlist_id = query["list"][0]
+    return playlist_id